@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: zwischengespeicherter Briefbogen in erstelle_pdf
+===========================================================
+
+Rendert N einseitige Rechnungen in den Speicher und vergleicht:
+
+- alt:         ohne Vorlagen-Cache, ASCII85-kodierte Streams (früheres Verhalten)
+- ohne Cache:  statische Inhalte werden für jede Rechnung neu gesetzt
+- mit Cache:   statische Inhalte je Unternehmensprofil nur einmal gesetzt
+
+Aufruf:
+    python benchmarks/bench_hintergrund_cache.py [--anzahl 1 100 10000]
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab import rl_config
+import rechnungstool_backend
+from rechnungstool_backend import erstelle_pdf
+
+UNTERNEHMEN = {
+    "Firmenname": "Musterfirma GmbH", "Straße": "Musterstraße", "Hausnummer": "123",
+    "PLZ": "12345", "Ort": "Musterstadt", "Land": "DE", "Telefon": "+49 123 456789",
+    "Email": "info@musterfirma.de", "USt-IdNr": "DE123456789", "Steuernummer": "123/456/78901",
+    "IBAN": "DE89 3704 0044 0532 0130 00", "BIC": "COBADEFFXXX", "Bank": "Commerzbank AG",
+    "Kleinunternehmer": "nein",
+}
+KUNDE = {
+    "Kundennummer": "K001", "Firmenname": "ABC Consulting GmbH", "Ansprechpartner": "Anna Schmidt",
+    "Straße": "Berliner Straße", "Hausnummer": "456", "PLZ": "10115", "Ort": "Berlin", "Land": "DE",
+}
+POSITIONEN = [
+    {"bezeichnung": "Beratung", "menge": 2.0, "einzelpreis": 95.0},
+    {"bezeichnung": "Konzeption und Dokumentation", "menge": 1.0, "einzelpreis": 450.0},
+]
+
+def rendere(anzahl, hintergrund_cache, ascii85):
+    """Rendert anzahl Rechnungen und gibt (Sekunden/Rechnung, Bytes/Rechnung) zurück"""
+    rl_config.useA85 = 1 if ascii85 else 0
+    rechnungstool_backend.VORLAGEN_CACHE.clear()
+    betrag = sum(pos["menge"] * pos["einzelpreis"] for pos in POSITIONEN)
+    gesamt_bytes = 0
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(anzahl):
+            puffer = io.BytesIO()
+            erstelle_pdf(f"2025-01-01-{i:05d}", KUNDE, UNTERNEHMEN, "01.01.2025", POSITIONEN, betrag,
+                         None, puffer, False, None, hintergrund_cache=hintergrund_cache)
+            gesamt_bytes += puffer.tell()
+    dauer = time.perf_counter() - start
+
+    rl_config.useA85 = 0
+    return dauer / anzahl, gesamt_bytes / anzahl
+
+def main():
+    # reportlab laden, bevor rl_config.useA85 für die Varianten umgestellt wird
+    rechnungstool_backend.lade_reportlab()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anzahl", type=int, nargs="+", default=[1, 100, 10000], help="Anzahl Rechnungen pro Messung")
+    args = parser.parse_args()
+
+    varianten = [
+        ("alt (ASCII85)", False, True),
+        ("ohne Cache", False, False),
+        ("mit Cache", True, False),
+    ]
+
+    print("📊 BRIEFBOGEN-CACHE IN erstelle_pdf")
+    print("=" * 66)
+    print(f"{'Rechnungen':>10}  {'Variante':<16}{'ms/Rechnung':>14}{'Bytes/PDF':>12}{'Gesamt s':>12}")
+    print("-" * 66)
+    for anzahl in args.anzahl:
+        for name, cache, ascii85 in varianten:
+            sekunden, bytes_pro_pdf = rendere(anzahl, cache, ascii85)
+            print(f"{anzahl:>10}  {name:<16}{sekunden * 1e3:>14.3f}{bytes_pro_pdf:>12.0f}{sekunden * anzahl:>12.2f}")
+        print("-" * 66)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Kundensuche bei großen Kundenbeständen
+=================================================
+
+Baut den Suchindex über N synthetische Kunden auf und misst typische
+Anfragen (Name, Ort, PLZ-Präfix, Kundennummer, Tippfehler) im Vergleich zur
+früheren Auswahl, die alle Kunden durchlaufen und ausgegeben hat.
+
+Aufruf:
+    python benchmarks/bench_kundensuche.py [--anzahl 1000 50000]
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rechnungstool_suche import Kundensuche
+
+NAMEN = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Hoffmann", "Schulz"]
+BRANCHEN = ["Bau", "Consulting", "Software", "Logistik", "Design"]
+RECHTSFORMEN = ["GmbH", "AG", "KG", "e.K.", "UG"]
+ORTE = ["Berlin", "München", "Hamburg", "Köln", "Frankfurt", "Stuttgart", "Düsseldorf", "Leipzig"]
+ANFRAGEN = ["müller", "mueler bau", "berlin", "803", "K00000010", "schmidt consulting", "hofman"]
+
+def erzeuge_kunden(anzahl):
+    zufall = random.Random(1)
+    kunden = {}
+    for i in range(anzahl):
+        nummer = f"K{i:08X}"
+        kunden[nummer] = {
+            "Kundennummer": nummer,
+            "Firmenname": f"{zufall.choice(NAMEN)} {zufall.choice(BRANCHEN)} {i} {zufall.choice(RECHTSFORMEN)}",
+            "Ansprechpartner": "", "PLZ": f"{zufall.randint(10000, 99999)}", "Ort": zufall.choice(ORTE),
+        }
+    return kunden
+
+def alte_liste(kunden):
+    """Frühere Auswahl: jeden Kunden zweizeilig ausgeben"""
+    for i, (nr, kunde) in enumerate(kunden.items(), 1):
+        print(f"{i:2d}. 👤 {kunde['Firmenname']} (Privatperson)")
+        print(f"    📍 {kunde.get('Ort', 'Unbekannt')}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anzahl", type=int, nargs="+", default=[1000, 50000], help="Anzahl Kunden")
+    args = parser.parse_args()
+
+    print("📊 KUNDENSUCHE")
+    print("=" * 72)
+    for anzahl in args.anzahl:
+        kunden = erzeuge_kunden(anzahl)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            alte_liste(kunden)
+        liste_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        index = Kundensuche(kunden)
+        aufbau_ms = (time.perf_counter() - start) * 1e3
+
+        print(f"{anzahl} Kunden: Liste ausgeben {liste_ms:.1f} ms, Index aufbauen {aufbau_ms:.1f} ms")
+        for anfrage in ANFRAGEN:
+            start = time.perf_counter()
+            treffer = index.suche(anfrage)
+            dauer = (time.perf_counter() - start) * 1e3
+            erster = kunden[treffer[0]]["Firmenname"] if treffer else "-"
+            print(f"   {anfrage!r:22}{dauer:>9.2f} ms{len(treffer):>8} Treffer   {erster}")
+        print("-" * 72)
+
+if __name__ == "__main__":
+    main()
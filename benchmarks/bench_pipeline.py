@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Pipeline gegen Stapelverarbeitung bei langsamen Schreibzugriffen
+===========================================================================
+
+Erstellt N Rechnungen einmal wie bisher (jeder Worker rendert und schreibt
+selbst) und einmal über die Pipeline (Rendern in den Speicher, Schreiben
+parallel in Threads). Um ein Netzlaufwerk nachzustellen, wird jeder
+Schreibvorgang um --latenz Millisekunden verzögert.
+
+Aufruf:
+    python benchmarks/bench_pipeline.py [--anzahl 200] [--prozesse 2]
+        [--latenz 0 20] [--schreiber 4] [--puffer 16]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import builtins
+import tempfile
+import contextlib
+
+PROJEKT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJEKT_DIR)
+
+import rechnungstool_pipeline
+from rechnungstool_menu import RechnungsManager
+from rechnungstool_batch import baue_job, erstelle_einzelrechnung
+from rechnungstool_pipeline import verarbeite_jobs
+from concurrent.futures import ProcessPoolExecutor
+
+def langsames_open(pfad, modus="r", *args, open_original=builtins.open, **kwargs):
+    """open mit zusätzlicher Latenz beim Schreiben von Dateien in Rechnungen/"""
+    latenz_s = float(os.environ.get("BENCH_LATENZ_MS", "0")) / 1e3
+    if latenz_s and "w" in modus and str(pfad).startswith(os.environ.get("BENCH_RECHNUNGEN_DIR", "\0")):
+        time.sleep(latenz_s)
+    return open_original(pfad, modus, *args, **kwargs)
+
+# Auf Modulebene, damit auch neu gestartete Worker-Prozesse (spawn) langsam schreiben;
+# Latenz und Verzeichnis kommen über Umgebungsvariablen
+builtins.open = langsames_open
+
+def erstelle_jobs(manager, anzahl, kundennummer):
+    auftrag = {
+        "kundennummer": kundennummer,
+        "positionen": [{"bezeichnung": "Beratung", "menge": 2, "einzelpreis": 95.0},
+                       {"bezeichnung": "Fachbuch", "menge": 1, "einzelpreis": 39.9, "steuersatz": 7}],
+    }
+    return [baue_job(manager, i, auftrag, "01.01.2025", f"2025-01-01-{i:04d}") for i in range(anzahl)]
+
+def stapel(jobs, executor, prozesse):
+    chunksize = max(1, len(jobs) // (prozesse * 4))
+    return list(executor.map(erstelle_einzelrechnung, jobs, chunksize=chunksize))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anzahl", type=int, default=200, help="Anzahl Rechnungen je Lauf")
+    parser.add_argument("--prozesse", type=int, default=2, help="Render-Prozesse")
+    parser.add_argument("--latenz", type=float, nargs="+", default=[0, 20], help="Schreiblatenz in ms")
+    parser.add_argument("--schreiber", type=int, default=rechnungstool_pipeline.STANDARD_SCHREIBER, help="Schreib-Threads der Pipeline")
+    parser.add_argument("--puffer", type=int, default=rechnungstool_pipeline.STANDARD_PUFFER, help="Gepufferte Rechnungen der Pipeline")
+    args = parser.parse_args()
+
+    print("📊 PIPELINE")
+    print("=" * 64)
+    print(f"{'Latenz ms':>10}{'Stapel s':>12}{'Pipeline s':>12}{'Rechnungen/s':>16}{'Faktor':>10}")
+    print("-" * 64)
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        for datei in ("unternehmen.csv", "kunden.csv"):
+            shutil.copy2(os.path.join(PROJEKT_DIR, datei), verzeichnis)
+        with contextlib.redirect_stdout(sys.stderr):
+            manager = RechnungsManager(verzeichnis)
+        kundennummer = next(iter(manager.kunden))
+
+        for latenz_ms in args.latenz:
+            os.environ["BENCH_LATENZ_MS"] = str(latenz_ms)
+            os.environ["BENCH_RECHNUNGEN_DIR"] = manager.rechnungen_dir
+            jobs = erstelle_jobs(manager, args.anzahl, kundennummer)
+            with contextlib.redirect_stdout(open(os.devnull, "w")), \
+                    ProcessPoolExecutor(max_workers=args.prozesse) as executor:
+                # Worker starten und reportlab laden, bevor gemessen wird
+                stapel(jobs[:args.prozesse], executor, args.prozesse)
+
+                start = time.perf_counter()
+                ergebnisse = stapel(jobs, executor, args.prozesse)
+                stapel_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                ergebnisse += verarbeite_jobs(jobs, args.prozesse, args.schreiber, args.puffer, executor)
+                pipeline_s = time.perf_counter() - start
+
+            if not all(e["erfolg"] for e in ergebnisse):
+                raise RuntimeError(next(e["fehler"] for e in ergebnisse if not e["erfolg"]))
+            print(f"{latenz_ms:>10.0f}{stapel_s:>12.2f}{pipeline_s:>12.2f}"
+                  f"{args.anzahl / pipeline_s:>16.1f}{stapel_s / pipeline_s:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
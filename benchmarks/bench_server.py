@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Rechnungsserver gegen Prozessstart pro Rechnung
+==========================================================
+
+Vergleicht die Latenz pro Rechnung, wenn ein aufrufendes System (z.B. ein
+ERP) für jede Rechnung einen neuen Prozess startet ('run' mit einem
+Auftrag auf stdin), mit einer Anfrage an den laufenden Rechnungsserver.
+Gearbeitet wird in einem temporären Datenverzeichnis mit den
+Beispieldaten aus unternehmen.csv und kunden.csv.
+
+Aufruf:
+    python benchmarks/bench_server.py [--anzahl 20] [--worker 2]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import threading
+import subprocess
+import contextlib
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+PROJEKT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJEKT_DIR)
+
+from rechnungstool_menu import RechnungsManager
+from rechnungstool_server import Rechnungsdienst, RechnungsHandler
+
+def auftrag(kundennummer):
+    return {
+        "kundennummer": kundennummer, "datum": "01.01.2025",
+        "positionen": [{"bezeichnung": "Beratung", "menge": 2, "einzelpreis": 95.0},
+                       {"bezeichnung": "Fachbuch", "menge": 1, "einzelpreis": 39.9, "steuersatz": 7}],
+    }
+
+def per_prozess(verzeichnis, daten, anzahl):
+    dauern = []
+    for _ in range(anzahl):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(PROJEKT_DIR, "rechnungstool_menu.py"), "--verzeichnis", verzeichnis,
+                        "run", "--prozesse", "1"], input=daten, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        dauern.append((time.perf_counter() - start) * 1e3)
+    return dauern
+
+def per_server(adresse, daten, anzahl):
+    dauern = []
+    for _ in range(anzahl):
+        start = time.perf_counter()
+        with urllib.request.urlopen(urllib.request.Request(adresse + "/rechnungen", data=daten, method="POST")) as antwort:
+            if not json.load(antwort)["erfolg"]:
+                raise RuntimeError("Rechnung fehlgeschlagen")
+        dauern.append((time.perf_counter() - start) * 1e3)
+    return dauern
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anzahl", type=int, default=20, help="Rechnungen je Variante")
+    parser.add_argument("--worker", type=int, default=2, help="Render-Prozesse des Servers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        for datei in ("unternehmen.csv", "kunden.csv"):
+            shutil.copy2(os.path.join(PROJEKT_DIR, datei), verzeichnis)
+        with contextlib.redirect_stdout(sys.stderr):
+            manager = RechnungsManager(verzeichnis)
+        kundennummer = next(iter(manager.kunden))
+        daten = json.dumps(auftrag(kundennummer)).encode("utf-8")
+
+        prozess_ms = per_prozess(verzeichnis, daten, args.anzahl)
+
+        dienst = Rechnungsdienst(manager, args.worker)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RechnungsHandler)
+        server.dienst = dienst
+        RechnungsHandler.log_message = lambda *_: None
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            adresse = f"http://127.0.0.1:{server.server_address[1]}"
+            per_server(adresse, daten, 1)  # Worker starten und vorwärmen
+            server_ms = per_server(adresse, daten, args.anzahl)
+        finally:
+            server.shutdown()
+            server.server_close()
+            dienst.beenden()
+
+    print("📊 LATENZ PRO RECHNUNG")
+    print("=" * 60)
+    print(f"{'Variante':<28}{'Median ms':>12}{'Min ms':>10}{'Max ms':>10}")
+    print("-" * 60)
+    for name, dauern in (("Prozess pro Rechnung", prozess_ms), ("Rechnungsserver (HTTP)", server_ms)):
+        print(f"{name:<28}{statistics.median(dauern):>12.1f}{min(dauern):>10.1f}{max(dauern):>10.1f}")
+
+if __name__ == "__main__":
+    main()
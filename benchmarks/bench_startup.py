@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Programmstart
+========================
+
+Misst, wie schnell das RechnungsTool startet:
+
+- Importzeiten: python -X importtime für rechnungstool_menu, die teuersten
+  Module (kumuliert) und die Prüfung, dass reportlab und pypdf beim Start
+  nicht geladen werden.
+- Kaltstart: Zeit bis zum Ende von 'rechnungstool_menu.py --help' in einem
+  neuen Prozess (Median aus mehreren Läufen), optional zusätzlich für
+  kompilierte Binaries (z.B. onefile gegen onedir, mit und ohne UPX).
+
+Der Import von rechnungstool_menu muss innerhalb von STARTBUDGET_MS
+bleiben, sonst endet das Script mit Exit-Code 1.
+
+Aufruf:
+    python benchmarks/bench_startup.py [--laeufe 10] [--top 15]
+        [--binary dist/RechnungsTool dist_onedir/RechnungsTool/RechnungsTool]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+PROJEKT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJEKT_DIR)
+
+# Budget für den Import von rechnungstool_menu (ohne Interpreterstart)
+STARTBUDGET_MS = 100
+
+# Diese Module dürfen erst beim ersten Rendern geladen werden
+RENDER_MODULE = ("reportlab", "pypdf")
+
+def importzeiten():
+    """Importiert rechnungstool_menu mit -X importtime und gibt {modul: (eigen_us, kumuliert_us)} zurück"""
+    ergebnis = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import rechnungstool_menu"],
+        cwd=PROJEKT_DIR, capture_output=True, text=True, check=True,
+    )
+    zeiten = {}
+    for zeile in ergebnis.stderr.splitlines():
+        if not zeile.startswith("import time:") or "|" not in zeile:
+            continue
+        eigen, kumuliert, modul = (teil.strip() for teil in zeile[len("import time:"):].split("|"))
+        if eigen.isdigit():
+            zeiten[modul] = (int(eigen), int(kumuliert))
+    return zeiten
+
+def kaltstart(befehl, laeufe):
+    """Median und Minimum der Laufzeit eines Befehls in Millisekunden"""
+    dauern = []
+    for _ in range(laeufe):
+        start = time.perf_counter()
+        subprocess.run(befehl, cwd=PROJEKT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        dauern.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(dauern), min(dauern)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--laeufe", type=int, default=10, help="Anzahl Kaltstarts je Befehl")
+    parser.add_argument("--top", type=int, default=15, help="Anzahl der teuersten Module in der Importliste")
+    parser.add_argument("--binary", nargs="*", default=[], help="Kompilierte RechnungsTool-Binaries zum Vergleich")
+    args = parser.parse_args()
+
+    print("📊 PROGRAMMSTART")
+    print("=" * 72)
+    zeiten = importzeiten()
+    gesamt_ms = zeiten["rechnungstool_menu"][1] / 1e3
+    print(f"{'Modul':<48}{'eigen ms':>11}{'kumuliert ms':>13}")
+    print("-" * 72)
+    for modul, (eigen, kumuliert) in sorted(zeiten.items(), key=lambda eintrag: -eintrag[1][1])[:args.top]:
+        print(f"{modul:<48}{eigen / 1e3:>11.1f}{kumuliert / 1e3:>13.1f}")
+    print("-" * 72)
+
+    geladen = sorted(modul for modul in zeiten if modul.split(".")[0] in RENDER_MODULE)
+    if geladen:
+        print(f"⚠️ Beim Start geladen: {', '.join(geladen[:5])}{' ...' if len(geladen) > 5 else ''}")
+    else:
+        print(f"✅ {', '.join(RENDER_MODULE)} werden erst beim ersten Rendern geladen")
+
+    im_budget = gesamt_ms <= STARTBUDGET_MS
+    print(f"{'✅' if im_budget else '❌'} Import rechnungstool_menu: {gesamt_ms:.1f} ms (Budget {STARTBUDGET_MS} ms)")
+
+    print()
+    print(f"{'Kaltstart (--help)':<48}{'Median ms':>11}{'Min ms':>13}")
+    print("-" * 72)
+    befehle = [("python -S -c pass (Interpreter)", [sys.executable, "-S", "-c", "pass"]),
+               ("python rechnungstool_menu.py", [sys.executable, "rechnungstool_menu.py", "--help"])]
+    befehle += [(os.path.relpath(binary, PROJEKT_DIR), [os.path.abspath(binary), "--help"]) for binary in args.binary]
+    for name, befehl in befehle:
+        median, minimum = kaltstart(befehl, args.laeufe)
+        print(f"{name[:47]:<48}{median:>11.1f}{minimum:>13.1f}")
+
+    return 0 if im_budget and not geladen else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
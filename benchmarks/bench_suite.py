@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark-Suite: Rechnungserstellung und Kundenbestand
+======================================================
+
+Misst mit synthetischen, reproduzierbaren Daten (fester Zufallsstartwert)
+für jedes Szenario Zeit pro Rechnung, Spitzen-Speicherbedarf (Peak RSS)
+und die Größe der erzeugten Dateien:
+
+- Rechnungen mit 3, 100 und 10.000 Positionen, jeweils regelbesteuert
+  (19 % und 7 %) und als Kleinunternehmer, mit und ohne Logo
+  (erzeuge_rechnungsdateien ohne Render-Cache)
+- Kundenbestände mit 10 bis 100.000 Kunden: Laden des RechnungsManagers,
+  neue Kundennummer, eine Rechnung mit dem geladenen Bestand
+- Render-Cache: neue Rechnungen ohne und mit Cache, dieselben Rechnungen
+  unter denselben Nummern erneut (Dateien vorhanden bzw. gelöscht und per
+  Hardlink wiederhergestellt) und ein wiederholter batch-Lauf, der die
+  Nummern des ersten Laufs wiederverwendet
+
+Jedes Szenario läuft in einem eigenen Prozess, damit Peak RSS und Caches
+(Logo, reportlab) nicht vom vorherigen Szenario stammen. Die erste
+Rechnung eines Szenarios (reportlab laden) wird separat als erste_ms
+ausgewiesen. Ergebnisse lassen sich als JSON speichern und mit einem
+früheren Lauf vergleichen:
+
+Aufruf:
+    python benchmarks/bench_suite.py [--ausgabe ergebnisse.json] [--vergleich alt.json]
+        [--schnell] [--nur positionen|kunden|cache] [--wiederholungen 20]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+PROJEKT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJEKT_DIR)
+
+POSITIONEN = [3, 100, 10000]
+KUNDENBESTAENDE = [10, 1000, 10000, 100000]
+
+NAMEN = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Hoffmann", "Schulz"]
+BRANCHEN = ["Bau", "Consulting", "Software", "Logistik", "Design"]
+RECHTSFORMEN = ["GmbH", "AG", "KG", "e.K.", "UG"]
+ORTE = ["Berlin", "München", "Hamburg", "Köln", "Frankfurt", "Stuttgart", "Düsseldorf", "Leipzig"]
+LEISTUNGEN = ["Beratung", "Montage", "Wartung", "Schulung", "Fachbuch", "Lizenz", "Material", "Anfahrt", "Support"]
+
+KUNDEN_SPALTEN = ["Kundennummer", "Firmenname", "Ansprechpartner", "Straße", "Hausnummer", "PLZ", "Ort", "Land",
+                  "Telefon", "Email", "Bemerkungen"]
+
+def erzeuge_kunden(anzahl, startwert=1):
+    """Synthetische Kunden {Kundennummer: Daten}, bei gleichem Startwert identisch"""
+    zufall = random.Random(startwert)
+    kunden = {}
+    for i in range(anzahl):
+        nummer = f"K{i:08X}"
+        name = zufall.choice(NAMEN)
+        kunden[nummer] = {
+            "Kundennummer": nummer,
+            "Firmenname": f"{name} {zufall.choice(BRANCHEN)} {i} {zufall.choice(RECHTSFORMEN)}",
+            "Ansprechpartner": f"{zufall.choice(['Anna', 'Jan', 'Eva', 'Tom'])} {name}",
+            "Straße": f"{zufall.choice(NAMEN)}straße", "Hausnummer": str(zufall.randint(1, 200)),
+            "PLZ": f"{zufall.randint(10000, 99999)}", "Ort": zufall.choice(ORTE), "Land": "DE",
+            "Telefon": f"+49 {zufall.randint(30, 999)} {zufall.randint(100000, 999999)}",
+            "Email": f"kontakt{i}@example.de", "Bemerkungen": "",
+        }
+    return kunden
+
+def erzeuge_positionen(anzahl, kleinunternehmer=False, startwert=1):
+    """Synthetische Positionen; regelbesteuert etwa jede vierte mit 7 %"""
+    zufall = random.Random(startwert)
+    positionen = []
+    for i in range(anzahl):
+        position = {
+            "bezeichnung": f"{zufall.choice(LEISTUNGEN)} {i + 1}",
+            "menge": zufall.choice([1, 1, 2, 3, 0.5, 1.25, 10]),
+            "einzelpreis": round(zufall.uniform(1, 500), 2),
+        }
+        if not kleinunternehmer:
+            position["steuersatz"] = 7 if zufall.random() < 0.25 else 19
+        positionen.append(position)
+    return positionen
+
+def schreibe_kunden_csv(pfad, kunden):
+    import csv
+    with open(pfad, "w", encoding="utf-8", newline="") as f:
+        schreiber = csv.DictWriter(f, fieldnames=KUNDEN_SPALTEN)
+        schreiber.writeheader()
+        schreiber.writerows(kunden.values())
+
+def schreibe_logo(pfad):
+    """Logo in typischer Größe (1200x600, farbig mit Transparenz)"""
+    from PIL import Image, ImageDraw
+    bild = Image.new("RGBA", (1200, 600), (0, 0, 0, 0))
+    zeichnung = ImageDraw.Draw(bild)
+    zeichnung.ellipse((50, 50, 550, 550), fill=(30, 90, 160, 255))
+    zeichnung.rectangle((600, 200, 1150, 400), fill=(220, 120, 30, 200))
+    bild.save(pfad)
+
+def peak_rss_bytes():
+    """Spitzen-Speicherbedarf dieses Prozesses in Bytes (None ohne resource, z.B. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet KiB, macOS Bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def bereite_verzeichnis_vor(verzeichnis, kunden, logo=False, kleinunternehmer=False):
+    """Datenverzeichnis mit unternehmen.csv, kunden.csv und ggf. Logo"""
+    import shutil
+    import rechnungstool_backend
+    shutil.copy2(os.path.join(PROJEKT_DIR, "unternehmen.csv"), verzeichnis)
+    if kleinunternehmer:
+        with open(os.path.join(verzeichnis, "unternehmen.csv"), "r", encoding="utf-8") as f:
+            inhalt = f.read()
+        with open(os.path.join(verzeichnis, "unternehmen.csv"), "w", encoding="utf-8") as f:
+            f.write(inhalt.replace('"nein"', '"ja"'))
+    schreibe_kunden_csv(os.path.join(verzeichnis, "kunden.csv"), kunden)
+    # Das Logo wird neben dem Programm gesucht: für den Benchmark im temporären Verzeichnis
+    logo_dir = os.path.join(verzeichnis, "programm")
+    os.makedirs(logo_dir)
+    if logo:
+        schreibe_logo(os.path.join(logo_dir, "logo.png"))
+    rechnungstool_backend.programm_verzeichnis = lambda: logo_dir
+
+def miss_rechnungen(manager, positionen, wiederholungen, erste_nummer=0):
+    """Erzeugt wiederholungen+1 Rechnungen; gibt (erste_ms, [ms], Bytes der letzten) zurück"""
+    from rechnungstool_backend import erzeuge_rechnungsdateien
+    kundennummer = next(iter(manager.kunden))
+    dauern = []
+    dateien = {}
+    for i in range(wiederholungen + 1):
+        start = time.perf_counter()
+        dateien = erzeuge_rechnungsdateien(f"2025-01-01-{erste_nummer + i:04d}", manager.kunden[kundennummer],
+                                           manager.unternehmen_daten, "01.01.2025", positionen, manager.rechnungen_dir)
+        dauern.append((time.perf_counter() - start) * 1e3)
+    return dauern[0], dauern[1:], sum(os.path.getsize(pfad) for pfad in dateien.values())
+
+def szenario_positionen(parameter):
+    """Eine Rechnungsgröße mit/ohne Kleinunternehmer und Logo"""
+    from rechnungstool_menu import RechnungsManager
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        bereite_verzeichnis_vor(verzeichnis, erzeuge_kunden(10), parameter["logo"], parameter["kleinunternehmer"])
+        manager = RechnungsManager(verzeichnis)
+        positionen = erzeuge_positionen(parameter["positionen"], parameter["kleinunternehmer"])
+        erste_ms, dauern, ausgabe_bytes = miss_rechnungen(manager, positionen, parameter["wiederholungen"])
+    return {"erste_ms": erste_ms, "ms_pro_rechnung": statistics.median(dauern), "min_ms": min(dauern),
+            "ausgabe_bytes": ausgabe_bytes}
+
+def szenario_kunden(parameter):
+    """Kundenbestand: Laden, neue Kundennummer, eine Rechnung"""
+    from rechnungstool_menu import RechnungsManager
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        bereite_verzeichnis_vor(verzeichnis, erzeuge_kunden(parameter["kunden"]))
+        start = time.perf_counter()
+        manager = RechnungsManager(verzeichnis)
+        laden_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        manager.generiere_kundennummer({"Firmenname": "Neukunde Benchmark GmbH", "Straße": "Teststraße", "PLZ": "12345", "Ort": "Berlin"})
+        kundennummer_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        manager.kundensuche().suche("müller bau")
+        suche_ms = (time.perf_counter() - start) * 1e3
+
+        erste_ms, dauern, ausgabe_bytes = miss_rechnungen(manager, erzeuge_positionen(3), parameter["wiederholungen"])
+    return {"laden_ms": laden_ms, "kundennummer_ms": kundennummer_ms, "erste_suche_ms": suche_ms, "erste_ms": erste_ms,
+            "ms_pro_rechnung": statistics.median(dauern), "min_ms": min(dauern), "ausgabe_bytes": ausgabe_bytes}
+
+def szenario_cache(parameter):
+    """Render-Cache: neue Nummern mit und ohne Cache, gleiche Nummern (Treffer) und ein wiederholter batch-Lauf"""
+    from rechnungstool_menu import RechnungsManager
+    from rechnungstool_backend import erzeuge_rechnungsdateien
+    from rechnungstool_batch import erstelle_rechnungen_batch
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        bereite_verzeichnis_vor(verzeichnis, erzeuge_kunden(10))
+        manager = RechnungsManager(verzeichnis)
+        kundennummer, kunde = next(iter(manager.kunden.items()))
+        positionen = erzeuge_positionen(parameter["positionen"])
+
+        def lauf(erste_nummer, loeschen=False, cache=manager.render_cache):
+            dauern = []
+            for i in range(parameter["wiederholungen"]):
+                nummer = f"2025-01-01-{erste_nummer + i:04d}"
+                if loeschen:
+                    for name in (f"Rechnung_{nummer}.pdf", f"XRechnung_{nummer}.xml"):
+                        os.remove(os.path.join(manager.rechnungen_dir, name))
+                start = time.perf_counter()
+                dateien = erzeuge_rechnungsdateien(nummer, kunde, manager.unternehmen_daten, "01.01.2025", positionen,
+                                                   manager.rechnungen_dir, cache=cache)
+                dauern.append((time.perf_counter() - start) * 1e3)
+            return statistics.median(dauern), dateien
+
+        def batch_lauf(auftraege):
+            start = time.perf_counter()
+            ergebnisse = erstelle_rechnungen_batch(manager, auftraege, prozesse=1)
+            assert all(ergebnis["erfolg"] for ergebnis in ergebnisse)
+            return (time.perf_counter() - start) * 1e3 / len(auftraege)
+
+        erste_ms, _ = lauf(0)
+        ohne_cache_ms, _ = lauf(10 * parameter["wiederholungen"], cache=None)
+        gleiche_ms, dateien = lauf(0)
+        geloescht_ms, _ = lauf(0, loeschen=True)
+        neue_ms, _ = lauf(parameter["wiederholungen"])
+        # Gleiche Aufträge in einem Lauf erhalten je eine eigene Rechnung, der zweite Lauf übernimmt sie alle
+        auftraege = [{"kundennummer": kundennummer, "datum": "02.01.2025", "positionen": positionen}] * parameter["wiederholungen"]
+        batch_lauf(auftraege)
+        wiederholt_ms = batch_lauf(auftraege)
+        ausgabe_bytes = sum(os.path.getsize(pfad) for pfad in dateien.values())
+    return {"erste_ms": erste_ms, "ms_pro_rechnung": gleiche_ms, "min_ms": gleiche_ms, "ohne_cache_ms": ohne_cache_ms,
+            "wiederhergestellt_ms": geloescht_ms, "neue_nummern_ms": neue_ms, "wiederholter_lauf_ms": wiederholt_ms,
+            "ausgabe_bytes": ausgabe_bytes}
+
+SZENARIEN = {"positionen": szenario_positionen, "kunden": szenario_kunden, "cache": szenario_cache}
+
+def fuehre_szenario_aus(parameter):
+    """Im Kindprozess: Szenario ausführen, Meldungen des Tools nach stderr"""
+    with contextlib.redirect_stdout(sys.stderr):
+        ergebnis = SZENARIEN[parameter["art"]](parameter)
+    ergebnis["peak_rss_bytes"] = peak_rss_bytes()
+    print(json.dumps(ergebnis))
+
+def szenarien(args):
+    """Alle Szenarien als (Name, Parameter)"""
+    positionen = [anzahl for anzahl in POSITIONEN if not args.schnell or anzahl <= 100]
+    kundenbestaende = [anzahl for anzahl in KUNDENBESTAENDE if not args.schnell or anzahl <= 10000]
+    if args.nur in (None, "positionen"):
+        for anzahl in positionen:
+            for kleinunternehmer in (False, True):
+                for logo in (False, True):
+                    name = f"positionen={anzahl} {'kleinunternehmer' if kleinunternehmer else 'regelbesteuert'} {'logo' if logo else 'ohne_logo'}"
+                    # Große Rechnungen seltener wiederholen
+                    wiederholungen = max(1, min(args.wiederholungen, args.wiederholungen * 100 // anzahl))
+                    yield name, {"art": "positionen", "positionen": anzahl, "kleinunternehmer": kleinunternehmer,
+                                 "logo": logo, "wiederholungen": wiederholungen}
+    if args.nur in (None, "kunden"):
+        for anzahl in kundenbestaende:
+            yield f"kunden={anzahl}", {"art": "kunden", "kunden": anzahl, "wiederholungen": args.wiederholungen}
+    if args.nur in (None, "cache"):
+        for anzahl in positionen:
+            yield f"cache positionen={anzahl}", {"art": "cache", "positionen": anzahl,
+                                                 "wiederholungen": max(1, min(args.wiederholungen, args.wiederholungen * 100 // anzahl))}
+
+def git_stand():
+    try:
+        return subprocess.run(["git", "-C", PROJEKT_DIR, "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def vergleiche(ergebnisse, alt_pfad):
+    with open(alt_pfad, "r", encoding="utf-8") as f:
+        alt = json.load(f)
+    print(f"\n📊 VERGLEICH mit {alt_pfad} (Stand {alt['meta'].get('git') or '?'})")
+    print("=" * 90)
+    print(f"{'Szenario':<48}{'ms alt':>9}{'ms neu':>9}{'Faktor':>9}{'RSS MB alt/neu':>15}")
+    print("-" * 90)
+    for name, neu in ergebnisse.items():
+        vorher = alt["szenarien"].get(name)
+        if vorher is None:
+            print(f"{name:<48}{'-':>9}{neu['ms_pro_rechnung']:>9.1f}")
+            continue
+        faktor = neu["ms_pro_rechnung"] / vorher["ms_pro_rechnung"] if vorher["ms_pro_rechnung"] else float("nan")
+        rss = "-"
+        if vorher.get("peak_rss_bytes") and neu.get("peak_rss_bytes"):
+            rss = f"{vorher['peak_rss_bytes'] / 2**20:.0f}/{neu['peak_rss_bytes'] / 2**20:.0f}"
+        # Unter 20 % liegt meist im Messrauschen
+        warnung = " ⚠️" if faktor > 1.2 else ""
+        print(f"{name:<48}{vorher['ms_pro_rechnung']:>9.1f}{neu['ms_pro_rechnung']:>9.1f}{faktor:>8.2f}x{rss:>15}{warnung}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ausgabe", help="Ergebnisse als JSON speichern")
+    parser.add_argument("--vergleich", help="Mit einem früher gespeicherten JSON-Ergebnis vergleichen")
+    parser.add_argument("--schnell", action="store_true", help="Ohne 10.000 Positionen und 100.000 Kunden")
+    parser.add_argument("--nur", choices=sorted(SZENARIEN), help="Nur Rechnungsgrößen oder nur Kundenbestände")
+    parser.add_argument("--wiederholungen", type=int, default=20, help="Rechnungen je Szenario (nach der ersten)")
+    parser.add_argument("--szenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.szenario:
+        fuehre_szenario_aus(json.loads(args.szenario))
+        return
+
+    print("📊 BENCHMARK-SUITE")
+    print("=" * 96)
+    print(f"{'Szenario':<48}{'erste ms':>10}{'ms/Rechnung':>13}{'Peak RSS MB':>13}{'Ausgabe KB':>12}")
+    print("-" * 96)
+    ergebnisse = {}
+    for name, parameter in szenarien(args):
+        lauf = subprocess.run([sys.executable, os.path.abspath(__file__), "--szenario", json.dumps(parameter)],
+                              capture_output=True, text=True)
+        if lauf.returncode != 0:
+            print(f"{name:<48}❌ {lauf.stderr.strip().splitlines()[-1] if lauf.stderr.strip() else lauf.returncode}")
+            continue
+        ergebnis = json.loads(lauf.stdout.strip().splitlines()[-1])
+        ergebnis["parameter"] = parameter
+        ergebnisse[name] = ergebnis
+        rss = f"{ergebnis['peak_rss_bytes'] / 2**20:.0f}" if ergebnis["peak_rss_bytes"] else "-"
+        print(f"{name:<48}{ergebnis['erste_ms']:>10.1f}{ergebnis['ms_pro_rechnung']:>13.1f}{rss:>13}"
+              f"{ergebnis['ausgabe_bytes'] / 1024:>12.1f}")
+        if "neue_nummern_ms" in ergebnis:
+            print(f"{'':<6}Neue Nummer ohne Cache {ergebnis['ohne_cache_ms']:.1f} ms, mit Cache {ergebnis['neue_nummern_ms']:.1f} ms, "
+                  f"gleiche Nummer {ergebnis['ms_pro_rechnung']:.1f} ms, wiederhergestellt {ergebnis['wiederhergestellt_ms']:.1f} ms, "
+                  f"wiederholter batch-Lauf {ergebnis['wiederholter_lauf_ms']:.1f} ms")
+        if "laden_ms" in ergebnis:
+            print(f"{'':<6}Laden {ergebnis['laden_ms']:.1f} ms, neue Kundennummer {ergebnis['kundennummer_ms']:.1f} ms, "
+                  f"erste Suche {ergebnis['erste_suche_ms']:.1f} ms")
+
+    if args.ausgabe:
+        meta = {"zeitpunkt": datetime.now().isoformat(timespec="seconds"), "git": git_stand(),
+                "python": platform.python_version(), "plattform": platform.platform(), "cpus": os.cpu_count()}
+        with open(args.ausgabe, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "szenarien": ergebnisse}, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Ergebnisse gespeichert: {args.ausgabe}")
+    if args.vergleich:
+        vergleiche(ergebnisse, args.vergleich)
+
+if __name__ == "__main__":
+    main()
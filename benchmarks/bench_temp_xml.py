@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: temporäre CII-XML-Datei pro Rechnung
+===============================================
+
+Vergleicht den früheren Ablauf (CII-XML erzeugen, als temp_invoice_<nr>.xml
+schreiben, wieder löschen) mit dem heutigen Ablauf, in dem die CII-XML nur
+noch im Speicher entsteht bzw. gar nicht erzeugt wird, wenn niemand sie
+anfordert.
+
+Aufruf:
+    python benchmarks/bench_temp_xml.py [--anzahl 2000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rechnungstool_backend import erstelle_zugferd_xml
+
+UNTERNEHMEN = {
+    "Firmenname": "Musterfirma GmbH", "Straße": "Musterstraße", "Hausnummer": "123",
+    "PLZ": "12345", "Ort": "Musterstadt", "Land": "DE", "Telefon": "+49 123 456789",
+    "Email": "info@musterfirma.de", "USt-IdNr": "DE123456789", "IBAN": "DE89 3704 0044 0532 0130 00",
+    "BIC": "COBADEFFXXX", "Bank": "Commerzbank AG", "Kleinunternehmer": "nein",
+}
+KUNDE = {
+    "Kundennummer": "K001", "Firmenname": "ABC Consulting GmbH", "Ansprechpartner": "Anna Schmidt",
+    "Straße": "Berliner Straße", "Hausnummer": "456", "PLZ": "10115", "Ort": "Berlin", "Land": "DE",
+    "Email": "anna.schmidt@abc-consulting.de",
+}
+POSITIONEN = [{"bezeichnung": "Beratung", "menge": 2.0, "einzelpreis": 95.0}]
+
+def messe(funktion, anzahl):
+    start = time.perf_counter()
+    for i in range(anzahl):
+        funktion(i)
+    return (time.perf_counter() - start) / anzahl
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anzahl", type=int, default=2000, help="Anzahl simulierter Rechnungen")
+    args = parser.parse_args()
+
+    betrag = sum(pos["menge"] * pos["einzelpreis"] for pos in POSITIONEN)
+    geschriebene_bytes = []
+
+    with tempfile.TemporaryDirectory() as arbeitsverzeichnis:
+        def alt(i):
+            # Früherer Ablauf: Datei anlegen, schreiben, schließen, löschen
+            pfad = os.path.join(arbeitsverzeichnis, f"temp_invoice_2025-01-01-{i:05d}.xml")
+            inhalt = erstelle_zugferd_xml(f"2025-01-01-{i:05d}", KUNDE, UNTERNEHMEN, "01.01.2025", POSITIONEN, betrag, None)
+            with open(pfad, "w", encoding="utf-8") as f:
+                f.write(inhalt)
+            geschriebene_bytes.append(os.path.getsize(pfad))
+            os.remove(pfad)
+
+        def im_speicher(i):
+            # CII-XML angefordert, aber nicht materialisiert (z.B. für Einbettung)
+            erstelle_zugferd_xml(f"2025-01-01-{i:05d}", KUNDE, UNTERNEHMEN, "01.01.2025", POSITIONEN, betrag, None)
+
+        def nicht_angefordert(i):
+            # Standardfall in erstelle_rechnung: CII-XML wird gar nicht erzeugt
+            pass
+
+        # Ausgabe von erstelle_zugferd_xml nicht mitmessen
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            t_alt = messe(alt, args.anzahl)
+            t_speicher = messe(im_speicher, args.anzahl)
+            t_nichts = messe(nicht_angefordert, args.anzahl)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    bytes_pro_rechnung = sum(geschriebene_bytes) / len(geschriebene_bytes)
+
+    print("📊 TEMPORÄRE CII-XML PRO RECHNUNG")
+    print("=" * 60)
+    print(f"Rechnungen:                       {args.anzahl}")
+    print(f"Alt (schreiben + löschen):        {t_alt * 1e6:9.1f} µs/Rechnung")
+    print(f"Neu, CII im Speicher:             {t_speicher * 1e6:9.1f} µs/Rechnung")
+    print(f"Neu, CII nicht angefordert:       {t_nichts * 1e6:9.1f} µs/Rechnung")
+    print("-" * 60)
+    print(f"Eingesparte Schreib-I/O:          {bytes_pro_rechnung:9.0f} Bytes/Rechnung")
+    print("Eingesparte Dateioperationen:     open/create, write, close, stat, unlink")
+    print(f"Zeitersparnis (Standardfall):     {(t_alt - t_nichts) * 1e6:9.1f} µs/Rechnung")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: XRechnung-XML mit vielen Positionen
+==============================================
+
+Vergleicht den früheren Aufbau der XRechnung (gesamtes Dokument per
+xml_content += ... als String, danach ein Schreibvorgang) mit dem
+inkrementellen Schreiben in erstelle_xrechnung_xml. Gemessen werden Laufzeit
+und Spitzen-Speicherverbrauch (tracemalloc).
+
+Aufruf:
+    python benchmarks/bench_xrechnung_stream.py [--positionen 10 1000 100000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rechnungstool_backend import erstelle_xrechnung_xml, xrechnung_kopf, xrechnung_position
+from rechnungstool_summen import berechne_summen, satz_text
+
+UNTERNEHMEN = {
+    "Firmenname": "Musterfirma GmbH", "Straße": "Musterstraße", "Hausnummer": "123",
+    "PLZ": "12345", "Ort": "Musterstadt", "Land": "DE", "Telefon": "+49 123 456789",
+    "Email": "info@musterfirma.de", "USt-IdNr": "DE123456789", "IBAN": "DE89 3704 0044 0532 0130 00",
+    "BIC": "COBADEFFXXX", "Bank": "Commerzbank AG", "Kleinunternehmer": "nein",
+}
+KUNDE = {
+    "Kundennummer": "K001", "Firmenname": "ABC Consulting GmbH", "Ansprechpartner": "Anna Schmidt",
+    "Straße": "Berliner Straße", "Hausnummer": "456", "PLZ": "10115", "Ort": "Berlin", "Land": "DE",
+    "Email": "anna.schmidt@abc-consulting.de",
+}
+
+def erzeuge_positionen(anzahl):
+    return [
+        {"bezeichnung": f"API-Aufrufe Tarif {i % 7} (Zeitraum {i})", "menge": float(i % 50 + 1), "einzelpreis": 0.25}
+        for i in range(anzahl)
+    ]
+
+def alt(pfad, positionen, summen):
+    """Früherer Ablauf: ganzes Dokument als String aufbauen, dann schreiben"""
+    kategorie = summen.steuergruppen[0]["kategorie"]
+    prozent = satz_text(summen.steuergruppen[0]["satz"])
+    xml_content = xrechnung_kopf("2025-01-01-01", KUNDE, UNTERNEHMEN, "01.01.2025", summen)
+    for i, pos in enumerate(positionen, 1):
+        xml_content += xrechnung_position(i, pos, summen.linie(i - 1), kategorie, prozent)
+    xml_content += """
+</ubl:Invoice>"""
+    with open(pfad, "w", encoding="utf-8") as f:
+        f.write(xml_content)
+
+def neu(pfad, positionen, summen):
+    erstelle_xrechnung_xml("2025-01-01-01", KUNDE, UNTERNEHMEN, "01.01.2025", positionen, summen, pfad)
+
+def messe(funktion, pfad, positionen, summen):
+    """Gibt (Sekunden, Spitzen-Speicher in Bytes) zurück"""
+    # Laufzeit ohne tracemalloc messen, das die Ausführung deutlich bremst
+    start = time.perf_counter()
+    funktion(pfad, positionen, summen)
+    dauer = time.perf_counter() - start
+
+    tracemalloc.start()
+    funktion(pfad, positionen, summen)
+    _, spitze = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dauer, spitze
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positionen", type=int, nargs="+", default=[10, 1000, 100000], help="Anzahl Positionen pro Rechnung")
+    args = parser.parse_args()
+
+    print("📊 XRECHNUNG-XML: STRING-AUFBAU VS. INKREMENTELL")
+    print("=" * 72)
+    print(f"{'Positionen':>10}  {'Variante':<14}{'ms':>12}{'Spitze KiB':>14}{'Datei KiB':>12}")
+    print("-" * 72)
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        pfad = os.path.join(verzeichnis, "XRechnung.xml")
+        for anzahl in args.positionen:
+            positionen = erzeuge_positionen(anzahl)
+            summen = berechne_summen(positionen)
+            for name, funktion in (("alt (String)", alt), ("inkrementell", neu)):
+                dauer, spitze = messe(funktion, pfad, positionen, summen)
+                print(f"{anzahl:>10}  {name:<14}{dauer * 1e3:>12.2f}{spitze / 1024:>14.0f}{os.path.getsize(pfad) / 1024:>12.0f}")
+            print("-" * 72)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,12 @@ Build-Script für Rechnungstool - Apple Silicon Native
 
 Kompiliert das Rechnungstool als natives ARM64 Binary für M1/M2/M3 Macs
 ACHTUNG: Funktioniert nur auf Apple Silicon Macs!
+
+Aufruf:
+    python build_apple_silicon.py [--profil onefile|onedir] [--kein-upx]
+
+Das Profil onedir startet schneller (kein Entpacken bei jedem Start), siehe
+benchmarks/bench_startup.py --binary.
 """
 
 import os
@@ -13,8 +19,31 @@ import subprocess
 import sys
 import shutil
 import platform
+import argparse
 from pathlib import Path
 
+# Build-Profile: onefile = eine Datei, die bei jedem Start entpackt wird;
+# onedir = Ordner mit Executable und Bibliotheken, startet ohne Entpacken
+BUILD_PROFILE = ("onefile", "onedir")
+
+def kopiere_executable(quelle, ziel_dir, exe_name):
+    """Kopiert das PyInstaller-Ergebnis (onefile: Datei, onedir: Ordner) in die Distribution"""
+    ziel = os.path.join(ziel_dir, exe_name)
+    if os.path.isdir(quelle):
+        # onedir: Executable und Bibliotheken (_internal/) liegen nebeneinander
+        name = os.path.basename(quelle)
+        for eintrag in os.listdir(quelle):
+            src = os.path.join(quelle, eintrag)
+            dst = ziel if eintrag == name else os.path.join(ziel_dir, eintrag)
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, symlinks=True)
+            else:
+                shutil.copy2(src, dst)
+    else:
+        shutil.copy2(quelle, ziel)
+    os.chmod(ziel, 0o755)
+    return ziel
+
 def check_apple_silicon():
     """Prüft ob wir auf Apple Silicon laufen"""
     machine = platform.machine()
@@ -31,10 +60,11 @@ def check_apple_silicon():
     print("✅ Apple Silicon erkannt - natives ARM64 Build möglich!")
     return True
 
-def build_rechnungstool_silicon():
-    """Kompiliert das Rechnungstool als ARM64 Binary"""
+def build_rechnungstool_silicon(profil="onefile", upx=True):
+    """Kompiliert das Rechnungstool als ARM64 Binary (profil: onefile oder onedir, upx: UPX-Kompression)"""
     print("🚀 RECHNUNGSTOOL KOMPILIERUNG - APPLE SILICON NATIVE")
     print("=" * 65)
+    print(f"📦 Profil: {profil}{'' if upx else ' ohne UPX'}")
     
     if not check_apple_silicon():
         return False
@@ -47,6 +77,21 @@ def build_rechnungstool_silicon():
     required_files = [
         "rechnungstool_menu.py",
         "rechnungstool_backend.py", 
+        "rechnungstool_summen.py",
+        "rechnungstool_nummern.py",
+        "rechnungstool_kunden.py",
+        "rechnungstool_suche.py",
+        "rechnungstool_batch.py",
+        "rechnungstool_server.py",
+        "rechnungstool_pipeline.py",
+        "rechnungstool_cache.py",
+        "rechnungstool_journal.py",
+        "rechnungstool_ablage.py",
+        "rechnungstool_export.py",
+        "rechnungstool_metriken.py",
+        "rechnungstool_protokoll.py",
+        "rechnungstool_kundennummern.py",
+        "rechnungstool_kundenimport.py",
         "unternehmen.csv"
     ]
     
@@ -128,17 +173,20 @@ exe = EXE(
     cmd = [
         pyinstaller_exe,
         "--clean",
-        "--onefile", 
+        f"--{profil}",
         "--name=RechnungsTool_Silicon",
         "--target-arch=arm64",  # Explizit ARM64
         "--codesign-identity=-",  # Ad-hoc signing
         "--hidden-import=reportlab",
+        "--hidden-import=reportlab.pdfgen.canvas",  # wird erst beim ersten Rendern importiert
         "--hidden-import=pypdf", 
         "--hidden-import=lxml",
         "--hidden-import=xml.etree.ElementTree",
         "--console",
         "rechnungstool_menu.py"
     ]
+    if not upx:
+        cmd.insert(-1, "--noupx")
     
     print("ℹ️ ARM64-natives Binary für beste Performance auf Apple Silicon")
     print(f"🛠️ Kommando: {' '.join(cmd)}")
@@ -157,13 +205,8 @@ exe = EXE(
                 shutil.rmtree(dist_dir)
             os.makedirs(dist_dir)
             
-            # Kopiere die ARM64-Executable
-            src_exe = os.path.join("dist", "RechnungsTool_Silicon")
-            dst_exe = os.path.join(dist_dir, "RechnungsTool")  # Standardname für Konsistenz
-            shutil.copy2(src_exe, dst_exe)
-            
-            # Executable ausführbar machen
-            os.chmod(dst_exe, 0o755)
+            # Kopiere die ARM64-Executable (bei onedir samt Bibliotheken), Standardname für Konsistenz
+            dst_exe = kopiere_executable(os.path.join("dist", "RechnungsTool_Silicon"), dist_dir, "RechnungsTool")
             
             # Prüfe Architektur des erstellten Binaries
             try:
@@ -173,6 +216,7 @@ exe = EXE(
                 pass
             
             # CSV-Dateien kopieren (extern bearbeitbar)
+            # kundennummer.json (geheimer Schlüssel) nicht mitliefern: jede Installation legt ihre eigene an
             for csv_file in ["unternehmen.csv", "kunden.csv", "rechnungsnummer.json"]:
                 if os.path.exists(csv_file):
                     shutil.copy2(csv_file, dist_dir)
@@ -301,9 +345,14 @@ echo "🎉 Installation abgeschlossen!"
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RechnungsTool für Apple Silicon kompilieren")
+    parser.add_argument("--profil", choices=BUILD_PROFILE, default="onefile", help="onefile (Standard) oder onedir (schnellerer Start)")
+    parser.add_argument("--kein-upx", action="store_true", help="Binärdateien nicht mit UPX komprimieren (schnellerer Start)")
+    args = parser.parse_args()
+    
     print("🎯 Starte Apple Silicon Native Kompilierung...")
     
-    if build_rechnungstool_silicon():
+    if build_rechnungstool_silicon(args.profil, not args.kein_upx):
         print("\n🎉 APPLE SILICON BINARY ERFOLGREICH ERSTELLT!")
         print("🚀 Optimiert für M1/M2/M3 Macs - Beste Performance!")
         print("📦 Distribution bereit für Apple Silicon Macs!")
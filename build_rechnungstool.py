@@ -5,18 +5,48 @@ Build-Script für Rechnungstool
 ==============================
 
 Kompiliert das komplette Rechnungstool in eine ausführbare Datei
+
+Aufruf:
+    python build_rechnungstool.py [--profil onefile|onedir] [--kein-upx]
+
+Das Profil onedir startet schneller (kein Entpacken bei jedem Start), siehe
+benchmarks/bench_startup.py --binary.
 """
 
 import os
 import subprocess
 import sys
 import shutil
+import argparse
 from pathlib import Path
 
-def build_rechnungstool():
-    """Kompiliert das Rechnungstool"""
+# Build-Profile: onefile = eine Datei, die bei jedem Start entpackt wird;
+# onedir = Ordner mit Executable und Bibliotheken, startet ohne Entpacken
+BUILD_PROFILE = ("onefile", "onedir")
+
+def kopiere_executable(quelle, ziel_dir, exe_name):
+    """Kopiert das PyInstaller-Ergebnis (onefile: Datei, onedir: Ordner) in die Distribution"""
+    ziel = os.path.join(ziel_dir, exe_name)
+    if os.path.isdir(quelle):
+        # onedir: Executable und Bibliotheken (_internal/) liegen nebeneinander
+        name = os.path.basename(quelle)
+        for eintrag in os.listdir(quelle):
+            src = os.path.join(quelle, eintrag)
+            dst = ziel if eintrag == name else os.path.join(ziel_dir, eintrag)
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, symlinks=True)
+            else:
+                shutil.copy2(src, dst)
+    else:
+        shutil.copy2(quelle, ziel)
+    os.chmod(ziel, 0o755)
+    return ziel
+
+def build_rechnungstool(profil="onefile", upx=True):
+    """Kompiliert das Rechnungstool (profil: onefile oder onedir, upx: UPX-Kompression)"""
     print("🚀 RECHNUNGSTOOL KOMPILIERUNG")
     print("=" * 60)
+    print(f"📦 Profil: {profil}{'' if upx else ' ohne UPX'}")
     
     # Arbeitsverzeichnis
     work_dir = Path.cwd()
@@ -26,6 +56,21 @@ def build_rechnungstool():
     required_files = [
         "rechnungstool_menu.py",
         "rechnungstool_backend.py", 
+        "rechnungstool_summen.py",
+        "rechnungstool_nummern.py",
+        "rechnungstool_kunden.py",
+        "rechnungstool_suche.py",
+        "rechnungstool_batch.py",
+        "rechnungstool_server.py",
+        "rechnungstool_pipeline.py",
+        "rechnungstool_cache.py",
+        "rechnungstool_journal.py",
+        "rechnungstool_ablage.py",
+        "rechnungstool_export.py",
+        "rechnungstool_metriken.py",
+        "rechnungstool_protokoll.py",
+        "rechnungstool_kundennummern.py",
+        "rechnungstool_kundenimport.py",
         "unternehmen.csv"
     ]
     
@@ -115,11 +160,12 @@ exe = EXE(
     cmd = [
         os.path.join(work_dir, ".venv", "bin", "pyinstaller"),
         "--clean",
-        "--onefile",
+        f"--{profil}",
         "--name=RechnungsTool",
         # KEINE Daten einbetten - extern bearbeitbar lassen
         # "--add-data=unternehmen.csv:.",  # <- Entfernt!
         "--hidden-import=reportlab",
+        "--hidden-import=reportlab.pdfgen.canvas",  # wird erst beim ersten Rendern importiert
         "--hidden-import=pypdf", 
         "--hidden-import=lxml",
         "--hidden-import=xml.etree.ElementTree",
@@ -127,7 +173,10 @@ exe = EXE(
         "--codesign-identity=-",     # Ad-hoc Code Signing (x86_64 läuft via Rosetta auf Apple Silicon)
         "--console",
         "rechnungstool_menu.py"
-    ]    # Logo NICHT einbetten - extern lassen
+    ]
+    if not upx:
+        cmd.insert(-1, "--noupx")
+    # Logo NICHT einbetten - extern lassen
     print("ℹ️ Logo und CSV-Dateien bleiben extern bearbeitbar")
     
     print(f"🛠️ Kommando: {' '.join(cmd)}")
@@ -146,15 +195,11 @@ exe = EXE(
                 shutil.rmtree(dist_dir)
             os.makedirs(dist_dir)
             
-            # Kopiere die Executable
-            src_exe = os.path.join("dist", "RechnungsTool")
-            dst_exe = os.path.join(dist_dir, "RechnungsTool")
-            shutil.copy2(src_exe, dst_exe)
-            
-            # Executable ausführbar machen
-            os.chmod(dst_exe, 0o755)
+            # Kopiere die Executable (bei onedir samt Bibliotheken) und mache sie ausführbar
+            kopiere_executable(os.path.join("dist", "RechnungsTool"), dist_dir, "RechnungsTool")
             
             # CSV-Dateien kopieren (extern bearbeitbar)
+            # kundennummer.json (geheimer Schlüssel) nicht mitliefern: jede Installation legt ihre eigene an
             for csv_file in ["unternehmen.csv", "kunden.csv", "rechnungsnummer.json"]:
                 if os.path.exists(csv_file):
                     shutil.copy2(csv_file, dist_dir)
@@ -256,9 +301,14 @@ echo "🎉 Installation abgeschlossen!"
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RechnungsTool kompilieren")
+    parser.add_argument("--profil", choices=BUILD_PROFILE, default="onefile", help="onefile (Standard) oder onedir (schnellerer Start)")
+    parser.add_argument("--kein-upx", action="store_true", help="Binärdateien nicht mit UPX komprimieren (schnellerer Start)")
+    args = parser.parse_args()
+    
     print("🎯 Starte Rechnungstool-Kompilierung...")
     
-    if build_rechnungstool():
+    if build_rechnungstool(args.profil, not args.kein_upx):
         print("\n🎉 ERFOLGREICH KOMPILIERT!")
         print("📦 Ihr Freunde können jetzt das RechnungsTool_Distribution Ordner verwenden!")
         print("💫 Keine Python-Installation bei Ihren Freunden erforderlich!")
@@ -0,0 +1,233 @@
+"""
+Ablage der Rechnungsdateien
+===========================
+
+Legt PDF, XRechnung und CII-XML nach Rechnungsdatum in Unterverzeichnissen
+von Rechnungen/ ab, statt alle Dateien in ein Verzeichnis zu schreiben:
+
+    Rechnungen/2025/11/Rechnung_2025-11-05-01.pdf
+    Rechnungen/2025/11/XRechnung_2025-11-05-01.xml
+
+Das Layout gehört zum Rechnungsverzeichnis und steht in
+Rechnungen/ablage.json ({"layout": "{jahr}/{monat}"}); ohne diese Datei
+bleibt alles flach in Rechnungen/. Platzhalter: {jahr}, {monat}, {tag}.
+
+Umgestellt wird mit
+
+    python rechnungstool_menu.py rechnungen-migrieren --layout "{jahr}/{monat}"
+
+Dabei werden das neue Layout gespeichert, alle vorhandenen Rechnungen
+verschoben und die Pfade im Rechnungsjournal angepasst. Das darf parallel
+zur Rechnungserstellung laufen: Jede Rechnung wird unter einer geteilten
+Sperre (Rechnungen/.ablage.lock) geschrieben und ins Journal eingetragen,
+die Migration verschiebt jede Rechnung unter der exklusiven Sperre. Eine
+Rechnung liegt so nie halb im alten und halb im neuen Verzeichnis.
+"""
+
+import os
+import json
+import string
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Datei mit dem Layout und Sperrdatei, beide direkt in Rechnungen/
+ABLAGE_DATEI = "ablage.json"
+SPERR_DATEI = ".ablage.lock"
+
+# Erlaubte Platzhalter im Layout
+LAYOUT_FELDER = ("jahr", "monat", "tag")
+
+# Dateinamen einer Rechnung: Präfix und Endung
+RECHNUNGSDATEIEN = (("Rechnung_", ".pdf"), ("XRechnung_", ".xml"), ("CII_", ".xml"))
+
+# Prozessweiter Cache: Rechnungsverzeichnis -> (mtime/Größe von ablage.json, Layout)
+LAYOUT_CACHE = {}
+
+def pruefe_layout(layout):
+    """Gibt das normalisierte Layout zurück oder löst ValueError aus"""
+    layout = (layout or "").strip().strip("/")
+    if layout in ("", "flach"):
+        return ""
+    for _, feld, format_angabe, _ in string.Formatter().parse(layout):
+        if feld is not None and (feld not in LAYOUT_FELDER or format_angabe):
+            raise ValueError(f"Unbekannter Platzhalter im Layout: {{{feld}}} (erlaubt: {', '.join('{' + f + '}' for f in LAYOUT_FELDER)})")
+    teile = layout.split("/")
+    if any(teil in ("", ".", "..") or teil.startswith(".") or "\\" in teil for teil in teile):
+        raise ValueError(f"Ungültiges Layout: {layout}")
+    return layout
+
+def lies_layout(rechnungen_dir):
+    """Aktuelles Layout des Rechnungsverzeichnisses ("" = flach)"""
+    pfad = os.path.join(rechnungen_dir, ABLAGE_DATEI)
+    try:
+        info = os.stat(pfad)
+    except FileNotFoundError:
+        return ""
+    stempel = (info.st_mtime_ns, info.st_size)
+    eintrag = LAYOUT_CACHE.get(rechnungen_dir)
+    if eintrag is not None and eintrag[0] == stempel:
+        return eintrag[1]
+    with open(pfad, "r", encoding="utf-8") as f:
+        layout = pruefe_layout(json.load(f).get("layout", ""))
+    LAYOUT_CACHE[rechnungen_dir] = (stempel, layout)
+    return layout
+
+def speichere_layout(rechnungen_dir, layout):
+    """Schreibt ablage.json atomar (temporäre Datei + os.replace)"""
+    pfad = os.path.join(rechnungen_dir, ABLAGE_DATEI)
+    temp_pfad = f"{pfad}.{os.getpid()}.tmp"
+    with open(temp_pfad, "w", encoding="utf-8") as f:
+        json.dump({"layout": layout}, f)
+    os.replace(temp_pfad, pfad)
+
+def ablage_verzeichnis(rechnungen_dir, datum, layout=None, anlegen=True):
+    """Verzeichnis für die Dateien einer Rechnung vom datum (TT.MM.JJJJ oder JJJJ-MM-TT)"""
+    if layout is None:
+        layout = lies_layout(rechnungen_dir)
+    if not layout or not datum:
+        return rechnungen_dir
+    tag = datetime.strptime(datum, "%Y-%m-%d" if "-" in datum else "%d.%m.%Y")
+    verzeichnis = os.path.join(rechnungen_dir, *layout.format(jahr=f"{tag.year:04d}", monat=f"{tag.month:02d}", tag=f"{tag.day:02d}").split("/"))
+    if anlegen:
+        os.makedirs(verzeichnis, exist_ok=True)
+    return verzeichnis
+
+@contextmanager
+def ablage_sperre(rechnungen_dir, exklusiv=False):
+    """Sperre auf das Rechnungsverzeichnis: geteilt beim Schreiben einer Rechnung, exklusiv beim Verschieben.
+
+    Windows kennt keine geteilten Dateisperren; dort sperrt nur die
+    Migration (exklusiv), das Schreiben einer Rechnung läuft ohne Sperre.
+    """
+    if not fcntl and not exklusiv:
+        yield
+        return
+    with open(os.path.join(rechnungen_dir, SPERR_DATEI), "a+b") as sperrdatei:
+        if fcntl:
+            fcntl.flock(sperrdatei.fileno(), fcntl.LOCK_EX if exklusiv else fcntl.LOCK_SH)
+        else:
+            sperrdatei.seek(0)
+            msvcrt.locking(sperrdatei.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(sperrdatei.fileno(), fcntl.LOCK_UN)
+            else:
+                sperrdatei.seek(0)
+                msvcrt.locking(sperrdatei.fileno(), msvcrt.LK_UNLCK, 1)
+
+def datei_nummer(name):
+    """Rechnungsnummer (dateinamensicher) aus einem Dateinamen wie Rechnung_<Nummer>.pdf oder None"""
+    for praefix, endung in RECHNUNGSDATEIEN:
+        if name.startswith(praefix) and name.endswith(endung):
+            return name[len(praefix):-len(endung)]
+    return None
+
+def datum_aus_nummer(nummer):
+    """Rechnungsdatum (JJJJ-MM-TT) aus einer Nummer JJJJ-MM-TT-##, sonst None"""
+    try:
+        return datetime.strptime(nummer[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+def finde_rechnungsdateien(rechnungen_dir):
+    """{Dateinummer: [Pfade]} aller Rechnungsdateien unterhalb von rechnungen_dir (ohne Render-Cache)"""
+    gruppen = {}
+    for verzeichnis, unterverzeichnisse, dateien in os.walk(rechnungen_dir):
+        unterverzeichnisse[:] = sorted(name for name in unterverzeichnisse if not name.startswith("."))
+        for name in dateien:
+            nummer = datei_nummer(name)
+            if nummer:
+                gruppen.setdefault(nummer, []).append(os.path.join(verzeichnis, name))
+    return gruppen
+
+def finde_rechnungsdatei(rechnungen_dir, name):
+    """Pfad einer Rechnungsdatei (z.B. Rechnung_<Nummer>.pdf) im aktuellen Layout oder flach, sonst None"""
+    nummer = datei_nummer(name)
+    if nummer is None:
+        return None
+    for verzeichnis in (ablage_verzeichnis(rechnungen_dir, datum_aus_nummer(nummer), anlegen=False), rechnungen_dir):
+        pfad = os.path.join(verzeichnis, name)
+        if os.path.isfile(pfad):
+            return pfad
+    return None
+
+def entferne_leere_verzeichnisse(rechnungen_dir):
+    """Löscht leere Unterverzeichnisse eines früheren Layouts (nicht den Render-Cache)"""
+    for verzeichnis, unterverzeichnisse, dateien in os.walk(rechnungen_dir, topdown=False):
+        teile = os.path.relpath(verzeichnis, rechnungen_dir).split(os.sep)
+        if verzeichnis != rechnungen_dir and not any(teil.startswith(".") for teil in teile) and not dateien:
+            try:
+                os.rmdir(verzeichnis)
+            except OSError:
+                pass
+
+def migriere_ablage(rechnungen_dir, layout, max_durchgaenge=3):
+    """Stellt auf layout um und verschiebt alle vorhandenen Rechnungen.
+
+    Gibt (verschoben, konflikte) zurück; konflikte ist eine Liste von
+    (pfad, meldung) für Dateien, die nicht verschoben werden konnten (z.B.
+    weil am Ziel schon eine andere Datei liegt oder kein Datum bekannt ist).
+    Mehrere Durchgänge erfassen Rechnungen, die während der Migration noch
+    im alten Layout entstanden sind.
+    """
+    from rechnungstool_journal import verbinde
+
+    layout = pruefe_layout(layout)
+    with ablage_sperre(rechnungen_dir, exklusiv=True):
+        speichere_layout(rechnungen_dir, layout)
+
+    journal = verbinde(rechnungen_dir)
+    daten_aus_journal = None
+    verschoben = 0
+    konflikte = {}
+
+    for _ in range(max_durchgaenge):
+        bewegt = 0
+        for nummer, pfade in sorted(finde_rechnungsdateien(rechnungen_dir).items()):
+            datum = datum_aus_nummer(nummer)
+            if datum is None:
+                if daten_aus_journal is None:
+                    daten_aus_journal = dict(journal.execute("SELECT xml, datum FROM rechnungen"))
+                datum = next((daten_aus_journal.get(os.path.relpath(pfad, rechnungen_dir)) for pfad in pfade
+                              if os.path.relpath(pfad, rechnungen_dir) in daten_aus_journal), None)
+            if datum is None:
+                for pfad in pfade:
+                    konflikte[pfad] = "Rechnungsdatum unbekannt"
+                continue
+            ziel_dir = ablage_verzeichnis(rechnungen_dir, datum, layout, anlegen=False)
+            if all(os.path.dirname(pfad) == ziel_dir for pfad in pfade):
+                continue
+
+            # Pro Rechnung exklusiv: Schreiben und Journal-Eintrag dieser Rechnung sind abgeschlossen
+            with ablage_sperre(rechnungen_dir, exklusiv=True):
+                os.makedirs(ziel_dir, exist_ok=True)
+                with journal:
+                    for pfad in pfade:
+                        if not os.path.exists(pfad) or os.path.dirname(pfad) == ziel_dir:
+                            continue
+                        ziel = os.path.join(ziel_dir, os.path.basename(pfad))
+                        if os.path.exists(ziel):
+                            konflikte[pfad] = f"Ziel existiert bereits: {os.path.relpath(ziel, rechnungen_dir)}"
+                            continue
+                        os.rename(pfad, ziel)
+                        alt, neu = os.path.relpath(pfad, rechnungen_dir), os.path.relpath(ziel, rechnungen_dir)
+                        # Über den Primärschlüssel, Dateinummer und Rechnungsnummer sind gleich
+                        journal.execute("UPDATE rechnungen SET pdf = ? WHERE rechnungsnummer = ? AND pdf = ?", (neu, nummer, alt))
+                        journal.execute("UPDATE rechnungen SET xml = ? WHERE rechnungsnummer = ? AND xml = ?", (neu, nummer, alt))
+                        bewegt += 1
+        verschoben += bewegt
+        if not bewegt:
+            break
+
+    # Exklusiv: Schreiber legen ihr Verzeichnis unter der geteilten Sperre an und schreiben sofort hinein
+    with ablage_sperre(rechnungen_dir, exklusiv=True):
+        entferne_leere_verzeichnisse(rechnungen_dir)
+    return verschoben, sorted(konflikte.items())
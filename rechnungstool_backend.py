@@ -1,14 +1,54 @@
+import io
 import os
 import sys
+import importlib.util
 from datetime import datetime, timedelta
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-try:
-    import pypdf
-    PDF_LIBRARY_AVAILABLE = True
-except ImportError:
-    PDF_LIBRARY_AVAILABLE = False
+from rechnungstool_summen import berechne_summen, als_summen, cent_zu_decimal, preis_text, satz_text, zu_decimal
+from rechnungstool_journal import journalzeile, trage_ein
+from rechnungstool_ablage import ablage_sperre, ablage_verzeichnis
+from rechnungstool_metriken import gemessen, messe, zaehle
+from rechnungstool_protokoll import log
+
+# Name und Profil der eingebetteten XML in ZUGFeRD-Rechnungen. Die CII-XML aus
+# erstelle_zugferd_xml deklariert die XRechnung-CIUS, daher das ZUGFeRD-Profil
+# XRECHNUNG (Dateiname laut ZUGFeRD 2.x: xrechnung.xml).
+ZUGFERD_DATEINAME = "xrechnung.xml"
+ZUGFERD_PROFIL = "XRECHNUNG"
+
+# XRechnung: so viele InvoiceLine-Elemente werden gesammelt geschrieben
+XML_BLOCK_POSITIONEN = 256
+
+# Bei Änderungen am Layout von PDF oder XML erhöhen: der Render-Cache
+# (rechnungstool_cache) verwendet dann keine alten Einträge mehr
+VORLAGEN_VERSION = 1
+
+# reportlab und pypdf werden erst beim ersten Rendern importiert, damit das
+# Menü sofort startet. Maße wie in reportlab.lib.units und reportlab.lib.pagesizes.
+mm = 72.0 / 2.54 * 0.1
+A4 = (210 * mm, 297 * mm)
+canvas = None
+
+def lade_reportlab():
+    """Importiert reportlab.pdfgen.canvas beim ersten Aufruf und gibt das Modul zurück"""
+    global canvas
+    if canvas is None:
+        from reportlab import rl_config
+        # Binäre Flate-Streams statt ASCII85-kodierter: kleinere PDFs und weniger CPU beim Speichern
+        rl_config.useA85 = 0
+        from reportlab.pdfgen import canvas as reportlab_canvas
+        canvas = reportlab_canvas
+    return canvas
+
+def __getattr__(name):
+    # PDF_LIBRARY_AVAILABLE ohne pypdf zu importieren (nur prüfen, ob es installiert ist)
+    if name == "PDF_LIBRARY_AVAILABLE":
+        return importlib.util.find_spec("pypdf") is not None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def xml_text(wert):
+    """Maskiert einen Wert für XML-Textinhalt (&, <, >)"""
+    # Wie xml.sax.saxutils.escape, ohne dessen Import von urllib beim Start
+    return str(wert).replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;") if wert is not None else ""
 
 def formatiere_betrag(betrag):
     """Formatiert Beträge mit deutschem Zahlenformat: 1.234,56 €"""
@@ -26,129 +66,512 @@ def formatiere_iban(iban):
     iban_clean = iban.replace(" ", "")
     return " ".join([iban_clean[i:i+4] for i in range(0, len(iban_clean), 4)])
 
-def erstelle_rechnung(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, rechnungen_dir, freitext=None):
+def erstelle_rechnung(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, rechnungen_dir, freitext=None, cii_xml_path=None, zugferd=False, cache=None):
     """
     Erstellt eine PDF-Rechnung und separate XRechnung-XML-Datei
     """
     try:
-                # Dateiname-sichere Version der Rechnungsnummer (ersetzt : durch -)
-        datei_nummer = str(rechnungsnummer).replace(':', '-')
-        
-        # Pfade für verschiedene Formate
-        temp_xml_path = f"temp_invoice_{datei_nummer}.xml"
-        xrechnung_xml_path = os.path.join(rechnungen_dir, f"XRechnung_{datei_nummer}.xml")
-        pdf_path = os.path.join(rechnungen_dir, f"Rechnung_{datei_nummer}.pdf")
-        
-        # Betrag berechnen
-        betrag = sum(pos["menge"] * pos["einzelpreis"] for pos in positionen)
-        
-        # Kleinunternehmer prüfen
-        ist_kleinunternehmer = unternehmen_data.get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1']
-        
-        # Temporäre XML für interne Zwecke erstellen
-        erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, betrag, temp_xml_path, ist_kleinunternehmer)
-        
-        # PDF erstellen (ohne XML-Einbettung)
-        erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, betrag, temp_xml_path, pdf_path, ist_kleinunternehmer, freitext)
-        
-        # Temporäre XML löschen
-        if os.path.exists(temp_xml_path):
-            os.remove(temp_xml_path)
-        
-        # XRechnung XML erstellen
-        erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, betrag, xrechnung_xml_path, ist_kleinunternehmer)
-        
+        erzeuge_rechnungsdateien(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, rechnungen_dir, freitext, cii_xml_path, zugferd, cache)
         return True
         
     except Exception as e:
-        print(f"Fehler beim Erstellen der Rechnung: {e}")
+        log.error(f"Fehler beim Erstellen der Rechnung: {e}")
         return False
 
-def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, betrag, xml_path, pdf_path, ist_kleinunternehmer, freitext=None):
-    """Erstellt das PDF mit Unternehmen- und Kundendaten"""
-    c = canvas.Canvas(pdf_path, pagesize=A4)
-    width, height = A4
+def rechnungs_pfade(rechnungsnummer, rechnungen_dir, datum=None, anlegen=False):
+    """Pfade von PDF und XRechnung-XML einer Rechnung (: in der Nummer wird zu -).
     
-    # Faltmarken nach DIN 5008 - Geschäftsbrief Form A
-    # Falzmarke 1: 87mm von der oberen Blattkante
-    c.line(5*mm, height-87*mm, 10*mm, height-87*mm)
-    # Falzmarke 2: 192mm von der oberen Blattkante  
-    c.line(5*mm, height-192*mm, 10*mm, height-192*mm)
+    Mit datum liegen die Dateien im Layout des Rechnungsverzeichnisses (z.B.
+    Rechnungen/2025/11/, siehe rechnungstool_ablage). Mit anlegen=True wird
+    das Verzeichnis bei Bedarf angelegt; das nur unter der geteilten
+    ablage_sperre direkt vor dem Schreiben, sonst kann eine laufende
+    Migration das leere Verzeichnis wieder löschen.
+    """
+    datei_nummer = str(rechnungsnummer).replace(':', '-')
+    verzeichnis = ablage_verzeichnis(rechnungen_dir, datum, anlegen=anlegen)
+    return (os.path.join(verzeichnis, f"Rechnung_{datei_nummer}.pdf"),
+            os.path.join(verzeichnis, f"XRechnung_{datei_nummer}.xml"))
+
+def rendere_rechnungsdokumente(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, rechnungen_dir, freitext=None, cii_xml_path=None, zugferd=False):
+    """Rendert PDF und XRechnung-XML einer Rechnung in den Speicher, ohne zu schreiben.
     
-    # Lochmarke nach DIN 5008 - Geschäftsbrief Form A
-    # Lochmarke: 148,5mm von der oberen Blattkante
-    c.line(2*mm, height-148.5*mm, 6*mm, height-148.5*mm)
+    Gibt (dokumente, journalzeile) zurück: dokumente ist
+    {"pdf": (pfad, bytes), "xml": (pfad, bytes)}, mit cii_xml_path
+    zusätzlich "cii". Schreiben und Eintragen ins Rechnungsjournal übernimmt
+    der Aufrufer (z.B. die Pipeline in rechnungstool_pipeline, parallel zum
+    Rendern).
+    """
+    pdf_path, xrechnung_xml_path = rechnungs_pfade(rechnungsnummer, rechnungen_dir, datum)
+    ist_kleinunternehmer = unternehmen_data.get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1']
+    with messe("summen"):
+        summen = berechne_summen(positionen, ist_kleinunternehmer)
+    dokumente = {}
     
-    # Logo (falls vorhanden) - oben rechts
-    # Pfad zur Executable/zum Skript ermitteln (PyInstaller-kompatibel)
-    if getattr(sys, 'frozen', False):
-        # Läuft als PyInstaller-Executable
-        base_dir = os.path.dirname(sys.executable)
+    cii_xml = None
+    if cii_xml_path or zugferd:
+        cii_xml = erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, None, ist_kleinunternehmer)
+        if cii_xml_path:
+            dokumente["cii"] = (cii_xml_path, cii_xml.encode("utf-8"))
+    
+    pdf_puffer = io.BytesIO()
+    if zugferd:
+        erstelle_zugferd_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, pdf_puffer, ist_kleinunternehmer, freitext, cii_xml)
     else:
-        # Läuft als Python-Skript
-        base_dir = os.path.dirname(os.path.abspath(__file__))
+        erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, None, pdf_puffer, ist_kleinunternehmer, freitext)
+    dokumente["pdf"] = (pdf_path, pdf_puffer.getvalue())
+    
+    xml_puffer = io.BytesIO()
+    erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, xml_puffer, ist_kleinunternehmer)
+    dokumente["xml"] = (xrechnung_xml_path, xml_puffer.getvalue())
+    
+    zaehle("rechnungen_gerendert")
+    zaehle("positionen", len(positionen))
+    return dokumente, journalzeile(rechnungsnummer, kunde_data, datum, summen, pdf_path, xrechnung_xml_path, rechnungen_dir)
+
+def lies_inhalte(dateien, inhalte):
+    """Liest PDF und XRechnung-XML in das Dict inhalte (nur unter der geteilten ablage_sperre aufrufen)"""
+    for art in ("pdf", "xml"):
+        with open(dateien[art], "rb") as f:
+            inhalte[art] = f.read()
+
+def erzeuge_rechnungsdateien(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, rechnungen_dir, freitext=None, cii_xml_path=None, zugferd=False, cache=None, inhalte=None):
+    """
+    Erzeugt PDF und XRechnung-XML einer Rechnung.
+    
+    Im Gegensatz zu erstelle_rechnung werden Fehler nicht abgefangen, sondern
+    weitergereicht (z.B. für die Stapelverarbeitung). Gibt die Pfade der
+    erzeugten Dateien zurück.
+    
+    Die CII-XML (ZUGFeRD-Syntax) wird nur erzeugt, wenn sie benötigt wird:
+    mit zugferd=True wird sie in das PDF eingebettet, mit cii_xml_path
+    zusätzlich als Datei geschrieben (z.B. als Debug-Ausgabe).
+    
+    Mit einem Render-Cache (rechnungstool_cache.Rendercache) werden
+    Rechnungen mit unveränderten Eingaben nicht neu gerendert, sondern aus
+    dem Cache übernommen.
+    
+    Jede Rechnung wird ins Rechnungsjournal (rechnungstool_journal)
+    eingetragen und im Layout des Rechnungsverzeichnisses abgelegt
+    (rechnungstool_ablage).
+    
+    Mit einem Dict inhalte werden die Bytes von PDF und XML noch unter der
+    Sperre dort eingetragen; danach kann eine Umstellung des Layouts die
+    Dateien bereits verschoben haben.
+    """
+    # Geteilte Sperre: eine laufende Umstellung des Layouts verschiebt diese Rechnung erst, wenn sie vollständig ist
+    with ablage_sperre(rechnungen_dir), messe("rechnung"):
+        # Pfade für verschiedene Formate (Verzeichnisse erst unter der Sperre anlegen)
+        pdf_path, xrechnung_xml_path = rechnungs_pfade(rechnungsnummer, rechnungen_dir, datum, anlegen=True)
+        if cii_xml_path:
+            os.makedirs(os.path.dirname(os.path.abspath(cii_xml_path)), exist_ok=True)
+    
+        # Kleinunternehmer prüfen
+        ist_kleinunternehmer = unternehmen_data.get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1']
     
-    logo_namen = ["logo.png", "logo.jpg", "logo.jpeg", "logo.gif", "Logo.PNG", "Logo.JPG"]
-    logo_pfade = [os.path.join(base_dir, name) for name in logo_namen]
-    logo_gefunden = False
+        # Beträge einmal berechnen, PDF und XML lesen dieselben Summen
+        with messe("summen"):
+            summen = berechne_summen(positionen, ist_kleinunternehmer)
     
-    for logo_path in logo_pfade:
-        if os.path.exists(logo_path):
+        if cache is not None:
+            ziele = {"pdf": pdf_path, "xml": xrechnung_xml_path}
+            if cii_xml_path:
+                ziele["cii"] = cii_xml_path
+            with messe("cache_pruefen"):
+                schluessel = cache.schluessel(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, freitext, zugferd, bool(cii_xml_path))
+                treffer = cache.hole(schluessel, ziele)
+            if treffer:
+                zaehle("cache_treffer")
+                with messe("journal"):
+                    trage_ein(rechnungen_dir, [journalzeile(rechnungsnummer, kunde_data, datum, summen, pdf_path, xrechnung_xml_path, rechnungen_dir)])
+                if inhalte is not None:
+                    lies_inhalte(ziele, inhalte)
+                return ziele
+            # Alte Dateien entfernen statt überschreiben: sie können Hardlinks auf andere Cache-Einträge sein
+            for pfad in ziele.values():
+                if os.path.exists(pfad):
+                    os.remove(pfad)
+    
+        # CII-XML nur auf Anforderung erzeugen (keine temporäre Datei mehr)
+        dateien = {"pdf": pdf_path, "xml": xrechnung_xml_path}
+        cii_xml = None
+        if cii_xml_path or zugferd:
+            cii_xml = erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, cii_xml_path, ist_kleinunternehmer)
+            if cii_xml_path:
+                dateien["cii"] = cii_xml_path
+    
+        if zugferd:
+            # Hybride Rechnung: PDF mit eingebetteter CII-XML
+            erstelle_zugferd_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, pdf_path, ist_kleinunternehmer, freitext, cii_xml)
+        else:
+            # PDF erstellen (ohne XML-Einbettung)
+            erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, None, pdf_path, ist_kleinunternehmer, freitext)
+    
+        # XRechnung XML erstellen
+        erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, xrechnung_xml_path, ist_kleinunternehmer)
+    
+        if cache is not None:
+            with messe("cache_ablegen"):
+                cache.lege_ab(schluessel, dateien)
+    
+        with messe("journal"):
+            trage_ein(rechnungen_dir, [journalzeile(rechnungsnummer, kunde_data, datum, summen, pdf_path, xrechnung_xml_path, rechnungen_dir)])
+    
+        if inhalte is not None:
+            lies_inhalte(dateien, inhalte)
+    
+        zaehle("rechnungen_gerendert")
+        zaehle("positionen", len(positionen))
+        return dateien
+
+# Kennung der Quelltexte, die das Layout bestimmen (einmal pro Prozess berechnet)
+QUELLTEXT_KENNUNG = None
+
+def vorlagen_kennung():
+    """Kennung von Vorlagenversion, Quelltext und Logo für den Render-Cache.
+    
+    Ändert sich, wenn VORLAGEN_VERSION erhöht, das Backend geändert oder
+    das Logo ausgetauscht wird.
+    """
+    global QUELLTEXT_KENNUNG
+    if QUELLTEXT_KENNUNG is None:
+        import hashlib
+        pruefsumme = hashlib.sha256()
+        for modul in (__file__, os.path.join(os.path.dirname(__file__), "rechnungstool_summen.py")):
             try:
-                # Bitmap-Logo (PNG, JPG, etc.) - rechts positioniert
-                c.drawImage(logo_path, 150*mm, height-25*mm, width=40*mm, height=20*mm, preserveAspectRatio=True, mask='auto')
-                print(f"✅ Logo geladen: {logo_path}")
-                logo_gefunden = True
-                break
-                
-            except Exception as e:
-                print(f"❌ Fehler beim Laden von {logo_path}: {e}")
+                with open(modul, "rb") as f:
+                    pruefsumme.update(f.read())
+            except OSError:
+                # Kompilierte Executable ohne Quelltexte: nur VORLAGEN_VERSION zählt
+                pass
+        QUELLTEXT_KENNUNG = pruefsumme.hexdigest()[:16]
+    return f"{VORLAGEN_VERSION}:{QUELLTEXT_KENNUNG}:{logo_stempel(programm_verzeichnis())}"
+
+def programm_verzeichnis():
+    """Verzeichnis der Executable bzw. des Skripts (PyInstaller-kompatibel); dort wird das Logo gesucht"""
+    if getattr(sys, 'frozen', False):
+        # Läuft als PyInstaller-Executable
+        return os.path.dirname(sys.executable)
+    # Läuft als Python-Skript
+    return os.path.dirname(os.path.abspath(__file__))
+
+# Logo-Suche: Dateinamen in Prüfreihenfolge und Platz im Briefkopf
+LOGO_NAMEN = ["logo.png", "logo.jpg", "logo.jpeg", "logo.gif", "Logo.PNG", "Logo.JPG"]
+LOGO_BREITE = 40*mm
+LOGO_HOEHE = 20*mm
+# Größere Bitmap-Logos werden einmalig auf diese Druckauflösung verkleinert
+LOGO_DPI = 300
+
+# Prozessweiter Logo-Cache: Verzeichnis -> {"pfad", "stempel", "bild"}
+LOGO_CACHE = {}
+
+def bereite_logo_vor(logo_path):
+    """Dekodiert ein Logo einmalig und gibt einen wiederverwendbaren ImageReader zurück"""
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+    
+    with Image.open(logo_path) as bild:
+        if bild.format == "JPEG":
+            # JPEG wird von ReportLab unverändert (ohne Neukodierung) übernommen
+            return ImageReader(logo_path)
+        bild.load()
+        max_breite = round(LOGO_BREITE / 72 * LOGO_DPI)
+        max_hoehe = round(LOGO_HOEHE / 72 * LOGO_DPI)
+        if bild.width > max_breite or bild.height > max_hoehe:
+            bild.thumbnail((max_breite, max_hoehe), Image.LANCZOS)
+        logo = ImageReader(bild.copy())
+    
+    # Farb- und Alphakanal jetzt einmal aufbereiten statt bei jedem PDF
+    logo.getRGBData()
+    return logo
+
+def logo_stempel(base_dir):
+    """(Dateiname, mtime, Größe) des Logos, das lade_logo verwenden würde, oder None"""
+    for name in LOGO_NAMEN:
+        try:
+            info = os.stat(os.path.join(base_dir, name))
+        except OSError:
+            continue
+        return (name, info.st_mtime_ns, info.st_size)
+    return None
+
+def lade_logo(base_dir):
+    """Sucht das Logo im Programmverzeichnis und gibt einen ImageReader oder None zurück.
+    
+    Das Ergebnis wird pro Prozess zwischengespeichert. Der Eintrag wird neu
+    aufgebaut, wenn sich die Logodatei ändert (mtime/Größe) oder - falls kein
+    Logo gefunden wurde - sich der Inhalt des Verzeichnisses ändert.
+    """
+    eintrag = LOGO_CACHE.get(base_dir)
+    if eintrag is not None:
+        try:
+            if eintrag["pfad"]:
+                info = os.stat(eintrag["pfad"])
+                stempel = (info.st_mtime_ns, info.st_size)
+            else:
+                stempel = os.stat(base_dir).st_mtime_ns
+        except OSError:
+            stempel = None
+        if stempel == eintrag["stempel"]:
+            return eintrag["bild"]
+    
+    for name in LOGO_NAMEN:
+        logo_path = os.path.join(base_dir, name)
+        try:
+            info = os.stat(logo_path)
+        except OSError:
+            continue
+        try:
+            with messe("logo_laden"):
+                bild = bereite_logo_vor(logo_path)
+        except Exception as e:
+            log.error(f"❌ Fehler beim Laden von {logo_path}: {e}")
+            continue
+        LOGO_CACHE[base_dir] = {"pfad": logo_path, "stempel": (info.st_mtime_ns, info.st_size), "bild": bild}
+        zaehle("logo_geladen")
+        return bild
+    
+    try:
+        stempel = os.stat(base_dir).st_mtime_ns
+    except OSError:
+        stempel = None
+    LOGO_CACHE[base_dir] = {"pfad": None, "stempel": stempel, "bild": None}
+    log.info("ℹ️ Kein Logo gefunden.")
+    log.info("📁 Unterstützte Formate: logo.png (empfohlen), logo.jpg")
+    log.info("💾 Speichern Sie Ihr Logo als 'logo.png' im Projektordner")
+    return None
+
+# Zwischengespeicherte Inhaltsströme der statischen Seitenteile (Briefbogen,
+# Fußzeile) je Unternehmensprofil. Wert: (PDF-Operatoren, Fontzuordnung)
+VORLAGEN_CACHE = {}
+
+# Ergebnis der Selbstprüfung des Vorlagen-Caches (None = noch nicht geprüft, siehe vorlagen_cache_nutzbar)
+VORLAGEN_CACHE_NUTZBAR = None
+
+def briefbogen_operationen(unternehmen_data, ist_kleinunternehmer):
+    """Statische Inhalte der ersten Seite als Liste von Canvas-Aufrufen"""
+    width, height = A4
+    ops = []
     
-    if not logo_gefunden:
-        print("ℹ️ Kein Logo gefunden.")
-        print("📁 Unterstützte Formate: logo.png (empfohlen), logo.jpg")
-        print("� Speichern Sie Ihr Logo als 'logo.png' im Projektordner")
+    # Faltmarken nach DIN 5008 - Geschäftsbrief Form A
+    # Falzmarke 1: 87mm von der oberen Blattkante
+    ops.append(("line", (5*mm, height-87*mm, 10*mm, height-87*mm)))
+    # Falzmarke 2: 192mm von der oberen Blattkante  
+    ops.append(("line", (5*mm, height-192*mm, 10*mm, height-192*mm)))
+    
+    # Lochmarke nach DIN 5008 - Geschäftsbrief Form A
+    # Lochmarke: 148,5mm von der oberen Blattkante
+    ops.append(("line", (2*mm, height-148.5*mm, 6*mm, height-148.5*mm)))
     
     # Unternehmensdaten (oben rechts) - Absender  
     # Firmenname weggelassen da bereits im Logo sichtbar
-    c.setFont("Helvetica", 9)
+    ops.append(("setFont", ("Helvetica", 9)))
     y_unternehmen = height-25*mm
-    c.drawRightString(190*mm, y_unternehmen, f"{unternehmen_data.get('Straße', '')} {unternehmen_data.get('Hausnummer', '')}")
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"{unternehmen_data.get('Straße', '')} {unternehmen_data.get('Hausnummer', '')}")))
     y_unternehmen -= 3.5*mm
-    c.drawRightString(190*mm, y_unternehmen, f"{unternehmen_data.get('PLZ', '')} {unternehmen_data.get('Ort', '')}")
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"{unternehmen_data.get('PLZ', '')} {unternehmen_data.get('Ort', '')}")))
     y_unternehmen -= 3.5*mm
     
     # USt-IdNr oder Steuernummer bei Unternehmensdaten
     if unternehmen_data.get('USt-IdNr') and not ist_kleinunternehmer:
-        c.drawRightString(190*mm, y_unternehmen, f"USt-IdNr: {unternehmen_data.get('USt-IdNr')}")
+        ops.append(("drawRightString", (190*mm, y_unternehmen, f"USt-IdNr: {unternehmen_data.get('USt-IdNr')}")))
     else:
-        c.drawRightString(190*mm, y_unternehmen, f"St.-Nr.: {unternehmen_data.get('Steuernummer', '')}")
+        ops.append(("drawRightString", (190*mm, y_unternehmen, f"St.-Nr.: {unternehmen_data.get('Steuernummer', '')}")))
     y_unternehmen -= 3.5*mm
     
-    c.drawRightString(190*mm, y_unternehmen, f"Tel: {unternehmen_data.get('Telefon', '')}")
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"Tel: {unternehmen_data.get('Telefon', '')}")))
     y_unternehmen -= 3.5*mm
-    c.drawRightString(190*mm, y_unternehmen, f"Email: {unternehmen_data.get('Email', '')}")
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"Email: {unternehmen_data.get('Email', '')}")))
     y_unternehmen -= 3.5*mm
     
     # Bankverbindung (mit mehr Abstand)
     y_unternehmen -= 2*mm  # Zusätzlicher Abstand vor Bankverbindung
-    c.setFont("Helvetica-Bold", 8)
-    c.drawRightString(190*mm, y_unternehmen, "Bankverbindung:")
+    ops.append(("setFont", ("Helvetica-Bold", 8)))
+    ops.append(("drawRightString", (190*mm, y_unternehmen, "Bankverbindung:")))
     y_unternehmen -= 3.5*mm
-    c.setFont("Helvetica", 8)
-    c.drawRightString(190*mm, y_unternehmen, f"IBAN: {formatiere_iban(unternehmen_data.get('IBAN', ''))}")
+    ops.append(("setFont", ("Helvetica", 8)))
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"IBAN: {formatiere_iban(unternehmen_data.get('IBAN', ''))}")))
     y_unternehmen -= 3.5*mm
-    c.drawRightString(190*mm, y_unternehmen, f"BIC: {unternehmen_data.get('BIC', '')}")
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"BIC: {unternehmen_data.get('BIC', '')}")))
     y_unternehmen -= 3.5*mm
-    c.drawRightString(190*mm, y_unternehmen, f"{unternehmen_data.get('Bank', '')}")
+    ops.append(("drawRightString", (190*mm, y_unternehmen, f"{unternehmen_data.get('Bank', '')}")))
     
     # Absenderzeile (klein, für Fensterkuvert) - 17.7mm vom oberen Rand
-    c.setFont("Helvetica", 8)
+    ops.append(("setFont", ("Helvetica", 8)))
     absender_text = f"{unternehmen_data.get('Firmenname', '')}, {unternehmen_data.get('Straße', '')} {unternehmen_data.get('Hausnummer', '')}, {unternehmen_data.get('PLZ', '')} {unternehmen_data.get('Ort', '')}"
-    c.drawString(20*mm, height-17.7*mm, absender_text)
+    ops.append(("drawString", (20*mm, height-17.7*mm, absender_text)))
     
     # Linie unter Absenderzeile
-    c.line(20*mm, height-20*mm, 110*mm, height-20*mm)
+    ops.append(("line", (20*mm, height-20*mm, 110*mm, height-20*mm)))
+    
+    return ops
+
+def fusszeilen_positionen(ist_kleinunternehmer, steuerzeilen=1):
+    """Y-Positionen der rechnungsabhängigen Fußzeilen (erste Steuerzeile, Verwendungszweck)"""
+    # Footer immer am unteren Rand positionieren: 40mm Höhe für rechtliche Hinweise,
+    # jede weitere Steuerzeile (mehrere Steuersätze) schiebt den Block 3mm nach oben
+    y_steuer = 40*mm - 5*mm
+    y_verwendungszweck = y_steuer - (8*mm if ist_kleinunternehmer else 5*mm) - 7*mm
+    if not ist_kleinunternehmer:
+        y_steuer += (steuerzeilen - 1) * 3*mm
+    return y_steuer, y_verwendungszweck
+
+def fusszeilen_operationen(ist_kleinunternehmer, steuerzeilen=1):
+    """Statische rechtliche Hinweise der letzten Seite als Liste von Canvas-Aufrufen"""
+    ops = []
+    y_footer, y_verwendungszweck = fusszeilen_positionen(ist_kleinunternehmer, steuerzeilen)
+    
+    # Rechtliche Hinweise (Footer)
+    ops.append(("setFont", ("Helvetica-Bold", 9)))
+    ops.append(("drawString", (20*mm, y_footer + 5*mm, "Rechtliche Hinweise:")))
+    
+    # Pflicht-Steuerhinweis gem. §14 UStG (Steuerbetrag wird pro Rechnung gezeichnet)
+    ops.append(("setFont", ("Helvetica", 8)))
+    if ist_kleinunternehmer:
+        ops.append(("drawString", (20*mm, y_footer, "Steuerrechtlicher Hinweis (Pflichtangabe gem. §14 UStG):")))
+        y_footer -= 3*mm
+        ops.append(("drawString", (20*mm, y_footer, "Kleinunternehmerregelung nach §19 UStG - keine Umsatzsteuer ausgewiesen")))
+    else:
+        y_footer -= (steuerzeilen - 1) * 3*mm
+    y_footer -= 5*mm
+    
+    # Zahlungshinweise
+    ops.append(("drawString", (20*mm, y_footer, "Zahlungshinweise:")))
+    y_footer -= 3*mm
+    ops.append(("drawString", (20*mm, y_footer, "Bitte überweisen Sie den Rechnungsbetrag innerhalb von 14 Tagen ohne Abzug auf unser Konto.")))
+    
+    # Allgemeine Geschäftsbedingungen (unter dem Verwendungszweck)
+    y_footer = y_verwendungszweck - 6*mm
+    ops.append(("drawString", (20*mm, y_footer, "Es gelten unsere Allgemeinen Geschäftsbedingungen. Erfüllungsort und Gerichtsstand ist unser Geschäftssitz.")))
+    y_footer -= 3*mm
+    ops.append(("drawString", (20*mm, y_footer, "Bei Rückfragen stehen wir Ihnen gerne zur Verfügung.")))
+    
+    return ops
+
+# Bezeichnung steuerfreier Steuergruppen im Summenblock des PDFs
+STEUERFREI_BEZEICHNUNGEN = {
+    "AE": "Reverse Charge",
+    "E": "Steuerfrei",
+    "K": "Steuerfrei (igL)",
+    "G": "Steuerfrei (Ausfuhr)",
+}
+
+def steuerhinweise(summen):
+    """Pflicht-Steuerhinweise gem. §14 UStG, eine Zeile je Steuergruppe"""
+    mehrere = len(summen.steuergruppen) > 1
+    hinweise = []
+    for gruppe in summen.steuergruppen:
+        basis = cent_zu_decimal(gruppe["basis_cent"])
+        if gruppe["befreiungsgrund"]:
+            hinweise.append(f"{gruppe['befreiungsgrund']} - Nettobetrag: {basis:.2f} EUR")
+        else:
+            auf_basis = f" auf {basis:.2f} EUR" if mehrere else ""
+            hinweise.append(f"Anwendbarer Steuersatz: {satz_text(gruppe['satz'])}% Umsatzsteuer{auf_basis}"
+                            f" - Steuerbetrag: {cent_zu_decimal(gruppe['steuer_cent']):.2f} EUR")
+    return hinweise
+
+def probe_pdf(cache=None):
+    """Reproduzierbare Testseite mit Briefbogen und Fußzeile (für vorlagen_cache_nutzbar).
+
+    Mit cache (Dict) laufen die Vorlagen über den Cache, sonst werden sie
+    direkt gezeichnet.
+    """
+    puffer = io.BytesIO()
+    c = lade_reportlab().Canvas(puffer, pagesize=A4, invariant=1)
+    # Ein Font vor den Vorlagen, damit deren interne Fontnamen nicht bei /F1 beginnen
+    c.setFont("Times-Roman", 10)
+    c.drawString(20*mm, 150*mm, "Prüfseite äöüß €")
+    probe_unternehmen = {"Firmenname": "Prüfung GmbH", "Straße": "Hauptstraße", "Hausnummer": "1", "PLZ": "12345",
+                         "Ort": "Köln", "IBAN": "DE02120300000000202051", "BIC": "BYLADEM1001", "Bank": "Prüfbank"}
+    zeichne_vorlage(c, lambda: briefbogen_operationen(probe_unternehmen, False), "briefbogen" if cache is not None else None, cache)
+    zeichne_vorlage(c, lambda: fusszeilen_operationen(False), "fusszeile" if cache is not None else None, cache)
+    c.showPage()
+    c.save()
+    return puffer.getvalue()
+
+def vorlagen_cache_nutzbar():
+    """Prüft einmal pro Prozess, ob der Vorlagen-Cache dasselbe PDF ergibt wie direktes Zeichnen.
+
+    Der Cache liest und schreibt interne Attribute von ReportLab
+    (Canvas._code, _doc.getInternalFontName). Ändert eine ReportLab-Version
+    sie, wird ohne Cache gezeichnet statt unbemerkt fehlerhafte PDFs zu erzeugen.
+    """
+    global VORLAGEN_CACHE_NUTZBAR
+    if VORLAGEN_CACHE_NUTZBAR is None:
+        try:
+            direkt = probe_pdf()
+            cache = {}
+            # Der erste Durchlauf füllt den Cache, der zweite übernimmt die gespeicherten Ströme
+            VORLAGEN_CACHE_NUTZBAR = probe_pdf(cache) == direkt and len(cache) == 2 and probe_pdf(cache) == direkt
+        except Exception as e:
+            log.debug(f"Selbstprüfung des Vorlagen-Caches fehlgeschlagen: {type(e).__name__}: {e}")
+            VORLAGEN_CACHE_NUTZBAR = False
+        if not VORLAGEN_CACHE_NUTZBAR:
+            log.warning("⚠️ Vorlagen-Cache passt nicht zur installierten ReportLab-Version, statische Inhalte werden direkt gezeichnet")
+    return VORLAGEN_CACHE_NUTZBAR
+
+@gemessen("pdf_vorlage")
+def zeichne_vorlage(c, erzeuge_operationen, cache_schluessel=None, cache=None):
+    """Zeichnet statische Seiteninhalte in einem eigenen Grafikzustand (q ... Q).
+    
+    Mit cache_schluessel wird der erzeugte PDF-Inhaltsstrom nach dem ersten
+    Zeichnen zwischengespeichert und in weiteren Dokumenten unverändert
+    übernommen, statt Texte erneut zu setzen und zu vermessen - sofern die
+    Selbstprüfung (vorlagen_cache_nutzbar) bestanden ist. cache ersetzt
+    VORLAGEN_CACHE ohne Selbstprüfung (nur für probe_pdf).
+    """
+    if cache is None and cache_schluessel is not None:
+        if vorlagen_cache_nutzbar():
+            cache = VORLAGEN_CACHE
+        else:
+            cache_schluessel = None
+    c.saveState()
+    eintrag = cache.get(cache_schluessel) if cache_schluessel is not None else None
+    # Der zwischengespeicherte Strom verweist auf interne Fontnamen (/F1, /F2 ...),
+    # die ReportLab pro Dokument in Nutzungsreihenfolge vergibt - daher prüfen
+    if eintrag and all(c._doc.getInternalFontName(font) == intern for font, intern in eintrag[1]):
+        c._code.extend(eintrag[0])
+    else:
+        code_start = len(c._code)
+        operationen = erzeuge_operationen()
+        for methode, argumente in operationen:
+            getattr(c, methode)(*argumente)
+        if cache_schluessel is not None:
+            fonts = dict.fromkeys(argumente[0] for methode, argumente in operationen if methode == "setFont")
+            cache[cache_schluessel] = (c._code[code_start:], [(font, c._doc.getInternalFontName(font)) for font in fonts])
+    c.restoreState()
+
+@gemessen("pdf")
+def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, xml_path, pdf_path, ist_kleinunternehmer, freitext=None, hintergrund_cache=True):
+    """Erstellt das PDF mit Unternehmen- und Kundendaten
+    
+    pdf_path kann ein Dateipfad oder ein beschreibbares Datei-Objekt
+    (z.B. io.BytesIO) sein. xml_path wird nicht mehr verwendet und nur aus
+    Kompatibilitätsgründen angenommen (früher: Pfad der temporären XML-Datei).
+    
+    Mit hintergrund_cache=True werden die statischen Inhalte (Briefbogen,
+    rechtliche Hinweise) je Unternehmensprofil nur einmal gesetzt und danach
+    als fertiger Inhaltsstrom wiederverwendet.
+    
+    summen sind die Rechnungssummen aus berechne_summen; wird stattdessen
+    ein Betrag übergeben, werden die Summen aus den Positionen berechnet.
+    """
+    summen = als_summen(summen, positionen, ist_kleinunternehmer)
+    c = lade_reportlab().Canvas(pdf_path, pagesize=A4)
+    width, height = A4
+    
+    # Statischer Briefbogen: Falt-/Lochmarken, Absender, Bankverbindung
+    zeichne_vorlage(c, lambda: briefbogen_operationen(unternehmen_data, ist_kleinunternehmer),
+                    ("briefbogen", tuple(sorted(unternehmen_data.items())), ist_kleinunternehmer) if hintergrund_cache else None)
+    
+    # Logo (falls vorhanden) - oben rechts
+    with messe("pdf_logo"):
+        logo = lade_logo(programm_verzeichnis())
+        if logo is not None:
+            try:
+                # Bitmap-Logo (PNG, JPG, etc.) - rechts positioniert
+                c.drawImage(logo, 150*mm, height-25*mm, width=LOGO_BREITE, height=LOGO_HOEHE, preserveAspectRatio=True, mask='auto')
+            except Exception as e:
+                log.error(f"❌ Fehler beim Einbinden des Logos: {e}")
     
     # Kundenadresse (DIN 5008 konform für Fensterkuvert)
     # Beginnt 45mm vom oberen Rand, 20mm vom linken Rand
@@ -245,7 +668,7 @@ def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positione
             y_tabelle = height - 40*mm  # Start auf neuer Seite
             y_tabelle = zeichne_tabellenkopf(y_tabelle)
         
-        netto_pos = pos["menge"] * pos["einzelpreis"]
+        netto_pos = summen.linie(i - 1)
         c.drawString(20*mm, y_tabelle, str(i))
         
         # Lange Bezeichnungen umbrechen
@@ -258,7 +681,7 @@ def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positione
         c.drawRightString(140*mm, y_tabelle, formatiere_betrag(pos['einzelpreis']))
         c.drawRightString(175*mm, y_tabelle, formatiere_betrag(netto_pos))
         if not ist_kleinunternehmer:
-            c.drawString(185*mm, y_tabelle, "19%")
+            c.drawString(185*mm, y_tabelle, f"{satz_text(summen.gruppe(i - 1)['satz'])}%")
         
         # Y-Position für nächste Position anpassen
         zeilen_verwendet = max(1, len(bezeichnung_lines))
@@ -267,8 +690,8 @@ def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positione
     # Summen-Bereich (garantiert auf der letzten Seite)
     y = y_tabelle - 8*mm
     
-    # Sicherstellen, dass genug Platz für Summen vorhanden ist
-    if y < min_y:
+    # Sicherstellen, dass genug Platz für Summen vorhanden ist (je weitere Steuergruppe 4mm)
+    if y - (len(summen.steuergruppen) - 1) * 4*mm < min_y:
         c.showPage()
         y = height - 120*mm  # Neue Seite für Summen
     
@@ -280,7 +703,7 @@ def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positione
     if ist_kleinunternehmer:
         # Kleinunternehmerregelung - Pflichtangaben gem. §14 UStG
         c.drawString(120*mm, y, f"Summe Nettobetrag:")
-        c.drawRightString(190*mm, y, formatiere_betrag(betrag))
+        c.drawRightString(190*mm, y, formatiere_betrag(summen.netto))
         y -= 4*mm
         c.drawString(120*mm, y, f"Steuerbefreiung:")
         c.drawRightString(190*mm, y, "0,00 €")
@@ -289,86 +712,179 @@ def erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positione
         y -= 6*mm
         c.setFont("Helvetica-Bold", 11)
         c.drawString(120*mm, y, f"Gesamtbetrag:")
-        c.drawRightString(190*mm, y, formatiere_betrag(betrag))
-        gesamt_betrag = betrag
-        steuer_betrag = 0
+        c.drawRightString(190*mm, y, formatiere_betrag(summen.brutto))
     else:
-        # Normale MwSt-Berechnung - Pflichtangaben gem. §14 UStG
-        steuer_betrag = betrag * 0.19
-        gesamt_betrag = betrag * 1.19
-        
+        # MwSt je Steuergruppe - Pflichtangaben gem. §14 UStG
         c.drawString(120*mm, y, f"Summe Nettobetrag:")
-        c.drawRightString(190*mm, y, formatiere_betrag(betrag))
-        y -= 4*mm
-        c.drawString(120*mm, y, f"Steuerbetrag (19%):")
-        c.drawRightString(190*mm, y, formatiere_betrag(steuer_betrag))
+        c.drawRightString(190*mm, y, formatiere_betrag(summen.netto))
         y -= 4*mm
+        for gruppe in summen.steuergruppen:
+            bezeichnung = STEUERFREI_BEZEICHNUNGEN.get(gruppe["kategorie"], f"Steuerbetrag ({satz_text(gruppe['satz'])}%)")
+            c.drawString(120*mm, y, f"{bezeichnung}:")
+            c.drawRightString(190*mm, y, formatiere_betrag(cent_zu_decimal(gruppe["steuer_cent"])))
+            y -= 4*mm
         c.line(120*mm, y, 190*mm, y)
         y -= 6*mm
         c.setFont("Helvetica-Bold", 11)
         c.drawString(120*mm, y, f"Gesamtbetrag:")
-        c.drawRightString(190*mm, y, formatiere_betrag(gesamt_betrag))
+        c.drawRightString(190*mm, y, formatiere_betrag(summen.brutto))
     
-    # Footer immer am unteren Rand positionieren
-    footer_height = 40*mm  # Höhe für rechtliche Hinweise
-    y_footer = footer_height
-    
-    # Rechtliche Hinweise (Footer)
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(20*mm, y_footer, "Rechtliche Hinweise:")
-    y_footer -= 5*mm
+    # Statische Fußzeile (rechtliche Hinweise), nur per Rechnung wechselnde Zeilen direkt zeichnen
+    hinweise = [] if ist_kleinunternehmer else steuerhinweise(summen)
+    steuerzeilen = max(1, len(hinweise))
+    y_steuer, y_verwendungszweck = fusszeilen_positionen(ist_kleinunternehmer, steuerzeilen)
+    zeichne_vorlage(c, lambda: fusszeilen_operationen(ist_kleinunternehmer, steuerzeilen),
+                    ("fusszeile", ist_kleinunternehmer, steuerzeilen) if hintergrund_cache else None)
     
-    # Pflicht-Steuerhinweis gem. §14 UStG
     c.setFont("Helvetica", 8)
-    if ist_kleinunternehmer:
-        c.drawString(20*mm, y_footer, "Steuerrechtlicher Hinweis (Pflichtangabe gem. §14 UStG):")
-        y_footer -= 3*mm
-        c.drawString(20*mm, y_footer, "Kleinunternehmerregelung nach §19 UStG - keine Umsatzsteuer ausgewiesen")
-        y_footer -= 5*mm
-    else:
-        c.drawString(20*mm, y_footer, f"Anwendbarer Steuersatz: 19% Umsatzsteuer - Steuerbetrag: {steuer_betrag:.2f} EUR")
-        y_footer -= 5*mm
-    
-    # Zahlungshinweise
-    c.drawString(20*mm, y_footer, "Zahlungshinweise:")
-    y_footer -= 3*mm
-    c.drawString(20*mm, y_footer, f"Bitte überweisen Sie den Rechnungsbetrag innerhalb von 14 Tagen ohne Abzug auf unser Konto.")
-    y_footer -= 4*mm
+    for hinweis in hinweise:
+        c.drawString(20*mm, y_steuer, hinweis)
+        y_steuer -= 3*mm
     
     # Verwendungszweck hervorgehoben
     c.setFont("Helvetica-Bold", 9)
-    c.drawString(20*mm, y_footer, f"➤ VERWENDUNGSZWECK: Rechnung {rechnungsnummer}")
-    c.setFont("Helvetica", 8)
-    y_footer -= 6*mm
+    c.drawString(20*mm, y_verwendungszweck, f"➤ VERWENDUNGSZWECK: Rechnung {rechnungsnummer}")
     
-    # Allgemeine Geschäftsbedingungen
-    c.drawString(20*mm, y_footer, "Es gelten unsere Allgemeinen Geschäftsbedingungen. Erfüllungsort und Gerichtsstand ist unser Geschäftssitz.")
-    y_footer -= 3*mm
-    c.drawString(20*mm, y_footer, "Bei Rückfragen stehen wir Ihnen gerne zur Verfügung.")
+    # Kompression der Inhaltsströme und Schreiben (bzw. in den Puffer)
+    with messe("pdf_speichern"):
+        c.save()
+    zaehle("dokumente_pdf")
+
+@gemessen("zugferd_pdf")
+def erstelle_zugferd_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, pdf_path, ist_kleinunternehmer, freitext=None, cii_xml=None):
+    """Erstellt eine hybride ZUGFeRD-Rechnung (PDF mit eingebetteter CII-XML)
     
-    c.save()
+    Das PDF wird im Speicher gerendert, die CII-XML per pypdf als
+    eingebettete Datei (AFRelationship /Alternative) angehängt und das
+    Ergebnis mit einem einzigen Schreibvorgang gespeichert.
+    """
+    try:
+        import pypdf
+        from pypdf.generic import ArrayObject, NameObject
+    except ImportError:
+        raise RuntimeError("pypdf ist nicht installiert - ZUGFeRD-Einbettung nicht möglich")
+    
+    summen = als_summen(summen, positionen, ist_kleinunternehmer)
+    if cii_xml is None:
+        cii_xml = erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, None, ist_kleinunternehmer)
+    
+    # PDF nur im Speicher rendern
+    pdf_puffer = io.BytesIO()
+    erstelle_pdf(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, None, pdf_puffer, ist_kleinunternehmer, freitext)
+    pdf_puffer.seek(0)
     
-    # Einfaches PDF ohne XML-Einbettung
-    print(f"✅ PDF-Rechnung erstellt")
+    writer = pypdf.PdfWriter(clone_from=pypdf.PdfReader(pdf_puffer))
+    
+    # CII-XML als Associated File einbetten
+    anhang = writer.add_attachment(ZUGFERD_DATEINAME, cii_xml.encode("utf-8"))
+    anhang.subtype = NameObject("/text/xml")
+    anhang.description = pypdf.generic.TextStringObject("ZUGFeRD-Rechnungsdaten (CII)")
+    anhang.associated_file_relationship = NameObject("/Alternative")
+    writer.root_object[NameObject("/AF")] = ArrayObject([anhang.pdf_object.indirect_reference])
+    
+    # XMP-Metadaten mit ZUGFeRD/Factur-X-Erweiterungsschema
+    writer.xmp_metadata = erstelle_zugferd_xmp(rechnungsnummer)
+    
+    # Ergebnis im Speicher serialisieren und in einem Schritt schreiben
+    ausgabe = io.BytesIO()
+    writer.write(ausgabe)
+    if hasattr(pdf_path, "write"):
+        pdf_path.write(ausgabe.getbuffer())
+    else:
+        with open(pdf_path, "wb") as f:
+            f.write(ausgabe.getbuffer())
+    
+    zaehle("dokumente_zugferd")
+
+def erstelle_zugferd_xmp(rechnungsnummer):
+    """Erstellt XMP-Metadaten mit dem ZUGFeRD/Factur-X-Erweiterungsschema"""
+    return f"""<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/">
+      <dc:title><rdf:Alt><rdf:li xml:lang="x-default">Rechnung {rechnungsnummer}</rdf:li></rdf:Alt></dc:title>
+    </rdf:Description>
+    <rdf:Description rdf:about="" xmlns:fx="urn:factur-x:pdfa:CrossIndustryDocument:invoice:1p0#">
+      <fx:DocumentType>INVOICE</fx:DocumentType>
+      <fx:DocumentFileName>{ZUGFERD_DATEINAME}</fx:DocumentFileName>
+      <fx:Version>1.0</fx:Version>
+      <fx:ConformanceLevel>{ZUGFERD_PROFIL}</fx:ConformanceLevel>
+    </rdf:Description>
+    <rdf:Description rdf:about=""
+        xmlns:pdfaExtension="http://www.aiim.org/pdfa/ns/extension/"
+        xmlns:pdfaSchema="http://www.aiim.org/pdfa/ns/schema#"
+        xmlns:pdfaProperty="http://www.aiim.org/pdfa/ns/property#">
+      <pdfaExtension:schemas>
+        <rdf:Bag>
+          <rdf:li rdf:parseType="Resource">
+            <pdfaSchema:schema>Factur-X PDFA Extension Schema</pdfaSchema:schema>
+            <pdfaSchema:namespaceURI>urn:factur-x:pdfa:CrossIndustryDocument:invoice:1p0#</pdfaSchema:namespaceURI>
+            <pdfaSchema:prefix>fx</pdfaSchema:prefix>
+            <pdfaSchema:property>
+              <rdf:Seq>
+                <rdf:li rdf:parseType="Resource">
+                  <pdfaProperty:name>DocumentFileName</pdfaProperty:name>
+                  <pdfaProperty:valueType>Text</pdfaProperty:valueType>
+                  <pdfaProperty:category>external</pdfaProperty:category>
+                  <pdfaProperty:description>Name of the embedded XML invoice file</pdfaProperty:description>
+                </rdf:li>
+                <rdf:li rdf:parseType="Resource">
+                  <pdfaProperty:name>DocumentType</pdfaProperty:name>
+                  <pdfaProperty:valueType>Text</pdfaProperty:valueType>
+                  <pdfaProperty:category>external</pdfaProperty:category>
+                  <pdfaProperty:description>INVOICE</pdfaProperty:description>
+                </rdf:li>
+                <rdf:li rdf:parseType="Resource">
+                  <pdfaProperty:name>Version</pdfaProperty:name>
+                  <pdfaProperty:valueType>Text</pdfaProperty:valueType>
+                  <pdfaProperty:category>external</pdfaProperty:category>
+                  <pdfaProperty:description>Version of the Factur-X XML schema</pdfaProperty:description>
+                </rdf:li>
+                <rdf:li rdf:parseType="Resource">
+                  <pdfaProperty:name>ConformanceLevel</pdfaProperty:name>
+                  <pdfaProperty:valueType>Text</pdfaProperty:valueType>
+                  <pdfaProperty:category>external</pdfaProperty:category>
+                  <pdfaProperty:description>Conformance level of the embedded XML invoice</pdfaProperty:description>
+                </rdf:li>
+              </rdf:Seq>
+            </pdfaSchema:property>
+          </rdf:li>
+        </rdf:Bag>
+      </pdfaExtension:schemas>
+    </rdf:Description>
+  </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>""".encode("utf-8")
 
-def erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, betrag, xml_path, ist_kleinunternehmer=False):
-    """Erstellt temporäre XML für interne Zwecke (kein echtes ZUGFeRD)"""
+@gemessen("cii_xml")
+def erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, xml_path=None, ist_kleinunternehmer=False):
+    """Erstellt die CII-XML (ZUGFeRD-Syntax) im Speicher und gibt sie als String zurück.
+    
+    Eine Datei wird nur geschrieben, wenn xml_path angegeben ist.
+    """
     datum_obj = datetime.strptime(datum, "%d.%m.%Y")
     datum_iso = datum_obj.strftime("%Y%m%d")
     faellig_datum = (datum_obj + timedelta(days=14)).strftime("%Y%m%d")
     
-    if ist_kleinunternehmer:
-        steuer_betrag = 0
-        gesamt_betrag = betrag
-        steuer_kategorie = "E"
-        steuer_prozent = 0
-        steuer_grund = "Kleinunternehmerregelung nach §19 UStG"
-    else:
-        steuer_betrag = betrag * 0.19
-        gesamt_betrag = betrag * 1.19
-        steuer_kategorie = "S"
-        steuer_prozent = 19
-        steuer_grund = ""
+    summen = als_summen(summen, positionen, ist_kleinunternehmer)
+    betrag = summen.netto
+    steuer_betrag = summen.steuer
+    gesamt_betrag = summen.brutto
+    
+    # Eine Position je Rechnungsposition, ein ApplicableTradeTax je Steuergruppe
+    prozente = [satz_text(gruppe["satz"]) for gruppe in summen.steuergruppen]
+    positionen_xml = "".join(
+        cii_position(i, pos, summen.linie(i - 1), summen.gruppe(i - 1)["kategorie"], prozente[summen.linien_gruppe[i - 1]])
+        for i, pos in enumerate(positionen, 1)
+    )
+    steuern_xml = "".join(
+        cii_steuergruppe(gruppe, prozent) for gruppe, prozent in zip(summen.steuergruppen, prozente)
+    )
+    
+    # Alle Freitexte XML-sicher machen (z.B. "Müller & Söhne")
+    nummer = xml_text(rechnungsnummer)
+    firma = {schluessel: xml_text(wert) for schluessel, wert in unternehmen_data.items()}
+    kunde = {schluessel: xml_text(wert) for schluessel, wert in kunde_data.items()}
     
     # XML direkt als String erstellen für bessere Kompatibilität
     xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
@@ -388,77 +904,52 @@ def erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, p
   </rsm:ExchangedDocumentContext>
   
   <rsm:ExchangedDocument>
-    <ram:ID>{rechnungsnummer}</ram:ID>
+    <ram:ID>{nummer}</ram:ID>
     <ram:TypeCode>380</ram:TypeCode>
     <ram:IssueDateTime>
       <udt:DateTimeString format="102">{datum_iso}</udt:DateTimeString>
     </ram:IssueDateTime>
   </rsm:ExchangedDocument>
   
-  <rsm:SupplyChainTradeTransaction>
-    <ram:IncludedSupplyChainTradeLineItem>
-      <ram:AssociatedDocumentLineDocument>
-        <ram:LineID>1</ram:LineID>
-      </ram:AssociatedDocumentLineDocument>
-      <ram:SpecifiedTradeProduct>
-        <ram:Name>Dienstleistung</ram:Name>
-      </ram:SpecifiedTradeProduct>
-      <ram:SpecifiedLineTradeAgreement>
-        <ram:NetPriceProductTradePrice>
-          <ram:ChargeAmount>{betrag:.2f}</ram:ChargeAmount>
-        </ram:NetPriceProductTradePrice>
-      </ram:SpecifiedLineTradeAgreement>
-      <ram:SpecifiedLineTradeDelivery>
-        <ram:BilledQuantity unitCode="H87">1.00</ram:BilledQuantity>
-      </ram:SpecifiedLineTradeDelivery>
-      <ram:SpecifiedLineTradeSettlement>
-        <ram:ApplicableTradeTax>
-          <ram:TypeCode>VAT</ram:TypeCode>
-          <ram:CategoryCode>{steuer_kategorie}</ram:CategoryCode>
-          <ram:RateApplicablePercent>{steuer_prozent}</ram:RateApplicablePercent>
-        </ram:ApplicableTradeTax>
-        <ram:SpecifiedTradeSettlementLineMonetarySummation>
-          <ram:LineTotalAmount>{betrag:.2f}</ram:LineTotalAmount>
-        </ram:SpecifiedTradeSettlementLineMonetarySummation>
-      </ram:SpecifiedLineTradeSettlement>
-    </ram:IncludedSupplyChainTradeLineItem>
+  <rsm:SupplyChainTradeTransaction>{positionen_xml}
     <ram:ApplicableHeaderTradeAgreement>
-      <ram:BuyerReference>RECHNUNG-{rechnungsnummer}</ram:BuyerReference>
+      <ram:BuyerReference>RECHNUNG-{nummer}</ram:BuyerReference>
       <ram:SellerTradeParty>
-        <ram:Name>{unternehmen_data.get('Firmenname', 'Mein Unternehmen')}</ram:Name>
+        <ram:Name>{firma.get('Firmenname', 'Mein Unternehmen')}</ram:Name>
         <ram:PostalTradeAddress>
-          <ram:PostcodeCode>{unternehmen_data.get('PLZ', '12345')}</ram:PostcodeCode>
-          <ram:LineOne>{unternehmen_data.get('Straße', 'Musterstraße')} {unternehmen_data.get('Hausnummer', '1')}</ram:LineOne>
-          <ram:CityName>{unternehmen_data.get('Ort', 'Musterstadt')}</ram:CityName>
-          <ram:CountryID>{unternehmen_data.get('Land', 'DE')}</ram:CountryID>
+          <ram:PostcodeCode>{firma.get('PLZ', '12345')}</ram:PostcodeCode>
+          <ram:LineOne>{firma.get('Straße', 'Musterstraße')} {firma.get('Hausnummer', '1')}</ram:LineOne>
+          <ram:CityName>{firma.get('Ort', 'Musterstadt')}</ram:CityName>
+          <ram:CountryID>{firma.get('Land', 'DE')}</ram:CountryID>
         </ram:PostalTradeAddress>
         <ram:SpecifiedTaxRegistration>
-          <ram:ID schemeID="VA">{unternehmen_data.get('USt-IdNr', 'DE999999999')}</ram:ID>
+          <ram:ID schemeID="VA">{firma.get('USt-IdNr', 'DE999999999')}</ram:ID>
         </ram:SpecifiedTaxRegistration>
         <ram:URIUniversalCommunication>
-          <ram:URIID schemeID="EM">{unternehmen_data.get('Email', 'info@unternehmen.de')}</ram:URIID>
+          <ram:URIID schemeID="EM">{firma.get('Email', 'info@unternehmen.de')}</ram:URIID>
         </ram:URIUniversalCommunication>
         <ram:DefinedTradeContact>
-          <ram:PersonName>{unternehmen_data.get('Geschäftsführer', 'Ansprechpartner')}</ram:PersonName>
+          <ram:PersonName>{firma.get('Geschäftsführer', 'Ansprechpartner')}</ram:PersonName>
           <ram:TelephoneUniversalCommunication>
-            <ram:CompleteNumber>{unternehmen_data.get('Telefon', '+49 123 456789')}</ram:CompleteNumber>
+            <ram:CompleteNumber>{firma.get('Telefon', '+49 123 456789')}</ram:CompleteNumber>
           </ram:TelephoneUniversalCommunication>
           <ram:EmailURIUniversalCommunication>
-            <ram:URIID>{unternehmen_data.get('Email', 'info@unternehmen.de')}</ram:URIID>
+            <ram:URIID>{firma.get('Email', 'info@unternehmen.de')}</ram:URIID>
           </ram:EmailURIUniversalCommunication>
         </ram:DefinedTradeContact>
       </ram:SellerTradeParty>
       <ram:BuyerTradeParty>
-        <ram:Name>{kunde_data.get('Firmenname', 'Kunde') or 'Kunde'}</ram:Name>
+        <ram:Name>{kunde.get('Firmenname', 'Kunde') or 'Kunde'}</ram:Name>
         <ram:PostalTradeAddress>
-          <ram:PostcodeCode>{kunde_data.get('PLZ', '54321') if kunde_data.get('PLZ', '').strip() else '54321'}</ram:PostcodeCode>
-          <ram:LineOne>{(kunde_data.get('Straße', '') + ' ' + kunde_data.get('Hausnummer', '')).strip() if (kunde_data.get('Straße', '') + kunde_data.get('Hausnummer', '')).strip() else 'Kundenstraße 1'}</ram:LineOne>
-          <ram:CityName>{kunde_data.get('Ort', 'Kundenstadt') if kunde_data.get('Ort', '').strip() else 'Kundenstadt'}</ram:CityName>
-          <ram:CountryID>{kunde_data.get('Land', 'DE')}</ram:CountryID>
+          <ram:PostcodeCode>{kunde.get('PLZ', '54321') if kunde.get('PLZ', '').strip() else '54321'}</ram:PostcodeCode>
+          <ram:LineOne>{(kunde.get('Straße', '') + ' ' + kunde.get('Hausnummer', '')).strip() if (kunde.get('Straße', '') + kunde.get('Hausnummer', '')).strip() else 'Kundenstraße 1'}</ram:LineOne>
+          <ram:CityName>{kunde.get('Ort', 'Kundenstadt') if kunde.get('Ort', '').strip() else 'Kundenstadt'}</ram:CityName>
+          <ram:CountryID>{kunde.get('Land', 'DE')}</ram:CountryID>
         </ram:PostalTradeAddress>
         <ram:URIUniversalCommunication>
-          <ram:URIID schemeID="EM">{kunde_data.get('Email', 'kunde@example.com') if kunde_data.get('Email', '').strip() else 'kunde@example.com'}</ram:URIID>
+          <ram:URIID schemeID="EM">{kunde.get('Email', 'kunde@example.com') if kunde.get('Email', '').strip() else 'kunde@example.com'}</ram:URIID>
         </ram:URIUniversalCommunication>
+        {f'<ram:SpecifiedTaxRegistration><ram:ID schemeID="VA">{kunde["USt-IdNr"]}</ram:ID></ram:SpecifiedTaxRegistration>' if kunde.get('USt-IdNr') else ''}
       </ram:BuyerTradeParty>
     </ram:ApplicableHeaderTradeAgreement>
     
@@ -476,21 +967,14 @@ def erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, p
         <ram:TypeCode>58</ram:TypeCode>
         <ram:Information>Überweisung</ram:Information>
         <ram:PayeePartyCreditorFinancialAccount>
-          <ram:IBANID>{unternehmen_data.get('IBAN', 'DE89370400440532013000').replace(' ', '')}</ram:IBANID>
-          <ram:AccountName>{unternehmen_data.get('Firmenname', 'Mein Unternehmen')}</ram:AccountName>
+          <ram:IBANID>{firma.get('IBAN', 'DE89370400440532013000').replace(' ', '')}</ram:IBANID>
+          <ram:AccountName>{firma.get('Firmenname', 'Mein Unternehmen')}</ram:AccountName>
         </ram:PayeePartyCreditorFinancialAccount>
         <ram:PayeeSpecifiedCreditorFinancialInstitution>
-          <ram:BICID>{unternehmen_data.get('BIC', 'COBADEFFXXX')}</ram:BICID>
-          <ram:Name>{unternehmen_data.get('Bank', 'Commerzbank')}</ram:Name>
+          <ram:BICID>{firma.get('BIC', 'COBADEFFXXX')}</ram:BICID>
+          <ram:Name>{firma.get('Bank', 'Commerzbank')}</ram:Name>
         </ram:PayeeSpecifiedCreditorFinancialInstitution>
-      </ram:SpecifiedTradeSettlementPaymentMeans>
-      <ram:ApplicableTradeTax>
-        <ram:CalculatedAmount>{steuer_betrag:.2f}</ram:CalculatedAmount>
-        <ram:TypeCode>VAT</ram:TypeCode>
-        <ram:BasisAmount>{betrag:.2f}</ram:BasisAmount>
-        <ram:CategoryCode>{steuer_kategorie}</ram:CategoryCode>
-        <ram:RateApplicablePercent>{steuer_prozent}</ram:RateApplicablePercent>{f'<ram:ExemptionReason>{steuer_grund}</ram:ExemptionReason>' if ist_kleinunternehmer else ''}
-      </ram:ApplicableTradeTax>
+      </ram:SpecifiedTradeSettlementPaymentMeans>{steuern_xml}
       <ram:SpecifiedTradePaymentTerms>
         <ram:Description>Zahlbar innerhalb 14 Tage ohne Abzug.</ram:Description>
         <ram:DueDateDateTime>
@@ -509,118 +993,186 @@ def erstelle_zugferd_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, p
   </rsm:SupplyChainTradeTransaction>
 </rsm:CrossIndustryInvoice>"""
     
-    # XML speichern
-    with open(xml_path, 'w', encoding='utf-8') as f:
-        f.write(xml_content)
+    # XML nur auf Anforderung speichern
+    if xml_path:
+        with open(xml_path, 'w', encoding='utf-8') as f:
+            f.write(xml_content)
+        zaehle("dokumente_cii")
     
-    print(f"✅ Temporäre XML erstellt: {xml_path}")
     return xml_content
 
-def erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, betrag, xml_path, ist_kleinunternehmer=False):
-    """Erstellt XRechnung-XML mit Unternehmen- und Kundendaten"""
+def cii_position(nummer, pos, linien_betrag, steuer_kategorie, steuer_prozent):
+    """Eine IncludedSupplyChainTradeLineItem der CII-XML"""
+    return f"""
+    <ram:IncludedSupplyChainTradeLineItem>
+      <ram:AssociatedDocumentLineDocument>
+        <ram:LineID>{nummer}</ram:LineID>
+      </ram:AssociatedDocumentLineDocument>
+      <ram:SpecifiedTradeProduct>
+        <ram:Name>{xml_text(pos["bezeichnung"])}</ram:Name>
+      </ram:SpecifiedTradeProduct>
+      <ram:SpecifiedLineTradeAgreement>
+        <ram:NetPriceProductTradePrice>
+          <ram:ChargeAmount>{preis_text(pos["einzelpreis"])}</ram:ChargeAmount>
+        </ram:NetPriceProductTradePrice>
+      </ram:SpecifiedLineTradeAgreement>
+      <ram:SpecifiedLineTradeDelivery>
+        <ram:BilledQuantity unitCode="HUR">{zu_decimal(pos["menge"])}</ram:BilledQuantity>
+      </ram:SpecifiedLineTradeDelivery>
+      <ram:SpecifiedLineTradeSettlement>
+        <ram:ApplicableTradeTax>
+          <ram:TypeCode>VAT</ram:TypeCode>
+          <ram:CategoryCode>{steuer_kategorie}</ram:CategoryCode>
+          <ram:RateApplicablePercent>{steuer_prozent}</ram:RateApplicablePercent>
+        </ram:ApplicableTradeTax>
+        <ram:SpecifiedTradeSettlementLineMonetarySummation>
+          <ram:LineTotalAmount>{linien_betrag:.2f}</ram:LineTotalAmount>
+        </ram:SpecifiedTradeSettlementLineMonetarySummation>
+      </ram:SpecifiedLineTradeSettlement>
+    </ram:IncludedSupplyChainTradeLineItem>"""
+
+def cii_steuergruppe(gruppe, steuer_prozent):
+    """ApplicableTradeTax (Steueraufschlüsselung) einer Steuergruppe in der CII-XML"""
+    befreiung = f"""
+        <ram:ExemptionReason>{xml_text(gruppe["befreiungsgrund"])}</ram:ExemptionReason>""" if gruppe["befreiungsgrund"] else ""
+    return f"""
+      <ram:ApplicableTradeTax>
+        <ram:CalculatedAmount>{cent_zu_decimal(gruppe["steuer_cent"]):.2f}</ram:CalculatedAmount>
+        <ram:TypeCode>VAT</ram:TypeCode>{befreiung}
+        <ram:BasisAmount>{cent_zu_decimal(gruppe["basis_cent"]):.2f}</ram:BasisAmount>
+        <ram:CategoryCode>{gruppe["kategorie"]}</ram:CategoryCode>
+        <ram:RateApplicablePercent>{steuer_prozent}</ram:RateApplicablePercent>
+      </ram:ApplicableTradeTax>"""
+
+@gemessen("xrechnung_xml")
+def erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen, xml_path, ist_kleinunternehmer=False):
+    """Erstellt XRechnung-XML mit Unternehmen- und Kundendaten
+    
+    Das Dokument wird inkrementell geschrieben: erst Kopf und Summen, dann
+    jede InvoiceLine, sobald sie erzeugt ist (blockweise, damit auch
+    Rechnungen mit vielen tausend Positionen nur wenig Speicher brauchen).
+    xml_path kann ein Dateipfad oder ein binäres Datei-Objekt sein.
+    """
+    summen = als_summen(summen, positionen, ist_kleinunternehmer)
+    
+    if hasattr(xml_path, "write"):
+        schreibe_xrechnung(xml_path, rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen)
+    else:
+        with open(xml_path, "wb") as f:
+            schreibe_xrechnung(f, rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen)
+
+def schreibe_xrechnung(ziel, rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, summen):
+    """Schreibt die XRechnung (UBL) UTF-8-kodiert in ein binäres Datei-Objekt"""
+    prozente = [satz_text(gruppe["satz"]) for gruppe in summen.steuergruppen]
+    
+    with messe("xml_kopf"):
+        ziel.write(xrechnung_kopf(rechnungsnummer, kunde_data, unternehmen_data, datum, summen).encode("utf-8"))
+    
+    # Positionen blockweise kodieren und schreiben
+    block = []
+    for i, pos in enumerate(positionen, 1):
+        gruppe = summen.linien_gruppe[i - 1]
+        block.append(xrechnung_position(i, pos, summen.linie(i - 1), summen.steuergruppen[gruppe]["kategorie"], prozente[gruppe]))
+        if len(block) >= XML_BLOCK_POSITIONEN:
+            ziel.write("".join(block).encode("utf-8"))
+            block.clear()
+    block.append("""
+</ubl:Invoice>""")
+    ziel.write("".join(block).encode("utf-8"))
+
+def xrechnung_kopf(rechnungsnummer, kunde_data, unternehmen_data, datum, summen):
+    """Kopf der XRechnung (Parteien, Zahlung, Steuern, Summen) bis vor die erste InvoiceLine"""
     datum_obj = datetime.strptime(datum, "%d.%m.%Y")
     datum_iso = datum_obj.strftime("%Y-%m-%d")
     due_date = (datum_obj + timedelta(days=14)).strftime("%Y-%m-%d")
     
-    if ist_kleinunternehmer:
-        steuer_betrag = 0
-        gesamt_betrag = betrag
-        steuer_kategorie = "E"  # Exempt (befreit)
-        steuer_prozent = 0
-    else:
-        steuer_betrag = betrag * 0.19
-        gesamt_betrag = betrag * 1.19
-        steuer_kategorie = "S"  # Standard
-        steuer_prozent = 19
+    betrag = summen.netto
+    steuer_betrag = summen.steuer
+    gesamt_betrag = summen.brutto
     
-    xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
+    # Alle Freitexte XML-sicher machen (z.B. "Müller & Söhne")
+    nummer = xml_text(rechnungsnummer)
+    firma = {schluessel: xml_text(wert) for schluessel, wert in unternehmen_data.items()}
+    kunde = {schluessel: xml_text(wert) for schluessel, wert in kunde_data.items()}
+    
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
 <ubl:Invoice xmlns:ubl="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
     xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
     xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">
     <cbc:CustomizationID>urn:cen.eu:en16931:2017#compliant#urn:xeinkauf.de:kosit:xrechnung_3.0</cbc:CustomizationID>
     <cbc:ProfileID>urn:fdc:peppol.eu:2017:poacc:billing:01:1.0</cbc:ProfileID>
-    <cbc:ID>{rechnungsnummer}</cbc:ID>
+    <cbc:ID>{nummer}</cbc:ID>
     <cbc:IssueDate>{datum_iso}</cbc:IssueDate>
     <cbc:DueDate>{due_date}</cbc:DueDate>
     <cbc:InvoiceTypeCode>380</cbc:InvoiceTypeCode>
     <cbc:Note>Rechnung</cbc:Note>
     <cbc:DocumentCurrencyCode>EUR</cbc:DocumentCurrencyCode>
-    <cbc:BuyerReference>RECHNUNG-{rechnungsnummer}</cbc:BuyerReference>
+    <cbc:BuyerReference>RECHNUNG-{nummer}</cbc:BuyerReference>
     <cac:AccountingSupplierParty>
         <cac:Party>
-            {f'<cbc:EndpointID schemeID="EM">{unternehmen_data.get("Email", "info@unternehmen.de")}</cbc:EndpointID>' if unternehmen_data.get("Email", "info@unternehmen.de") else ''}
+            {f'<cbc:EndpointID schemeID="EM">{firma.get("Email", "info@unternehmen.de")}</cbc:EndpointID>' if firma.get("Email", "info@unternehmen.de") else ''}
             <cac:PartyIdentification>
-                <cbc:ID>{unternehmen_data.get('USt-IdNr', 'DE123456789')}</cbc:ID>
+                <cbc:ID>{firma.get('USt-IdNr', 'DE123456789')}</cbc:ID>
             </cac:PartyIdentification>
             <cac:PartyName>
-                <cbc:Name>{unternehmen_data.get('Firmenname', 'Mein Unternehmen')}</cbc:Name>
+                <cbc:Name>{firma.get('Firmenname', 'Mein Unternehmen')}</cbc:Name>
             </cac:PartyName>
             <cac:PostalAddress>
-                <cbc:StreetName>{unternehmen_data.get('Straße', 'Musterstraße')} {unternehmen_data.get('Hausnummer', '1')}</cbc:StreetName>
-                <cbc:CityName>{unternehmen_data.get('Ort', 'Musterstadt')}</cbc:CityName>
-                <cbc:PostalZone>{unternehmen_data.get('PLZ', '12345')}</cbc:PostalZone>
+                <cbc:StreetName>{firma.get('Straße', 'Musterstraße')} {firma.get('Hausnummer', '1')}</cbc:StreetName>
+                <cbc:CityName>{firma.get('Ort', 'Musterstadt')}</cbc:CityName>
+                <cbc:PostalZone>{firma.get('PLZ', '12345')}</cbc:PostalZone>
                 <cac:Country>
-                    <cbc:IdentificationCode>{unternehmen_data.get('Land', 'DE')}</cbc:IdentificationCode>
+                    <cbc:IdentificationCode>{firma.get('Land', 'DE')}</cbc:IdentificationCode>
                 </cac:Country>
             </cac:PostalAddress>
             <cac:PartyTaxScheme>
-                <cbc:CompanyID>{unternehmen_data.get('USt-IdNr', 'DE123456789')}</cbc:CompanyID>
+                <cbc:CompanyID>{firma.get('USt-IdNr', 'DE123456789')}</cbc:CompanyID>
                 <cac:TaxScheme>
                     <cbc:ID>VAT</cbc:ID>
                 </cac:TaxScheme>
             </cac:PartyTaxScheme>
             <cac:PartyLegalEntity>
-                <cbc:RegistrationName>{unternehmen_data.get('Firmenname', 'Mein Unternehmen')}</cbc:RegistrationName>
+                <cbc:RegistrationName>{firma.get('Firmenname', 'Mein Unternehmen')}</cbc:RegistrationName>
             </cac:PartyLegalEntity>
             <cac:Contact>
-                <cbc:Name>{unternehmen_data.get('Geschäftsführer', 'Max Mustermann')}</cbc:Name>
-                <cbc:Telephone>{unternehmen_data.get('Telefon', '+49 123 456789')}</cbc:Telephone>
-                <cbc:ElectronicMail>{unternehmen_data.get('Email', 'info@unternehmen.de')}</cbc:ElectronicMail>
+                <cbc:Name>{firma.get('Geschäftsführer', 'Max Mustermann')}</cbc:Name>
+                <cbc:Telephone>{firma.get('Telefon', '+49 123 456789')}</cbc:Telephone>
+                <cbc:ElectronicMail>{firma.get('Email', 'info@unternehmen.de')}</cbc:ElectronicMail>
             </cac:Contact>
         </cac:Party>
     </cac:AccountingSupplierParty>
     <cac:AccountingCustomerParty>
         <cac:Party>
-            {f'<cbc:EndpointID schemeID="EM">{kunde_data.get("Email")}</cbc:EndpointID>' if kunde_data.get("Email") and kunde_data.get("Email").strip() else ''}
+            {f'<cbc:EndpointID schemeID="EM">{kunde.get("Email")}</cbc:EndpointID>' if kunde.get("Email") and kunde.get("Email").strip() else ''}
+            {f'<cac:PartyIdentification><cbc:ID>{kunde["Kundennummer"]}</cbc:ID></cac:PartyIdentification>' if kunde.get("Kundennummer") else ''}
             <cac:PartyName>
-                <cbc:Name>{kunde_data.get('Firmenname', 'Kunde') if kunde_data.get('Firmenname', '').strip() else 'Kunde'}</cbc:Name>
+                <cbc:Name>{kunde.get('Firmenname', 'Kunde') if kunde.get('Firmenname', '').strip() else 'Kunde'}</cbc:Name>
             </cac:PartyName>
             <cac:PostalAddress>
-                <cbc:StreetName>{(kunde_data.get('Straße', '') + ' ' + kunde_data.get('Hausnummer', '')).strip() if (kunde_data.get('Straße', '') + kunde_data.get('Hausnummer', '')).strip() else 'Kundenstraße 1'}</cbc:StreetName>
-                <cbc:CityName>{kunde_data.get('Ort', 'Kundenstadt') if kunde_data.get('Ort', '').strip() else 'Kundenstadt'}</cbc:CityName>
-                <cbc:PostalZone>{kunde_data.get('PLZ', '54321') if kunde_data.get('PLZ', '').strip() else '54321'}</cbc:PostalZone>
+                <cbc:StreetName>{(kunde.get('Straße', '') + ' ' + kunde.get('Hausnummer', '')).strip() if (kunde.get('Straße', '') + kunde.get('Hausnummer', '')).strip() else 'Kundenstraße 1'}</cbc:StreetName>
+                <cbc:CityName>{kunde.get('Ort', 'Kundenstadt') if kunde.get('Ort', '').strip() else 'Kundenstadt'}</cbc:CityName>
+                <cbc:PostalZone>{kunde.get('PLZ', '54321') if kunde.get('PLZ', '').strip() else '54321'}</cbc:PostalZone>
                 <cac:Country>
-                    <cbc:IdentificationCode>{kunde_data.get('Land', 'DE')}</cbc:IdentificationCode>
+                    <cbc:IdentificationCode>{kunde.get('Land', 'DE')}</cbc:IdentificationCode>
                 </cac:Country>
             </cac:PostalAddress>
+            {f'<cac:PartyTaxScheme><cbc:CompanyID>{kunde["USt-IdNr"]}</cbc:CompanyID><cac:TaxScheme><cbc:ID>VAT</cbc:ID></cac:TaxScheme></cac:PartyTaxScheme>' if kunde.get('USt-IdNr') else ''}
             <cac:PartyLegalEntity>
-                <cbc:RegistrationName>{kunde_data.get('Firmenname', 'Kunde') if kunde_data.get('Firmenname', '').strip() else 'Kunde'}</cbc:RegistrationName>
+                <cbc:RegistrationName>{kunde.get('Firmenname', 'Kunde') if kunde.get('Firmenname', '').strip() else 'Kunde'}</cbc:RegistrationName>
             </cac:PartyLegalEntity>
         </cac:Party>
     </cac:AccountingCustomerParty>
     <cac:PaymentMeans>
         <cbc:PaymentMeansCode>58</cbc:PaymentMeansCode>
         <cac:PayeeFinancialAccount>
-            <cbc:ID>{unternehmen_data.get('IBAN', 'DE89370400440532013000')}</cbc:ID>
+            <cbc:ID>{firma.get('IBAN', 'DE89370400440532013000')}</cbc:ID>
         </cac:PayeeFinancialAccount>
     </cac:PaymentMeans>
     <cac:PaymentTerms>
         <cbc:Note>Zahlbar innerhalb von 14 Tagen ohne Abzug</cbc:Note>
     </cac:PaymentTerms>
     <cac:TaxTotal>
-        <cbc:TaxAmount currencyID="EUR">{steuer_betrag:.2f}</cbc:TaxAmount>
-        <cac:TaxSubtotal>
-            <cbc:TaxableAmount currencyID="EUR">{betrag:.2f}</cbc:TaxableAmount>
-            <cbc:TaxAmount currencyID="EUR">{steuer_betrag:.2f}</cbc:TaxAmount>
-            <cac:TaxCategory>
-                <cbc:ID>{steuer_kategorie}</cbc:ID>
-                <cbc:Percent>{steuer_prozent}</cbc:Percent>
-                {f'<cbc:TaxExemptionReason>Kleinunternehmerregelung § 19 UStG</cbc:TaxExemptionReason>' if ist_kleinunternehmer else ''}
-                <cac:TaxScheme>
-                    <cbc:ID>VAT</cbc:ID>
-                </cac:TaxScheme>
-            </cac:TaxCategory>
-        </cac:TaxSubtotal>
+        <cbc:TaxAmount currencyID="EUR">{steuer_betrag:.2f}</cbc:TaxAmount>{"".join(xrechnung_steuergruppe(gruppe) for gruppe in summen.steuergruppen)}
     </cac:TaxTotal>
     <cac:LegalMonetaryTotal>
         <cbc:LineExtensionAmount currencyID="EUR">{betrag:.2f}</cbc:LineExtensionAmount>
@@ -629,16 +1181,32 @@ def erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum,
         <cbc:PayableAmount currencyID="EUR">{gesamt_betrag:.2f}</cbc:PayableAmount>
     </cac:LegalMonetaryTotal>"""
 
-    # Positionen hinzufügen
-    for i, pos in enumerate(positionen, 1):
-        linien_betrag = pos["menge"] * pos["einzelpreis"]
-        xml_content += f"""
+def xrechnung_steuergruppe(gruppe):
+    """TaxSubtotal einer Steuergruppe in der XRechnung"""
+    befreiung = f'<cbc:TaxExemptionReason>{xml_text(gruppe["befreiungsgrund"])}</cbc:TaxExemptionReason>' if gruppe["befreiungsgrund"] else ''
+    return f"""
+        <cac:TaxSubtotal>
+            <cbc:TaxableAmount currencyID="EUR">{cent_zu_decimal(gruppe["basis_cent"]):.2f}</cbc:TaxableAmount>
+            <cbc:TaxAmount currencyID="EUR">{cent_zu_decimal(gruppe["steuer_cent"]):.2f}</cbc:TaxAmount>
+            <cac:TaxCategory>
+                <cbc:ID>{gruppe["kategorie"]}</cbc:ID>
+                <cbc:Percent>{satz_text(gruppe["satz"])}</cbc:Percent>
+                {befreiung}
+                <cac:TaxScheme>
+                    <cbc:ID>VAT</cbc:ID>
+                </cac:TaxScheme>
+            </cac:TaxCategory>
+        </cac:TaxSubtotal>"""
+
+def xrechnung_position(nummer, pos, linien_betrag, steuer_kategorie, steuer_prozent):
+    """Eine InvoiceLine der XRechnung"""
+    return f"""
     <cac:InvoiceLine>
-        <cbc:ID>{i}</cbc:ID>
-        <cbc:InvoicedQuantity unitCode="HUR">{pos["menge"]}</cbc:InvoicedQuantity>
+        <cbc:ID>{nummer}</cbc:ID>
+        <cbc:InvoicedQuantity unitCode="HUR">{zu_decimal(pos["menge"])}</cbc:InvoicedQuantity>
         <cbc:LineExtensionAmount currencyID="EUR">{linien_betrag:.2f}</cbc:LineExtensionAmount>
         <cac:Item>
-            <cbc:Name>{pos["bezeichnung"]}</cbc:Name>
+            <cbc:Name>{xml_text(pos["bezeichnung"])}</cbc:Name>
             <cac:ClassifiedTaxCategory>
                 <cbc:ID>{steuer_kategorie}</cbc:ID>
                 <cbc:Percent>{steuer_prozent}</cbc:Percent>
@@ -648,12 +1216,6 @@ def erstelle_xrechnung_xml(rechnungsnummer, kunde_data, unternehmen_data, datum,
             </cac:ClassifiedTaxCategory>
         </cac:Item>
         <cac:Price>
-            <cbc:PriceAmount currencyID="EUR">{pos["einzelpreis"]:.2f}</cbc:PriceAmount>
+            <cbc:PriceAmount currencyID="EUR">{preis_text(pos["einzelpreis"])}</cbc:PriceAmount>
         </cac:Price>
-    </cac:InvoiceLine>"""
-
-    xml_content += """
-</ubl:Invoice>"""
-    
-    with open(xml_path, "w", encoding="utf-8") as f:
-        f.write(xml_content)
\ No newline at end of file
+    </cac:InvoiceLine>"""
\ No newline at end of file
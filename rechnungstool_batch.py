@@ -0,0 +1,481 @@
+"""
+Stapelverarbeitung für Rechnungen
+=================================
+
+Erstellt viele Rechnungen in einem Lauf (z.B. zum Monatsende). Die
+Rechnungsnummern werden vorab für alle Aufträge reserviert, danach werden
+PDF und XRechnung-XML parallel in einem Prozess-Pool erzeugt.
+
+Ein Rechnungsauftrag ist ein Dict:
+
+    {
+        "kundennummer": "K001",
+        "datum": "05.11.2025",            # optional, Standard: heute
+        "positionen": [
+            {"bezeichnung": "Beratung", "menge": 2, "einzelpreis": 95.0},
+            {"bezeichnung": "Fachbuch", "menge": 1, "einzelpreis": 39.9,
+             "steuersatz": 7},              # optional, Standard: 19
+            {"bezeichnung": "Montage", "menge": 1, "einzelpreis": 500.0,
+             "steuerkategorie": "AE"}       # optional: S, Z, E, AE, K, G
+        ],
+        "freitext": "Vielen Dank ..."     # optional
+    }
+
+Für unbeaufsichtigte Läufe (z.B. per cron) liest der Befehl 'run' Aufträge
+als JSON Lines (ein Auftrag pro Zeile) oder CSV (eine Position pro Zeile,
+Zeilen mit gleicher Spalte "auftrag" bilden eine Rechnung) aus einer Datei
+oder von stdin und gibt je Rechnung eine JSON-Ergebniszeile auf stdout aus.
+"""
+
+import os
+import io
+import csv
+import sys
+import json
+import time
+import base64
+import contextlib
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from rechnungstool_backend import erzeuge_rechnungsdateien
+from rechnungstool_ablage import ablage_verzeichnis
+from rechnungstool_metriken import aktiviere, fuehre_zusammen, ist_aktiv, sammle, schreibe_metriken, zaehle
+from rechnungstool_protokoll import aktuelle_stufe, richte_protokoll_ein
+from rechnungstool_summen import pruefe_menge_preis, steuer_schluessel, zu_decimal
+
+def pruefe_auftrag(auftrag, kunden):
+    """Prüft einen Rechnungsauftrag und gibt eine Fehlermeldung oder None zurück"""
+    if not isinstance(auftrag, dict):
+        return "Auftrag ist kein JSON-Objekt"
+
+    kundennummer = auftrag.get("kundennummer")
+    if not kundennummer:
+        return "Kundennummer fehlt"
+    if kundennummer not in kunden:
+        return f"Unbekannte Kundennummer: {kundennummer}"
+
+    try:
+        datetime.strptime(auftrag.get("datum") or datetime.today().strftime("%d.%m.%Y"), "%d.%m.%Y")
+    except (TypeError, ValueError):
+        return f"Ungültiges Datum (erwartet TT.MM.JJJJ): {auftrag.get('datum')}"
+
+    positionen = auftrag.get("positionen")
+    if not positionen:
+        return "Keine Positionen angegeben"
+    for i, pos in enumerate(positionen, 1):
+        if not isinstance(pos, dict) or not pos.get("bezeichnung"):
+            return f"Position {i}: Bezeichnung fehlt"
+        # Wie die Summenberechnung (auch "12,50"); NaN, Unendlich und zu große Werte erst gar nicht nummerieren
+        try:
+            pruefe_menge_preis(pos.get("menge"), pos.get("einzelpreis"))
+        except ValueError:
+            return f"Position {i}: Ungültige Menge oder Einzelpreis"
+        try:
+            steuer_schluessel(pos)
+        except ValueError as e:
+            return f"Position {i}: {e}"
+
+    return None
+
+def normalisiere_positionen(positionen):
+    """Wandelt Positionen aus JSON/CSV in das Format von erstelle_rechnung um"""
+    normalisiert = []
+    for pos in positionen:
+        position = {
+            "bezeichnung": str(pos["bezeichnung"]),
+            "menge": zu_decimal(pos["menge"]),
+            "einzelpreis": zu_decimal(pos["einzelpreis"]),
+        }
+        for schluessel in ("steuersatz", "steuerkategorie"):
+            if pos.get(schluessel) not in (None, ""):
+                position[schluessel] = pos[schluessel]
+        normalisiert.append(position)
+    return normalisiert
+
+def baue_job(manager, index, auftrag, datum, rechnungsnummer, cii_xml=False, zugferd=False, meldungen_stderr=False, inhalt=False, auftrag_schluessel=None):
+    """Stellt alle Daten eines geprüften Auftrags für erstelle_einzelrechnung zusammen
+
+    Mit inhalt=True enthält das Ergebnis zusätzlich PDF und XML als Base64
+    (pdf_base64, xml_base64), gelesen noch unter der Sperre der Ablage. Nur
+    mit auftrag_schluessel wird der Render-Cache benutzt; er merkt sich nach
+    dem Ablegen die Nummer des Auftrags für wiederholte Läufe (siehe
+    vergebe_nummern). Ohne kann die frisch reservierte Nummer nie
+    wiederkommen, der Cache würde nur Zeit kosten.
+    """
+    return {
+        "index": index,
+        "rechnungsnummer": rechnungsnummer,
+        "kunde_data": manager.kunden[auftrag["kundennummer"]],
+        "unternehmen_data": manager.unternehmen_daten,
+        "datum": datum,
+        "positionen": normalisiere_positionen(auftrag["positionen"]),
+        "rechnungen_dir": manager.rechnungen_dir,
+        "freitext": auftrag.get("freitext") or None,
+        "cii_xml_path": os.path.join(ablage_verzeichnis(manager.rechnungen_dir, datum, anlegen=False), f"CII_{rechnungsnummer.replace(':', '-')}.xml") if cii_xml else None,
+        "zugferd": zugferd,
+        "meldungen_stderr": meldungen_stderr,
+        "inhalt": inhalt,
+        "cache": manager.render_cache if auftrag_schluessel else None,
+        "auftrag": auftrag_schluessel,
+        # Worker messen nur, wenn der Hauptprozess Metriken sammelt
+        "metriken": ist_aktiv(),
+        "protokoll": aktuelle_stufe(),
+    }
+
+def erstelle_einzelrechnung(job):
+    """Erzeugt eine Rechnung im Worker-Prozess und liefert das Ergebnis als Dict.
+
+    Fehler werden nicht weitergereicht, sondern im Ergebnis vermerkt, damit ein
+    fehlerhafter Auftrag nicht den ganzen Lauf abbricht.
+    """
+    ergebnis = {
+        "index": job["index"],
+        "kundennummer": job["kunde_data"].get("Kundennummer", ""),
+        "rechnungsnummer": job["rechnungsnummer"],
+        "erfolg": False,
+        "fehler": None,
+        "dauer_s": 0.0,
+        "pdf": None,
+        "xml": None,
+    }
+
+    start = time.perf_counter()
+    metriken = None
+    if job.get("protokoll"):
+        richte_protokoll_ein(job["protokoll"])
+    # Im Befehl 'run' gehört stdout den Ergebniszeilen, Statusmeldungen nach stderr
+    umleitung = contextlib.redirect_stdout(sys.stderr) if job.get("meldungen_stderr") else contextlib.nullcontext()
+    inhalte = {} if job.get("inhalt") else None
+    try:
+        with umleitung, sammle(job.get("metriken")) as metriken:
+            pfade = erzeuge_rechnungsdateien(
+                rechnungsnummer=job["rechnungsnummer"],
+                kunde_data=job["kunde_data"],
+                unternehmen_data=job["unternehmen_data"],
+                datum=job["datum"],
+                positionen=job["positionen"],
+                rechnungen_dir=job["rechnungen_dir"],
+                freitext=job["freitext"],
+                cii_xml_path=job["cii_xml_path"],
+                zugferd=job["zugferd"],
+                cache=job.get("cache"),
+                inhalte=inhalte
+            )
+        if job.get("auftrag"):
+            job["cache"].merke_nummer(job["auftrag"], job["rechnungsnummer"])
+        ergebnis["erfolg"] = True
+        ergebnis["pdf"] = pfade["pdf"]
+        ergebnis["xml"] = pfade["xml"]
+        if inhalte is not None:
+            for art in ("pdf", "xml"):
+                ergebnis[f"{art}_base64"] = base64.b64encode(inhalte[art]).decode("ascii")
+    except Exception as e:
+        ergebnis["fehler"] = f"{type(e).__name__}: {e}"
+    ergebnis["dauer_s"] = round(time.perf_counter() - start, 6)
+    if metriken:
+        ergebnis["metriken"] = metriken
+
+    return ergebnis
+
+def uebernimm_metriken(ergebnis):
+    """Führt die Messwerte eines Worker-Ergebnisses im Hauptprozess zusammen (und entfernt sie aus dem Ergebnis)"""
+    fuehre_zusammen(ergebnis.pop("metriken", None))
+    zaehle("rechnungen_erstellt" if ergebnis["erfolg"] else "rechnungen_fehlgeschlagen")
+    return ergebnis
+
+def vergebe_nummern(manager, gueltige, daten, cii_xml=False, zugferd=False, vorkommen=None):
+    """Rechnungsnummern der gültigen Aufträge, gibt (rechnungsnummern, auftrag_schluessel, wiederverwendet) zurück.
+
+    Hat ein gleicher Auftrag (gleicher Kunde, gleiches Datum, gleiche
+    Positionen usw.) in einem früheren Lauf schon eine Rechnung erhalten,
+    wird dessen Nummer wiederverwendet; die Rechnung kommt dann aus dem
+    Render-Cache. So erzeugt ein nach einem Absturz wiederholter Lauf keine
+    doppelten Rechnungen. Alle übrigen Nummern werden in einem Schritt
+    reserviert. vorkommen zählt gleiche Aufträge über mehrere Aufrufe
+    hinweg (Blöcke von 'run'). Ohne Render-Cache wird immer neu reserviert.
+    """
+    cache = manager.render_cache
+    if cache is None:
+        return manager.reserviere_rechnungsnummern(daten), [None] * len(daten), [False] * len(daten)
+    if vorkommen is None:
+        vorkommen = {}
+
+    auftrag_schluessel = []
+    for (_, auftrag), datum in zip(gueltige, daten):
+        eingaben = (manager.kunden[auftrag["kundennummer"]], manager.unternehmen_daten, datum,
+                    normalisiere_positionen(auftrag["positionen"]), auftrag.get("freitext") or None, zugferd, cii_xml)
+        schluessel = cache.auftrag_schluessel(*eingaben)
+        anzahl = vorkommen.get(schluessel, 0)
+        vorkommen[schluessel] = anzahl + 1
+        # Das erste Vorkommen behält den Grundschlüssel, jedes weitere gleiche erhält einen eigenen
+        auftrag_schluessel.append(cache.auftrag_schluessel(*eingaben, vorkommen=anzahl) if anzahl else schluessel)
+
+    rechnungsnummern = [cache.fruehere_nummer(schluessel) for schluessel in auftrag_schluessel]
+    wiederverwendet = [nummer is not None for nummer in rechnungsnummern]
+    fehlende = [i for i, nummer in enumerate(rechnungsnummern) if nummer is None]
+    for i, nummer in zip(fehlende, manager.reserviere_rechnungsnummern([daten[i] for i in fehlende])):
+        rechnungsnummern[i] = nummer
+    if any(wiederverwendet):
+        zaehle("nummern_wiederverwendet", sum(wiederverwendet))
+    return rechnungsnummern, auftrag_schluessel, wiederverwendet
+
+def erstelle_rechnungen_batch(manager, auftraege, prozesse=None, cii_xml=False, zugferd=False, executor=None, meldungen_stderr=False, pipeline=False, schreiber=None, puffer=None, vorkommen=None):
+    """Erstellt alle Rechnungsaufträge und gibt pro Auftrag ein Ergebnis-Dict zurück.
+
+    Ungültige Aufträge erhalten keine Rechnungsnummer. Für alle gültigen
+    Aufträge werden die Nummern in einem Schritt reserviert; Aufträge aus
+    einem früheren Lauf behalten ihre Nummer (siehe vergebe_nummern, ihr
+    Ergebnis enthält "wiederverwendet": true). prozesse=1
+    erzeugt die Rechnungen ohne Prozess-Pool im aktuellen Prozess. Mit
+    cii_xml=True wird zusätzlich die CII-XML als CII_<Nummer>.xml abgelegt,
+    mit zugferd=True wird sie in das PDF eingebettet (ZUGFeRD). Ein
+    übergebener executor wird statt eines eigenen Prozess-Pools verwendet
+    (für mehrere Blöcke hintereinander). Mit pipeline=True rendern die
+    Worker nur in den Speicher und schreiber Threads schreiben die Dateien
+    parallel dazu (siehe rechnungstool_pipeline), höchstens puffer fertige
+    Rechnungen warten dabei auf das Schreiben.
+    """
+    ergebnisse = [None] * len(auftraege)
+    gueltige = []
+
+    for index, auftrag in enumerate(auftraege):
+        fehler = pruefe_auftrag(auftrag, manager.kunden)
+        if fehler:
+            zaehle("auftraege_ungueltig")
+            ergebnisse[index] = {
+                "index": index,
+                "kundennummer": auftrag.get("kundennummer", "") if isinstance(auftrag, dict) else "",
+                "rechnungsnummer": None,
+                "erfolg": False,
+                "fehler": fehler,
+                "dauer_s": 0.0,
+                "pdf": None,
+                "xml": None,
+            }
+        else:
+            gueltige.append((index, auftrag))
+
+    heute = datetime.today().strftime("%d.%m.%Y")
+    daten = [auftrag.get("datum") or heute for _, auftrag in gueltige]
+    rechnungsnummern, auftrag_schluessel, wiederverwendet = vergebe_nummern(manager, gueltige, daten, cii_xml, zugferd, vorkommen)
+
+    jobs = [
+        baue_job(manager, index, auftrag, datum, rechnungsnummer, cii_xml, zugferd, meldungen_stderr, auftrag_schluessel=schluessel)
+        for (index, auftrag), datum, rechnungsnummer, schluessel in zip(gueltige, daten, rechnungsnummern, auftrag_schluessel)
+    ]
+
+    if prozesse is None:
+        prozesse = os.cpu_count() or 1
+    prozesse = max(1, min(prozesse, len(jobs) or 1))
+
+    if pipeline and jobs:
+        from rechnungstool_pipeline import verarbeite_jobs, STANDARD_SCHREIBER, STANDARD_PUFFER
+        for ergebnis in verarbeite_jobs(jobs, prozesse, schreiber or STANDARD_SCHREIBER, puffer or STANDARD_PUFFER, executor):
+            ergebnisse[ergebnis["index"]] = uebernimm_metriken(ergebnis)
+    elif executor is not None and jobs:
+        chunksize = max(1, len(jobs) // (prozesse * 4))
+        for ergebnis in executor.map(erstelle_einzelrechnung, jobs, chunksize=chunksize):
+            ergebnisse[ergebnis["index"]] = uebernimm_metriken(ergebnis)
+    elif prozesse == 1:
+        job_ergebnisse = map(erstelle_einzelrechnung, jobs)
+        for ergebnis in job_ergebnisse:
+            ergebnisse[ergebnis["index"]] = uebernimm_metriken(ergebnis)
+    else:
+        # Mehrere Jobs pro Übergabe an den Worker sparen Pickle-/IPC-Aufwand
+        chunksize = max(1, len(jobs) // (prozesse * 4))
+        with ProcessPoolExecutor(max_workers=prozesse) as executor:
+            for ergebnis in executor.map(erstelle_einzelrechnung, jobs, chunksize=chunksize):
+                ergebnisse[ergebnis["index"]] = uebernimm_metriken(ergebnis)
+
+    for (index, _), frueher in zip(gueltige, wiederverwendet):
+        if frueher:
+            ergebnisse[index]["wiederverwendet"] = True
+    return ergebnisse
+
+def fasse_bericht_zusammen(ergebnisse, gesamtdauer):
+    """Erstellt den Ergebnisbericht eines Stapellaufs"""
+    erfolgreich = [e for e in ergebnisse if e["erfolg"]]
+    dauern = sorted(e["dauer_s"] for e in erfolgreich)
+
+    return {
+        "anzahl": len(ergebnisse),
+        "erfolgreich": len(erfolgreich),
+        "fehlgeschlagen": len(ergebnisse) - len(erfolgreich),
+        "gesamtdauer_s": round(gesamtdauer, 3),
+        "dauer_pro_rechnung_s": {
+            "min": dauern[0] if dauern else 0.0,
+            "median": dauern[len(dauern) // 2] if dauern else 0.0,
+            "max": dauern[-1] if dauern else 0.0,
+        },
+        "rechnungen": ergebnisse,
+    }
+
+def lade_auftraege(pfad):
+    """Lädt Rechnungsaufträge aus einer JSON-Datei (Liste oder {"auftraege": [...]})"""
+    with open(pfad, "r", encoding="utf-8") as f:
+        daten = json.load(f)
+    if isinstance(daten, dict):
+        daten = daten.get("auftraege", [])
+    return daten
+
+def fuehre_batch_aus(manager, auftraege_pfad, prozesse=None, bericht_pfad=None, cii_xml=False, zugferd=False, pipeline=False, schreiber=None, puffer=None, metriken=None):
+    """CLI-Befehl 'batch': erstellt alle Aufträge und gibt den Exit-Code zurück.
+
+    Mit metriken wird die Dauer jeder Verarbeitungsstufe gemessen und nach
+    dem Lauf dorthin geschrieben (siehe schreibe_metriken).
+    """
+    if metriken:
+        aktiviere()
+    try:
+        auftraege = lade_auftraege(auftraege_pfad)
+    except (OSError, ValueError) as e:
+        print(f"❌ Auftragsdatei konnte nicht gelesen werden: {e}")
+        return 2
+
+    print(f"🔄 Erstelle {len(auftraege)} Rechnungen...")
+    start = time.perf_counter()
+    ergebnisse = erstelle_rechnungen_batch(manager, auftraege, prozesse, cii_xml, zugferd,
+                                           pipeline=pipeline, schreiber=schreiber, puffer=puffer)
+    bericht = fasse_bericht_zusammen(ergebnisse, time.perf_counter() - start)
+
+    for ergebnis in ergebnisse:
+        if not ergebnis["erfolg"]:
+            print(f"❌ Auftrag {ergebnis['index'] + 1} ({ergebnis['kundennummer']}): {ergebnis['fehler']}")
+
+    print(f"✅ {bericht['erfolgreich']} von {bericht['anzahl']} Rechnungen erstellt in {bericht['gesamtdauer_s']:.2f}s")
+    wiederverwendet = sum(1 for ergebnis in ergebnisse if ergebnis.get("wiederverwendet"))
+    if wiederverwendet:
+        print(f"♻️  {wiederverwendet} davon aus einem früheren Lauf übernommen (gleiche Aufträge behalten ihre Rechnungsnummer)")
+
+    if bericht_pfad:
+        with open(bericht_pfad, "w", encoding="utf-8") as f:
+            json.dump(bericht, f, indent=2, ensure_ascii=False)
+        print(f"📋 Bericht gespeichert: {bericht_pfad}")
+
+    if metriken:
+        schreibe_metriken(metriken)
+        if metriken != "-":
+            print(f"📊 Metriken gespeichert: {metriken}")
+
+    return 0 if bericht["fehlgeschlagen"] == 0 else 1
+
+# Spalten einer Rechnungsposition in CSV-Eingaben; alle übrigen Spalten gehören zum Auftrag
+CSV_POSITIONSSPALTEN = ("bezeichnung", "menge", "einzelpreis", "steuersatz", "steuerkategorie")
+
+def lese_jsonl(datei):
+    """Liefert (zeile, auftrag, fehler) je nichtleerer Zeile einer JSON-Lines-Eingabe"""
+    for zeile, text in enumerate(datei, 1):
+        if not text.strip():
+            continue
+        try:
+            yield zeile, json.loads(text), None
+        except ValueError as e:
+            yield zeile, None, f"Ungültiges JSON: {e}"
+
+def lese_csv(datei):
+    """Liefert (zeile, auftrag, fehler) aus einer CSV-Eingabe mit einer Position pro Zeile.
+
+    Aufeinanderfolgende Zeilen mit gleichem Wert in der Spalte "auftrag"
+    bilden eine Rechnung; ohne diese Spalte ist jede Zeile eine Rechnung.
+    """
+    auftrag = None
+    schluessel = None
+    erste_zeile = None
+    # Zeile 1 ist die Kopfzeile
+    for zeile, row in enumerate(csv.DictReader(datei), 2):
+        row = {name.strip(): (wert or "").strip() for name, wert in row.items() if name}
+        gruppe = row.get("auftrag")
+        if auftrag is not None and (not gruppe or gruppe != schluessel):
+            yield erste_zeile, auftrag, None
+            auftrag = None
+        position = {name: row[name] for name in CSV_POSITIONSSPALTEN if row.get(name)}
+        if auftrag is None:
+            auftrag = {name: wert for name, wert in row.items() if name not in CSV_POSITIONSSPALTEN and name != "auftrag" and wert}
+            auftrag["positionen"] = []
+            schluessel = gruppe
+            erste_zeile = zeile
+        auftrag["positionen"].append(position)
+    if auftrag is not None:
+        yield erste_zeile, auftrag, None
+
+def bloecke(eintraege, groesse):
+    """Fasst einen Strom zu Listen mit höchstens groesse Einträgen zusammen"""
+    block = []
+    for eintrag in eintraege:
+        block.append(eintrag)
+        if len(block) >= groesse:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def fuehre_run_aus(manager, quelle="-", eingabeformat=None, prozesse=None, blockgroesse=100, cii_xml=False, zugferd=False, ausgabe=None, pipeline=False, schreiber=None, puffer=None, metriken=None):
+    """CLI-Befehl 'run': Aufträge aus JSONL/CSV (Datei oder stdin) ohne Rückfragen erstellen.
+
+    Je Rechnung wird sofort eine JSON-Zeile auf stdout geschrieben (zeile,
+    kundennummer, rechnungsnummer, erfolg, fehler, dauer_s, pdf, xml, bei
+    einer Nummer aus einem früheren Lauf zusätzlich wiederverwendet), alle
+    übrigen Meldungen gehen nach stderr. Die Eingabe wird in Blöcken von
+    blockgroesse Aufträgen verarbeitet und nie vollständig geladen.
+    Exit-Code 0 = alles erstellt, 1 = mindestens ein Auftrag fehlgeschlagen,
+    2 = Eingabe nicht lesbar. Mit metriken werden die Stufen-Dauern am Ende
+    dorthin geschrieben ('-' = JSON auf stderr).
+    """
+    ausgabe = ausgabe or sys.stdout
+    if metriken:
+        aktiviere()
+    if eingabeformat is None:
+        eingabeformat = "csv" if quelle.lower().endswith(".csv") else "jsonl"
+
+    try:
+        if quelle == "-":
+            datei = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="") if eingabeformat == "csv" else sys.stdin
+        else:
+            datei = open(quelle, "r", encoding="utf-8", newline="")
+    except OSError as e:
+        print(f"❌ Eingabe konnte nicht gelesen werden: {e}", file=sys.stderr)
+        return 2
+
+    leser = lese_csv(datei) if eingabeformat == "csv" else lese_jsonl(datei)
+    if prozesse is None:
+        prozesse = os.cpu_count() or 1
+    anzahl = erfolgreich = 0
+    # Gleiche Aufträge über alle Blöcke hinweg zählen (siehe vergebe_nummern)
+    vorkommen = {}
+    start = time.perf_counter()
+
+    with contextlib.ExitStack() as stapel:
+        if quelle != "-":
+            stapel.enter_context(datei)
+        # Meldungen des Hauptprozesses (z.B. Logo-Suche) ebenfalls nach stderr
+        stapel.enter_context(contextlib.redirect_stdout(sys.stderr))
+        executor = stapel.enter_context(ProcessPoolExecutor(max_workers=prozesse)) if prozesse > 1 or pipeline else None
+
+        try:
+            for block in bloecke(leser, max(1, blockgroesse)):
+                gueltig = [(zeile, auftrag) for zeile, auftrag, fehler in block if fehler is None]
+                ergebnisse = iter(erstelle_rechnungen_batch(
+                    manager, [auftrag for _, auftrag in gueltig], prozesse, cii_xml, zugferd,
+                    executor=executor, meldungen_stderr=True, pipeline=pipeline, schreiber=schreiber, puffer=puffer,
+                    vorkommen=vorkommen,
+                ))
+                for zeile, auftrag, fehler in block:
+                    if fehler is None:
+                        ergebnis = next(ergebnisse)
+                    else:
+                        ergebnis = {"kundennummer": "", "rechnungsnummer": None, "erfolg": False,
+                                    "fehler": fehler, "dauer_s": 0.0, "pdf": None, "xml": None}
+                    ergebnis.pop("index", None)
+                    ausgabe.write(json.dumps({"zeile": zeile, **ergebnis}, ensure_ascii=False) + "\n")
+                    anzahl += 1
+                    erfolgreich += ergebnis["erfolg"]
+                ausgabe.flush()
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            print(f"❌ Eingabe konnte nicht gelesen werden: {e}")
+            return 2
+
+        print(f"✅ {erfolgreich} von {anzahl} Rechnungen erstellt in {time.perf_counter() - start:.2f}s")
+        if metriken:
+            schreibe_metriken(metriken)
+
+    return 0 if erfolgreich == anzahl else 1
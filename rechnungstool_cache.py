@@ -0,0 +1,232 @@
+"""
+Render-Cache für Rechnungen
+===========================
+
+Der Cache merkt sich jede erzeugte Rechnung unter einem Schlüssel aus den
+normalisierten Eingaben (Rechnungsnummer, Kunde, Unternehmen, Datum,
+Positionen, Freitext, Ausgabeoptionen), der Vorlagenversion und dem Logo.
+Bei gleichem Schlüssel wird nicht neu gerendert:
+
+- liegen die Dateien bereits unverändert in Rechnungen/, passiert nichts,
+- sonst werden sie aus dem Cache per Hardlink (ersatzweise als Kopie)
+  wiederhergestellt.
+
+Die Rechnungsnummer gehört zum Schlüssel, denn sie steht in PDF und XML.
+Damit ein wiederholter Lauf (z.B. nach einem Absturz) trotzdem trifft,
+merkt sich der Cache zusätzlich je Auftrag die vergebene Nummer, unter
+einem Auftragsschlüssel ohne Rechnungsnummer (auftrag_schluessel). batch
+und run schlagen ihn vor dem Reservieren nach und verwenden die frühere
+Nummer wieder; gleiche Aufträge innerhalb eines Laufs werden dabei
+durchgezählt und behalten je eine eigene Rechnung. Der Server und das
+interaktive Menü vergeben für jede Rechnung eine neue Nummer, die nie
+wiederkommt; sie rendern daher ohne Cache.
+python benchmarks/bench_suite.py --nur cache misst Treffer und neue Nummern.
+
+Ablage: Rechnungen/.cache/<ab>/<schlüssel>/{pdf,xml,cii}, die Nummern
+der Aufträge in Rechnungen/.cache/nummern/<ab>/<auftragsschlüssel>. Cache und
+Ausgabe liegen im selben Verzeichnisbaum, damit Hardlinks möglich sind; die
+Dateien belegen den Platz also nur einmal, solange die Rechnung existiert.
+Übersteigt die Gesamtgröße max_bytes, werden die am längsten nicht
+benutzten Einträge gelöscht (LRU über die Änderungszeit der Einträge).
+
+Einstellung in einstellungen.json: {"render_cache_mb": 512}, 0 schaltet
+den Cache (und damit auch die Wiederverwendung der Nummern) ab.
+"""
+
+import os
+import json
+import hashlib
+import contextlib
+
+# Standardgröße des Caches in MB
+STANDARD_CACHE_MB = 512
+
+# Der Cache wird aufgeräumt, sobald seit dem letzten Aufräumen so viel neu abgelegt wurde (Anteil von max_bytes)
+AUFRAEUMEN_ANTEIL = 0.1
+
+# Unterverzeichnis mit den Rechnungsnummern je Auftragsschlüssel (wird beim Aufräumen nicht gelöscht)
+NUMMERN_VERZEICHNIS = "nummern"
+
+# Prozessweit: Cache-Verzeichnis -> seit dem letzten Aufräumen abgelegte Bytes.
+# Nicht im Rendercache selbst, da dieser mit jedem Job an die Worker geht.
+NEU_ABGELEGT = {}
+
+def oeffne_render_cache(rechnungen_dir, cache_mb=STANDARD_CACHE_MB):
+    """Render-Cache in rechnungen_dir/.cache oder None, wenn cache_mb 0 ist"""
+    try:
+        cache_mb = float(cache_mb)
+    except (TypeError, ValueError):
+        cache_mb = STANDARD_CACHE_MB
+    if cache_mb <= 0:
+        return None
+    return Rendercache(os.path.join(rechnungen_dir, ".cache"), int(cache_mb * 1024 * 1024))
+
+def hashe(eingaben):
+    """SHA-256 über die JSON-Darstellung der Eingaben"""
+    # Sortierte Schlüssel: Reihenfolge in den Dicts ändert den Schlüssel nicht
+    text = json.dumps(eingaben, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def verknuepfe(quelle, ziel):
+    """Legt ziel als Hardlink auf quelle an (atomar über einen temporären Namen), sonst als Kopie"""
+    temp_pfad = f"{ziel}.{os.getpid()}.tmp"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(temp_pfad)
+    try:
+        os.link(quelle, temp_pfad)
+    except OSError:
+        # Dateisystem ohne Hardlinks (z.B. FAT, manche Netzlaufwerke)
+        import shutil
+        shutil.copyfile(quelle, temp_pfad)
+    os.replace(temp_pfad, ziel)
+
+class Rendercache:
+    """Inhaltsadressierter Cache fertiger Rechnungsdateien (PDF, XRechnung, CII)"""
+
+    def __init__(self, verzeichnis, max_bytes):
+        self.verzeichnis = verzeichnis
+        self.max_bytes = max_bytes
+
+    def schluessel(self, rechnungsnummer, kunde_data, unternehmen_data, datum, positionen, freitext=None, zugferd=False, cii=False):
+        """Stabiler Schlüssel (SHA-256) über alle Eingaben, die das Ergebnis bestimmen.
+
+        Einschließlich der Rechnungsnummer: Treffer nur bei wiederverwendeter Nummer.
+        """
+        from rechnungstool_backend import vorlagen_kennung
+        return hashe({
+            "vorlage": vorlagen_kennung(),
+            "rechnungsnummer": str(rechnungsnummer),
+            "kunde": kunde_data,
+            "unternehmen": unternehmen_data,
+            "datum": datum,
+            "positionen": positionen,
+            "freitext": freitext or None,
+            "zugferd": bool(zugferd),
+            "cii": bool(cii),
+        })
+
+    def auftrag_schluessel(self, kunde_data, unternehmen_data, datum, positionen, freitext=None, zugferd=False, cii=False, vorkommen=0):
+        """Schlüssel eines Auftrags ohne Rechnungsnummer (und ohne Vorlage, ein neues Layout behält die Nummer).
+
+        vorkommen zählt gleiche Aufträge innerhalb eines Laufs: der zweite
+        gleiche Auftrag ist eine eigene Rechnung und erhält einen eigenen Schlüssel.
+        """
+        return hashe({
+            "kunde": kunde_data,
+            "unternehmen": unternehmen_data,
+            "datum": datum,
+            "positionen": positionen,
+            "freitext": freitext or None,
+            "zugferd": bool(zugferd),
+            "cii": bool(cii),
+            "vorkommen": vorkommen,
+        })
+
+    def nummer_pfad(self, auftrag):
+        return os.path.join(self.verzeichnis, NUMMERN_VERZEICHNIS, auftrag[:2], auftrag)
+
+    def fruehere_nummer(self, auftrag):
+        """Rechnungsnummer, die der Auftrag in einem früheren Lauf erhalten hat, oder None"""
+        try:
+            with open(self.nummer_pfad(auftrag), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def merke_nummer(self, auftrag, rechnungsnummer):
+        """Merkt sich die Nummer eines fertig abgelegten Auftrags (atomar über einen temporären Namen)"""
+        if self.fruehere_nummer(auftrag) == rechnungsnummer:
+            return
+        pfad = self.nummer_pfad(auftrag)
+        temp_pfad = f"{pfad}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(pfad), exist_ok=True)
+            with open(temp_pfad, "w", encoding="utf-8") as f:
+                f.write(rechnungsnummer)
+            os.replace(temp_pfad, pfad)
+        except OSError:
+            # Ohne Eintrag rendert ein wiederholter Lauf neu, die Rechnung selbst ist vollständig
+            with contextlib.suppress(OSError):
+                os.remove(temp_pfad)
+
+    def eintrag_pfad(self, schluessel):
+        return os.path.join(self.verzeichnis, schluessel[:2], schluessel)
+
+    def hole(self, schluessel, ziele):
+        """Stellt die Dateien eines Eintrags unter ziele ({art: pfad}) bereit.
+
+        Gibt False zurück, wenn der Eintrag fehlt oder unvollständig ist.
+        """
+        eintrag = self.eintrag_pfad(schluessel)
+        # Der häufige Fall (neue Rechnung) kostet so nur einen stat-Aufruf
+        if not os.path.isdir(eintrag):
+            return False
+        try:
+            for art, ziel in ziele.items():
+                quelle = os.path.join(eintrag, art)
+                with contextlib.suppress(FileNotFoundError):
+                    if os.path.samefile(quelle, ziel):
+                        continue
+                verknuepfe(quelle, ziel)
+            # Zuletzt benutzt: bestimmt die Reihenfolge beim Aufräumen
+            os.utime(eintrag)
+        except OSError:
+            return False
+        return True
+
+    def lege_ab(self, schluessel, dateien):
+        """Übernimmt erzeugte Dateien ({art: pfad}) als neuen Eintrag"""
+        # shutil erst hier laden: der Cache wird schon beim Programmstart angelegt
+        import shutil
+        eintrag = self.eintrag_pfad(schluessel)
+        if os.path.isdir(eintrag):
+            return
+        temp_eintrag = f"{eintrag}.{os.getpid()}.tmp"
+        groesse = 0
+        try:
+            shutil.rmtree(temp_eintrag, ignore_errors=True)
+            os.makedirs(temp_eintrag)
+            for art, pfad in dateien.items():
+                verknuepfe(pfad, os.path.join(temp_eintrag, art))
+                groesse += os.path.getsize(pfad)
+            # Erst der vollständige Eintrag erhält seinen Namen
+            os.rename(temp_eintrag, eintrag)
+        except OSError:
+            # Z.B. gleichzeitig von einem anderen Prozess abgelegt
+            shutil.rmtree(temp_eintrag, ignore_errors=True)
+            return
+
+        # Beim ersten Ablegen im Prozess und danach in Abständen aufräumen
+        neu = NEU_ABGELEGT.get(self.verzeichnis)
+        if neu is None or neu + groesse > self.max_bytes * AUFRAEUMEN_ANTEIL:
+            self.raeume_auf()
+        else:
+            NEU_ABGELEGT[self.verzeichnis] = neu + groesse
+
+    def eintraege(self):
+        """Liefert (zuletzt_benutzt, bytes, pfad) je vollständigem Eintrag"""
+        with contextlib.suppress(FileNotFoundError):
+            for gruppe in os.scandir(self.verzeichnis):
+                if not gruppe.is_dir() or gruppe.name == NUMMERN_VERZEICHNIS:
+                    continue
+                for eintrag in os.scandir(gruppe.path):
+                    if eintrag.name.endswith(".tmp"):
+                        continue
+                    try:
+                        groesse = sum(datei.stat().st_size for datei in os.scandir(eintrag.path))
+                        yield eintrag.stat().st_mtime, groesse, eintrag.path
+                    except OSError:
+                        continue
+
+    def raeume_auf(self):
+        """Löscht die am längsten nicht benutzten Einträge, bis der Cache höchstens max_bytes groß ist"""
+        import shutil
+        eintraege = sorted(self.eintraege())
+        gesamt = sum(groesse for _, groesse, _ in eintraege)
+        for _, groesse, pfad in eintraege:
+            if gesamt <= self.max_bytes:
+                break
+            shutil.rmtree(pfad, ignore_errors=True)
+            gesamt -= groesse
+        NEU_ABGELEGT[self.verzeichnis] = 0
+        return gesamt
@@ -0,0 +1,340 @@
+"""
+Spaltenexport des Rechnungsjournals
+===================================
+
+Für Umsatzauswertungen über Jahre müssten sonst alle XRechnung-Dateien
+erneut gelesen werden. Der Export schreibt Kopf- und Positionsdaten
+spaltenorientiert in ein Exportverzeichnis (Standard: Journal-Export/):
+
+    rechnungen_<von>-<bis>.parquet   je Rechnung eine Zeile (Beträge in Cent)
+    positionen_<von>-<bis>.parquet   je Rechnungsposition eine Zeile
+
+Format: Parquet oder Arrow IPC (.arrow), wenn pyarrow installiert ist,
+sonst CSV (Semikolon, UTF-8). Alle Teile eines Verzeichnisses haben
+dasselbe Format.
+
+Der Export ist inkrementell: <von>-<bis> sind die Zeilennummern (rowid)
+im Journal, ein weiterer Lauf exportiert nur die seitdem eingetragenen
+Rechnungen als neuen Teil. Das Journal ist nur erweiterbar, neue Einträge
+erhalten immer höhere Zeilennummern. Die Positionen werden dabei einmalig
+aus den XRechnungen der neuen Rechnungen gelesen.
+
+    python rechnungstool_menu.py journal-export
+    python rechnungstool_menu.py journal-umsatz --nach monat
+
+Ein Teil ist erst mit seiner Datei rechnungen_<von>-<bis> vollständig
+(sie wird als letzte geschrieben); verwaiste Positionsteile eines
+abgebrochenen Laufs werden beim nächsten Lauf ersetzt.
+"""
+
+import os
+import re
+import csv
+from datetime import date
+from rechnungstool_journal import verbinde
+from rechnungstool_summen import zu_decimal
+
+# Standardverzeichnis im Datenverzeichnis
+EXPORT_VERZEICHNIS = "Journal-Export"
+
+# So viele Rechnungen höchstens je Teil (begrenzt den Speicherbedarf eines Laufs)
+RECHNUNGEN_JE_TEIL = 50000
+
+# Dateiendung je Format
+FORMATE = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+# Spalten und Typen (für Arrow; in CSV als Text)
+RECHNUNG_SPALTEN = (("rechnungsnummer", "text"), ("kundennummer", "text"), ("kunde", "text"), ("datum", "datum"),
+                    ("netto_cent", "ganzzahl"), ("steuer_cent", "ganzzahl"), ("brutto_cent", "ganzzahl"),
+                    ("positionen", "ganzzahl"))
+POSITION_SPALTEN = (("rechnungsnummer", "text"), ("position", "ganzzahl"), ("datum", "datum"), ("kundennummer", "text"),
+                    ("bezeichnung", "text"), ("menge", "zahl"), ("einheit", "text"), ("einzelpreis", "zahl"),
+                    ("netto_cent", "ganzzahl"), ("steuerkategorie", "text"), ("steuersatz", "zahl"))
+
+# Möglichkeiten für journal-umsatz: Tabelle, Gruppierungsspalte und ggf. Länge des Präfixes (Datum)
+AUSWERTUNGEN = {
+    "jahr": ("rechnungen", "datum", 4),
+    "monat": ("rechnungen", "datum", 7),
+    "kunde": ("rechnungen", "kundennummer", None),
+    "artikel": ("positionen", "bezeichnung", None),
+}
+
+TEIL_MUSTER = re.compile(r"^(rechnungen|positionen)_(\d+)-(\d+)(\.\w+)$")
+
+def lade_pyarrow():
+    """pyarrow oder None (optionale Abhängigkeit)"""
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+def finde_teile(export_dir):
+    """{tabelle: [(von, bis, pfad)]} aller Exportteile, nach Zeilennummer sortiert"""
+    teile = {"rechnungen": [], "positionen": []}
+    if os.path.isdir(export_dir):
+        for name in os.listdir(export_dir):
+            treffer = TEIL_MUSTER.match(name)
+            if treffer:
+                teile[treffer.group(1)].append((int(treffer.group(2)), int(treffer.group(3)), os.path.join(export_dir, name)))
+    for liste in teile.values():
+        liste.sort()
+    return teile
+
+def export_format(export_dir, format=None):
+    """Format des Exportverzeichnisses: vorhandene Teile, sonst format, sonst Parquet (mit pyarrow) oder CSV"""
+    endungen = {os.path.splitext(pfad)[1] for liste in finde_teile(export_dir).values() for _, _, pfad in liste}
+    vorhanden = [name for name, endung in FORMATE.items() if endung in endungen]
+    if len(vorhanden) > 1:
+        raise ValueError(f"Exportverzeichnis enthält mehrere Formate ({', '.join(vorhanden)}): {export_dir}")
+    if vorhanden:
+        if format and format != vorhanden[0]:
+            raise ValueError(f"Exportverzeichnis enthält bereits {vorhanden[0]}-Dateien, neu exportieren mit --neu")
+        format = vorhanden[0]
+    format = format or ("parquet" if lade_pyarrow() else "csv")
+    if format not in FORMATE:
+        raise ValueError(f"Unbekanntes Exportformat: {format}")
+    if format != "csv" and not lade_pyarrow():
+        raise ValueError(f"Format {format} benötigt pyarrow (pip install pyarrow)")
+    return format
+
+def lies_positionen(xml_pfad):
+    """Liest die Positionen (InvoiceLine) einer XRechnung.
+
+    Gibt (xml_pfad, positionen, fehler) zurück; positionen ist eine Liste von
+    Dicts mit position, bezeichnung, menge, einheit, einzelpreis, netto_cent,
+    steuerkategorie und steuersatz.
+    """
+    import xml.etree.ElementTree as ET
+    from rechnungstool_journal import UBL_CAC, UBL_CBC, betrag_cent
+    try:
+        positionen = []
+        for _, element in ET.iterparse(xml_pfad):
+            if element.tag != UBL_CAC + "InvoiceLine":
+                continue
+            menge = element.find(UBL_CBC + "InvoicedQuantity")
+            steuer = element.find(f"{UBL_CAC}Item/{UBL_CAC}ClassifiedTaxCategory")
+            positionen.append({
+                "position": int(element.findtext(UBL_CBC + "ID").strip()),
+                "bezeichnung": (element.findtext(f"{UBL_CAC}Item/{UBL_CBC}Name") or "").strip(),
+                "menge": float(zu_decimal(menge.text.strip())),
+                "einheit": menge.get("unitCode", ""),
+                "einzelpreis": float(zu_decimal(element.findtext(f"{UBL_CAC}Price/{UBL_CBC}PriceAmount").strip())),
+                "netto_cent": betrag_cent(element.find(UBL_CBC + "LineExtensionAmount")),
+                "steuerkategorie": (steuer.findtext(UBL_CBC + "ID") or "").strip(),
+                "steuersatz": float(zu_decimal((steuer.findtext(UBL_CBC + "Percent") or "0").strip())),
+            })
+            element.clear()
+    except (OSError, ET.ParseError, ValueError, ArithmeticError) as e:
+        return xml_pfad, None, f"{type(e).__name__}: {e}"
+    except AttributeError:
+        return xml_pfad, None, "Position ohne Nummer, Menge, Preis oder Steuerkategorie"
+    return xml_pfad, positionen, None
+
+def arrow_tabelle(pyarrow, spalten, zeilen):
+    """Zeilen (Dicts) als pyarrow.Table mit den Typen aus spalten"""
+    typen = {"text": pyarrow.string(), "datum": pyarrow.date32(), "ganzzahl": pyarrow.int64(), "zahl": pyarrow.float64()}
+    daten = {}
+    for name, typ in spalten:
+        werte = [zeile[name] for zeile in zeilen]
+        if typ == "datum":
+            werte = [date.fromisoformat(wert) for wert in werte]
+        daten[name] = pyarrow.array(werte, type=typen[typ])
+    return pyarrow.table(daten)
+
+def schreibe_teil(pfad, format, spalten, zeilen):
+    """Schreibt einen Exportteil atomar (temporäre Datei + os.replace)"""
+    temp_pfad = f"{pfad}.{os.getpid()}.tmp"
+    try:
+        if format == "csv":
+            with open(temp_pfad, "w", encoding="utf-8", newline="") as f:
+                schreiber = csv.writer(f, delimiter=";")
+                schreiber.writerow([name for name, _ in spalten])
+                schreiber.writerows([zeile[name] for name, _ in spalten] for zeile in zeilen)
+        else:
+            pyarrow = lade_pyarrow()
+            tabelle = arrow_tabelle(pyarrow, spalten, zeilen)
+            if format == "parquet":
+                import pyarrow.parquet
+                pyarrow.parquet.write_table(tabelle, temp_pfad, compression="zstd")
+            else:
+                import pyarrow.ipc
+                with pyarrow.ipc.new_file(temp_pfad, tabelle.schema) as schreiber:
+                    schreiber.write_table(tabelle)
+        os.replace(temp_pfad, pfad)
+    except BaseException:
+        if os.path.exists(temp_pfad):
+            os.remove(temp_pfad)
+        raise
+
+def exportiere_journal(rechnungen_dir, export_dir, format=None, neu=False, prozesse=None):
+    """Exportiert alle Rechnungen, die seit dem letzten Export ins Journal kamen.
+
+    Mit neu=True werden vorhandene Teile gelöscht und alles neu exportiert.
+    Gibt (rechnungen, positionen, fehler) zurück; fehler ist eine Liste
+    (rechnungsnummer, meldung) für Rechnungen, deren Positionen nicht
+    gelesen werden konnten (die Kopfdaten werden trotzdem exportiert).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(export_dir, exist_ok=True)
+    if neu:
+        for liste in finde_teile(export_dir).values():
+            for _, _, pfad in liste:
+                os.remove(pfad)
+    format = export_format(export_dir, format)
+    teile = finde_teile(export_dir)
+    stand = teile["rechnungen"][-1][1] if teile["rechnungen"] else 0
+    # Positionsteile ohne Rechnungsteil stammen aus einem abgebrochenen Lauf
+    for von, _, pfad in teile["positionen"]:
+        if von > stand:
+            os.remove(pfad)
+
+    journal = verbinde(rechnungen_dir)
+    anzahl_rechnungen = anzahl_positionen = 0
+    fehler = []
+    if prozesse is None:
+        prozesse = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=prozesse) if prozesse > 1 else None
+    try:
+        while True:
+            # Zeilennummern (rowid) wachsen, da das Journal nur angefügt wird
+            eintraege = journal.execute(
+                "SELECT rowid, rechnungsnummer, kundennummer, kunde, datum, netto_cent, steuer_cent, brutto_cent, xml "
+                "FROM rechnungen WHERE rowid > ? ORDER BY rowid LIMIT ?", (stand, RECHNUNGEN_JE_TEIL)
+            ).fetchall()
+            if not eintraege:
+                break
+            pfade = [os.path.join(rechnungen_dir, eintrag[8]) if eintrag[8] else "" for eintrag in eintraege]
+            if executor is not None:
+                gelesen = executor.map(lies_positionen, pfade, chunksize=max(1, len(pfade) // (prozesse * 4)))
+            else:
+                gelesen = map(lies_positionen, pfade)
+
+            rechnungen, positionen = [], []
+            for eintrag, (_, positionen_rechnung, meldung) in zip(eintraege, gelesen):
+                _, nummer, kundennummer, kunde, datum, netto, steuer, brutto, _ = eintrag
+                if meldung:
+                    fehler.append((nummer, meldung))
+                    positionen_rechnung = []
+                rechnungen.append({"rechnungsnummer": nummer, "kundennummer": kundennummer, "kunde": kunde, "datum": datum,
+                                   "netto_cent": netto, "steuer_cent": steuer, "brutto_cent": brutto,
+                                   "positionen": len(positionen_rechnung)})
+                for position in positionen_rechnung:
+                    position.update(rechnungsnummer=nummer, datum=datum, kundennummer=kundennummer)
+                    positionen.append(position)
+
+            von, bis = eintraege[0][0], eintraege[-1][0]
+            endung = FORMATE[format]
+            schreibe_teil(os.path.join(export_dir, f"positionen_{von:010d}-{bis:010d}{endung}"), format, POSITION_SPALTEN, positionen)
+            # Zuletzt: erst damit gilt der Teil als exportiert
+            schreibe_teil(os.path.join(export_dir, f"rechnungen_{von:010d}-{bis:010d}{endung}"), format, RECHNUNG_SPALTEN, rechnungen)
+            anzahl_rechnungen += len(rechnungen)
+            anzahl_positionen += len(positionen)
+            stand = bis
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return anzahl_rechnungen, anzahl_positionen, fehler
+
+def werte_aus(export_dir, nach="monat"):
+    """Summiert den Export nach jahr, monat, kunde (Rechnungen) oder artikel (Positionen).
+
+    Gibt eine nach Gruppe sortierte Liste von Dicts mit gruppe, anzahl und
+    den Summen in Cent zurück (netto_cent, bei Rechnungen auch steuer_cent
+    und brutto_cent).
+    """
+    if nach not in AUSWERTUNGEN:
+        raise ValueError(f"Unbekannte Auswertung: {nach} (möglich: {', '.join(AUSWERTUNGEN)})")
+    tabelle, spalte, laenge = AUSWERTUNGEN[nach]
+    format = export_format(export_dir)
+    teile = finde_teile(export_dir)
+    # Nur vollständige Teile (siehe exportiere_journal)
+    stand = teile["rechnungen"][-1][1] if teile["rechnungen"] else 0
+    pfade = [pfad for von, _, pfad in teile[tabelle] if von <= stand]
+    betraege = ["netto_cent", "steuer_cent", "brutto_cent"] if tabelle == "rechnungen" else ["netto_cent"]
+
+    if format != "csv":
+        return werte_aus_arrow(pfade, format, spalte, laenge, betraege)
+
+    summen = {}
+    for pfad in pfade:
+        with open(pfad, "r", encoding="utf-8", newline="") as f:
+            leser = csv.reader(f, delimiter=";")
+            kopf = next(leser)
+            # Spaltenpositionen statt DictReader: ein Dict je Zeile kostet bei Millionen Zeilen Sekunden
+            gruppe_spalte = kopf.index(spalte)
+            ersatz_spalte = kopf.index("kunde") if spalte == "kundennummer" else gruppe_spalte
+            betrag_spalten = [kopf.index(name) for name in betraege]
+            for zeile in leser:
+                # Ohne Kundennummer (ältere XRechnungen) nach Firmenname
+                gruppe = zeile[gruppe_spalte][:laenge] or zeile[ersatz_spalte]
+                summe = summen.get(gruppe)
+                if summe is None:
+                    summe = summen[gruppe] = [0] * (len(betraege) + 1)
+                summe[0] += 1
+                for i, position in enumerate(betrag_spalten, 1):
+                    summe[i] += int(zeile[position])
+    return [dict(zip(["gruppe", "anzahl"] + betraege, [gruppe] + summe)) for gruppe, summe in sorted(summen.items())]
+
+def werte_aus_arrow(pfade, format, spalte, laenge, betraege):
+    """werte_aus mit pyarrow: Gruppierung spaltenweise statt Zeile für Zeile"""
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.dataset
+    if not pfade:
+        return []
+    daten = pyarrow.dataset.dataset(pfade, format="ipc" if format == "arrow" else "parquet")
+    gelesen = daten.to_table(columns=[spalte] + betraege + (["kunde"] if spalte == "kundennummer" else []))
+    if laenge:
+        gruppe = pyarrow.compute.strftime(gelesen[spalte], format="%Y" if laenge == 4 else "%Y-%m")
+    elif spalte == "kundennummer":
+        gruppe = pyarrow.compute.if_else(pyarrow.compute.equal(gelesen[spalte], ""), gelesen["kunde"], gelesen[spalte])
+    else:
+        gruppe = gelesen[spalte]
+    gruppiert = pyarrow.table({"gruppe": gruppe, **{name: gelesen[name] for name in betraege}}).group_by("gruppe").aggregate(
+        [("gruppe", "count")] + [(name, "sum") for name in betraege])
+    ergebnis = [{"gruppe": zeile["gruppe"], "anzahl": zeile["gruppe_count"], **{name: zeile[f"{name}_sum"] for name in betraege}}
+                for zeile in gruppiert.to_pylist()]
+    return sorted(ergebnis, key=lambda zeile: zeile["gruppe"])
+
+def fuehre_export_aus(manager, ziel=None, format=None, neu=False, prozesse=None):
+    """CLI-Befehl 'journal-export', gibt den Exit-Code zurück"""
+    export_dir = ziel or os.path.join(manager.base_dir, EXPORT_VERZEICHNIS)
+    try:
+        rechnungen, positionen, fehler = exportiere_journal(manager.rechnungen_dir, export_dir, format, neu, prozesse)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    for nummer, meldung in fehler:
+        print(f"⚠️ {nummer}: Positionen nicht gelesen ({meldung})")
+    print(f"✅ {rechnungen} Rechnungen und {positionen} Positionen exportiert ({export_format(export_dir)}): {export_dir}")
+    return 0
+
+def fuehre_umsatz_aus(manager, nach="monat", quelle=None, als_json=False):
+    """CLI-Befehl 'journal-umsatz': Export aktualisieren und Summen je Gruppe ausgeben"""
+    import json
+    from rechnungstool_backend import formatiere_betrag
+    from rechnungstool_summen import cent_zu_decimal
+
+    export_dir = quelle or os.path.join(manager.base_dir, EXPORT_VERZEICHNIS)
+    try:
+        # Zuerst die neuen Rechnungen nachtragen, dann nur den Export lesen
+        exportiere_journal(manager.rechnungen_dir, export_dir)
+        ergebnis = werte_aus(export_dir, nach)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+
+    if als_json:
+        for zeile in ergebnis:
+            print(json.dumps(zeile, ensure_ascii=False))
+        return 0
+    print(f"{nach.capitalize():<32}{'Anzahl':>10}{'Netto':>18}")
+    print("-" * 60)
+    for zeile in ergebnis:
+        print(f"{str(zeile['gruppe'])[:31]:<32}{zeile['anzahl']:>10}{formatiere_betrag(cent_zu_decimal(zeile['netto_cent'])):>18}")
+    print("-" * 60)
+    print(f"{'Summe':<32}{sum(zeile['anzahl'] for zeile in ergebnis):>10}"
+          f"{formatiere_betrag(cent_zu_decimal(sum(zeile['netto_cent'] for zeile in ergebnis))):>18}")
+    return 0
@@ -0,0 +1,323 @@
+"""
+Rechnungsjournal
+================
+
+Verzeichnis aller ausgestellten Rechnungen in Rechnungen/rechnungsjournal.db
+(SQLite). Jede erzeugte Rechnung wird mit Rechnungsnummer, Kunde, Datum,
+Netto-/Steuer-/Bruttobetrag und den Dateipfaden eingetragen; Abfragen nach
+Kunde, Zeitraum und Betrag laufen über Indizes, statt alle XRechnungen zu
+lesen.
+
+Das Journal ist nur erweiterbar: Einträge werden nie gelöscht, Nummer,
+Kunde, Datum und Beträge nie geändert (per Trigger abgesichert). Nur die
+Dateipfade dürfen sich ändern, z.B. wenn Rechnungen verschoben werden.
+Wird eine Rechnung erneut erzeugt, bleibt der erste Eintrag bestehen.
+
+Für Rechnungen aus der Zeit vor dem Journal (oder nach Verlust der
+Datenbank) liest baue_journal_neu alle XRechnung-Dateien parallel ein:
+
+    python rechnungstool_menu.py journal-neu-aufbauen
+    python rechnungstool_menu.py journal --kunde K001 --von 01.07.2025 --bis 30.09.2025
+
+Beträge werden in ganzen Cent gespeichert, Datumsangaben als JJJJ-MM-TT.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from rechnungstool_summen import runde_cent, zu_decimal
+from rechnungstool_protokoll import log
+
+# Dateiname des Journals in Rechnungen/
+JOURNAL_DATEI = "rechnungsjournal.db"
+
+# Spalten in Speicherreihenfolge
+JOURNAL_SPALTEN = ("rechnungsnummer", "kundennummer", "kunde", "datum", "netto_cent", "steuer_cent", "brutto_cent", "pdf", "xml", "erfasst")
+
+# So lange wartet ein Prozess auf die Schreibsperre eines anderen (Millisekunden)
+SPERR_TIMEOUT_MS = 30000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rechnungen (
+    rechnungsnummer TEXT PRIMARY KEY,
+    kundennummer TEXT NOT NULL DEFAULT '',
+    kunde TEXT NOT NULL DEFAULT '',
+    datum TEXT NOT NULL,
+    netto_cent INTEGER NOT NULL,
+    steuer_cent INTEGER NOT NULL,
+    brutto_cent INTEGER NOT NULL,
+    pdf TEXT,
+    xml TEXT,
+    erfasst TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rechnungen_kunde_datum ON rechnungen (kundennummer, datum);
+CREATE INDEX IF NOT EXISTS rechnungen_datum ON rechnungen (datum);
+CREATE INDEX IF NOT EXISTS rechnungen_brutto ON rechnungen (brutto_cent);
+CREATE TRIGGER IF NOT EXISTS rechnungen_nur_anfuegen_loeschen BEFORE DELETE ON rechnungen
+BEGIN
+    SELECT RAISE(ABORT, 'Rechnungsjournal: Einträge können nicht gelöscht werden');
+END;
+CREATE TRIGGER IF NOT EXISTS rechnungen_nur_anfuegen_aendern
+BEFORE UPDATE OF rechnungsnummer, kundennummer, kunde, datum, netto_cent, steuer_cent, brutto_cent, erfasst ON rechnungen
+BEGIN
+    SELECT RAISE(ABORT, 'Rechnungsjournal: Einträge können nicht geändert werden');
+END;
+"""
+
+# Offene Verbindungen je (Datei, Prozess, Thread); sqlite3-Verbindungen sind nicht threadsicher
+VERBINDUNGEN = {}
+
+def journal_pfad(rechnungen_dir):
+    return os.path.join(rechnungen_dir, JOURNAL_DATEI)
+
+def verbinde(rechnungen_dir):
+    """Verbindung zum Journal (pro Prozess und Thread wiederverwendet), legt es bei Bedarf an"""
+    pfad = journal_pfad(rechnungen_dir)
+    schluessel = (pfad, os.getpid(), threading.get_ident())
+    verbindung = VERBINDUNGEN.get(schluessel)
+    if verbindung is None:
+        verbindung = sqlite3.connect(pfad, timeout=SPERR_TIMEOUT_MS / 1000)
+        verbindung.execute("PRAGMA journal_mode=WAL")
+        # Ohne fsync je Eintrag; nach einem Stromausfall hilft journal-neu-aufbauen
+        verbindung.execute("PRAGMA synchronous=NORMAL")
+        verbindung.executescript(SCHEMA)
+        VERBINDUNGEN[schluessel] = verbindung
+    return verbindung
+
+def iso_datum(datum):
+    """TT.MM.JJJJ oder JJJJ-MM-TT -> JJJJ-MM-TT (ValueError bei anderem Format)"""
+    for format in ("%d.%m.%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(datum, format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"Ungültiges Datum (erwartet TT.MM.JJJJ): {datum}")
+
+def journalzeile(rechnungsnummer, kunde_data, datum, summen, pdf_pfad, xml_pfad, rechnungen_dir):
+    """Journal-Eintrag einer Rechnung als Dict (Pfade relativ zu rechnungen_dir)"""
+    return {
+        "rechnungsnummer": str(rechnungsnummer),
+        "kundennummer": kunde_data.get("Kundennummer") or "",
+        "kunde": kunde_data.get("Firmenname") or "",
+        "datum": iso_datum(datum),
+        "netto_cent": summen.netto_cent,
+        "steuer_cent": summen.steuer_cent,
+        "brutto_cent": summen.brutto_cent,
+        "pdf": os.path.relpath(pdf_pfad, rechnungen_dir) if pdf_pfad else None,
+        "xml": os.path.relpath(xml_pfad, rechnungen_dir) if xml_pfad else None,
+        "erfasst": datetime.now().isoformat(timespec="seconds"),
+    }
+
+def trage_ein(rechnungen_dir, zeilen):
+    """Fügt Einträge an (vorhandene Rechnungsnummern bleiben unverändert), gibt die Anzahl neuer zurück.
+
+    Fehler beim Schreiben werden gemeldet, brechen die Rechnungserstellung
+    aber nicht ab: die Dateien sind dann bereits geschrieben und können mit
+    journal-neu-aufbauen nachgetragen werden.
+    """
+    try:
+        verbindung = verbinde(rechnungen_dir)
+        with verbindung:
+            vorher = verbindung.total_changes
+            verbindung.executemany(
+                f"INSERT OR IGNORE INTO rechnungen VALUES ({', '.join('?' * len(JOURNAL_SPALTEN))})",
+                ([zeile[spalte] for spalte in JOURNAL_SPALTEN] for zeile in zeilen),
+            )
+            return verbindung.total_changes - vorher
+    except sqlite3.Error as e:
+        log.warning(f"⚠️ Rechnungsjournal nicht aktualisiert ({e}), 'journal-neu-aufbauen' trägt fehlende Rechnungen nach")
+        return 0
+
+class Rechnungsjournal:
+    """Abfragen über das Rechnungsjournal"""
+
+    def __init__(self, rechnungen_dir):
+        self.rechnungen_dir = rechnungen_dir
+        self.verbindung = verbinde(rechnungen_dir)
+
+    def filter(self, kundennummer=None, von=None, bis=None, min_cent=None, max_cent=None):
+        """WHERE-Klausel und Parameter; Datumsgrenzen einschließlich, Beträge brutto in Cent"""
+        bedingungen = []
+        parameter = []
+        for bedingung, wert in (("kundennummer = ?", kundennummer), ("datum >= ?", von and iso_datum(von)),
+                                ("datum <= ?", bis and iso_datum(bis)), ("brutto_cent >= ?", min_cent),
+                                ("brutto_cent <= ?", max_cent)):
+            if wert is not None:
+                bedingungen.append(bedingung)
+                parameter.append(wert)
+        return (f"WHERE {' AND '.join(bedingungen)}" if bedingungen else ""), parameter
+
+    def suche(self, kundennummer=None, von=None, bis=None, min_cent=None, max_cent=None, limit=None):
+        """Einträge (Dicts) nach Datum und Rechnungsnummer sortiert"""
+        bedingung, parameter = self.filter(kundennummer, von, bis, min_cent, max_cent)
+        sql = f"SELECT {', '.join(JOURNAL_SPALTEN)} FROM rechnungen {bedingung} ORDER BY datum, rechnungsnummer"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(zip(JOURNAL_SPALTEN, zeile)) for zeile in self.verbindung.execute(sql, parameter)]
+
+    def summe(self, kundennummer=None, von=None, bis=None, min_cent=None, max_cent=None):
+        """Anzahl und Summen (Cent) der passenden Rechnungen"""
+        bedingung, parameter = self.filter(kundennummer, von, bis, min_cent, max_cent)
+        anzahl, netto, steuer, brutto = self.verbindung.execute(
+            f"SELECT COUNT(*), TOTAL(netto_cent), TOTAL(steuer_cent), TOTAL(brutto_cent) FROM rechnungen {bedingung}", parameter
+        ).fetchone()
+        return {"anzahl": anzahl, "netto_cent": int(netto), "steuer_cent": int(steuer), "brutto_cent": int(brutto)}
+
+    def __len__(self):
+        return self.verbindung.execute("SELECT COUNT(*) FROM rechnungen").fetchone()[0]
+
+    def __contains__(self, rechnungsnummer):
+        return self.verbindung.execute("SELECT 1 FROM rechnungen WHERE rechnungsnummer = ?", (rechnungsnummer,)).fetchone() is not None
+
+# Namensräume der XRechnung (UBL)
+UBL_CBC = "{urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2}"
+UBL_CAC = "{urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2}"
+
+def betrag_cent(element):
+    return int(runde_cent(zu_decimal(element.text.strip())) * 100)
+
+def lies_xrechnung(xml_pfad):
+    """Liest die Kopfdaten einer XRechnung (UBL) für das Journal, ohne die Positionen zu parsen.
+
+    Gibt (xml_pfad, daten, fehler) zurück; daten enthält rechnungsnummer,
+    datum, kundennummer (falls in der XML), kunde und die Beträge in Cent.
+    """
+    import re
+    import xml.etree.ElementTree as ET
+    try:
+        with open(xml_pfad, "rb") as f:
+            inhalt = f.read()
+        # Die Kopfdaten stehen vollständig vor der ersten Position: nur diesen Teil parsen
+        ende = inhalt.find(b"<cac:InvoiceLine")
+        if ende >= 0:
+            wurzel = re.search(rb"<([A-Za-z][\w.:-]*)", inhalt).group(1)
+            inhalt = inhalt[:ende] + b"</" + wurzel + b">"
+        rechnung = ET.fromstring(inhalt)
+        kunde = rechnung.find(UBL_CAC + "AccountingCustomerParty/" + UBL_CAC + "Party")
+        daten = {
+            "rechnungsnummer": rechnung.findtext(UBL_CBC + "ID").strip(),
+            "datum": rechnung.findtext(UBL_CBC + "IssueDate").strip(),
+            "kundennummer": (kunde.findtext(f"{UBL_CAC}PartyIdentification/{UBL_CBC}ID") or "").strip(),
+            "kunde": (kunde.findtext(f"{UBL_CAC}PartyName/{UBL_CBC}Name") or "").strip(),
+            "steuer_cent": betrag_cent(rechnung.find(f"{UBL_CAC}TaxTotal/{UBL_CBC}TaxAmount")),
+            "netto_cent": betrag_cent(rechnung.find(f"{UBL_CAC}LegalMonetaryTotal/{UBL_CBC}TaxExclusiveAmount")),
+            "brutto_cent": betrag_cent(rechnung.find(f"{UBL_CAC}LegalMonetaryTotal/{UBL_CBC}TaxInclusiveAmount")),
+        }
+    except (OSError, ET.ParseError, ValueError, ArithmeticError) as e:
+        return xml_pfad, None, f"{type(e).__name__}: {e}"
+    except AttributeError:
+        # find/findtext lieferte None: Pflichtelement fehlt
+        return xml_pfad, None, "Keine XRechnung (Rechnungsnummer, Datum, Kunde oder Beträge fehlen)"
+    return xml_pfad, daten, None
+
+def finde_xrechnungen(rechnungen_dir):
+    """Alle XRechnung_*.xml unterhalb von rechnungen_dir (ohne Render-Cache)"""
+    for verzeichnis, unterverzeichnisse, dateien in os.walk(rechnungen_dir):
+        unterverzeichnisse[:] = sorted(name for name in unterverzeichnisse if not name.startswith("."))
+        for name in sorted(dateien):
+            if name.startswith("XRechnung_") and name.endswith(".xml"):
+                yield os.path.join(verzeichnis, name)
+
+def baue_journal_neu(rechnungen_dir, kunden=None, prozesse=None):
+    """Trägt alle XRechnungen unter rechnungen_dir nach, die noch nicht im Journal stehen.
+
+    Die Dateien werden parallel in einem Prozess-Pool gelesen. Ohne
+    Kundennummer in der XML (Rechnungen älterer Versionen) wird der Kunde
+    über den Firmennamen zugeordnet, sofern dieser eindeutig ist. Gibt
+    (neu, gelesen, fehler) zurück; fehler ist eine Liste (pfad, meldung).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    journal = Rechnungsjournal(rechnungen_dir)
+    pfade = [pfad for pfad in finde_xrechnungen(rechnungen_dir)
+             if os.path.basename(pfad)[len("XRechnung_"):-len(".xml")] not in journal]
+
+    nummern_je_name = {}
+    for nummer, kunde in (kunden.items() if kunden is not None else ()):
+        nummern_je_name.setdefault(kunde.get("Firmenname") or "", set()).add(nummer)
+
+    if prozesse is None:
+        prozesse = os.cpu_count() or 1
+    prozesse = max(1, min(prozesse, len(pfade) or 1))
+    if prozesse == 1:
+        ergebnisse = map(lies_xrechnung, pfade)
+    else:
+        executor = ProcessPoolExecutor(max_workers=prozesse)
+        ergebnisse = executor.map(lies_xrechnung, pfade, chunksize=max(1, len(pfade) // (prozesse * 4)))
+
+    zeilen, fehler = [], []
+    erfasst = datetime.now().isoformat(timespec="seconds")
+    try:
+        for xml_pfad, daten, meldung in ergebnisse:
+            if meldung:
+                fehler.append((xml_pfad, meldung))
+                continue
+            kundennummer = daten["kundennummer"]
+            if not kundennummer:
+                kandidaten = nummern_je_name.get(daten.get("kunde", ""), ())
+                kundennummer = next(iter(kandidaten)) if len(kandidaten) == 1 else ""
+            datei_nummer = os.path.basename(xml_pfad)[len("XRechnung_"):-len(".xml")]
+            pdf_pfad = os.path.join(os.path.dirname(xml_pfad), f"Rechnung_{datei_nummer}.pdf")
+            zeilen.append({
+                "rechnungsnummer": daten["rechnungsnummer"],
+                "kundennummer": kundennummer,
+                "kunde": daten.get("kunde", ""),
+                "datum": daten["datum"],
+                "netto_cent": daten["netto_cent"],
+                "steuer_cent": daten["steuer_cent"],
+                "brutto_cent": daten["brutto_cent"],
+                "pdf": os.path.relpath(pdf_pfad, rechnungen_dir) if os.path.exists(pdf_pfad) else None,
+                "xml": os.path.relpath(xml_pfad, rechnungen_dir),
+                "erfasst": erfasst,
+            })
+    finally:
+        if prozesse > 1:
+            executor.shutdown()
+
+    return trage_ein(rechnungen_dir, zeilen), len(pfade), fehler
+
+def euro_zu_cent(betrag):
+    """'1.234,56', '1234.56' oder 1234.56 -> 123456"""
+    text = str(betrag).strip()
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    return int(runde_cent(zu_decimal(text)) * 100)
+
+def fuehre_journal_aus(manager, kundennummer=None, von=None, bis=None, min_betrag=None, max_betrag=None, limit=None, als_json=False):
+    """CLI-Befehl 'journal': passende Rechnungen und ihre Summe ausgeben, gibt den Exit-Code zurück"""
+    from rechnungstool_backend import formatiere_betrag
+    from rechnungstool_summen import cent_zu_decimal
+
+    try:
+        grenzen = dict(kundennummer=kundennummer, von=von, bis=bis,
+                       min_cent=euro_zu_cent(min_betrag) if min_betrag is not None else None,
+                       max_cent=euro_zu_cent(max_betrag) if max_betrag is not None else None)
+        journal = Rechnungsjournal(manager.rechnungen_dir)
+        eintraege = journal.suche(limit=limit, **grenzen)
+        summe = journal.summe(**grenzen)
+    except (ValueError, ArithmeticError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if als_json:
+        for eintrag in eintraege:
+            print(json.dumps(eintrag, ensure_ascii=False))
+        return 0
+
+    print(f"{'Rechnung':<18}{'Datum':<12}{'Kunde':<30}{'Netto':>14}{'Brutto':>14}")
+    print("-" * 88)
+    for eintrag in eintraege:
+        kunde = f"{eintrag['kundennummer']} {eintrag['kunde']}".strip()
+        print(f"{eintrag['rechnungsnummer']:<18}{datetime.strptime(eintrag['datum'], '%Y-%m-%d').strftime('%d.%m.%Y'):<12}"
+              f"{kunde[:29]:<30}{formatiere_betrag(cent_zu_decimal(eintrag['netto_cent'])):>14}"
+              f"{formatiere_betrag(cent_zu_decimal(eintrag['brutto_cent'])):>14}")
+    print("-" * 88)
+    print(f"{summe['anzahl']} Rechnungen, netto {formatiere_betrag(cent_zu_decimal(summe['netto_cent']))}, "
+          f"USt {formatiere_betrag(cent_zu_decimal(summe['steuer_cent']))}, "
+          f"brutto {formatiere_betrag(cent_zu_decimal(summe['brutto_cent']))}")
+    if limit and summe["anzahl"] > len(eintraege):
+        print(f"ℹ️ Nur die ersten {len(eintraege)} Rechnungen angezeigt (--limit)")
+    return 0
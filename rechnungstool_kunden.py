@@ -0,0 +1,533 @@
+"""
+Kundenspeicher
+==============
+
+Stellt die Kundendaten als Mapping Kundennummer -> Kunden-Dict bereit, so
+dass RechnungsManager.kunden wie bisher ein Dict verwendet werden kann.
+
+- CSVKundenspeicher: kunden.csv (Standard). Die Datei wird per mmap
+  eingeblendet, ein Index neben der Datei (kunden.csv.index) verweist je
+  Kundennummer auf ihre Zeile. Eine Zeile wird erst beim Zugriff gelesen,
+  Startzeit und Speicherbedarf hängen daher kaum von der Kundenzahl ab.
+  Neue Kunden werden nur angehängt statt die ganze Datei neu zu schreiben.
+- SQLiteKundenspeicher: kunden.db mit Indizes auf Kundennummer,
+  Firmenname, PLZ und Ort. Beim Start wird nichts geladen, jeder Zugriff ist
+  eine indizierte Abfrage. Existiert noch keine Datenbank, wird kunden.csv
+  einmalig importiert.
+
+Welcher Speicher verwendet wird, steht in einstellungen.json:
+
+    {"kunden_speicher": "sqlite"}
+
+CSV bleibt als Austauschformat erhalten (exportiere_kunden_csv).
+"""
+
+import os
+import sys
+import csv
+import json
+import mmap
+import codecs
+import struct
+import hashlib
+import sqlite3
+import tempfile
+import itertools
+import threading
+from array import array
+from collections.abc import Mapping
+
+# Spalten von kunden.csv in der gespeicherten Reihenfolge
+KUNDEN_FELDER = ['Kundennummer', 'Firmenname', 'Ansprechpartner', 'Straße', 'Hausnummer', 'PLZ', 'Ort', 'Land', 'Telefon', 'Email', 'Bemerkungen']
+
+# Indizierte Spalten der SQLite-Datenbank (Kundennummer ist Primärschlüssel)
+KUNDEN_INDIZES = ['Firmenname', 'PLZ', 'Ort']
+
+# Index von kunden.csv: Dateiname = kunden.csv + INDEX_ENDUNG
+INDEX_ENDUNG = ".index"
+# Kennung (mit Bytereihenfolge der Zahlenfelder), Änderungszeit und Größe von kunden.csv,
+# Anzahl Kundennummern, Länge aller Kundennummern, Prüfsumme des Dateiendes
+INDEX_KENNUNG = b"KIDX1" + sys.byteorder[0].upper().encode() + b"\0\0"
+INDEX_KOPF = struct.Struct("<8sQQQQ32s")
+# Prüfsumme über die letzten PRUEF_BYTES von kunden.csv (erkennt angehängte Zeilen)
+PRUEF_BYTES = 4096
+# Höchstens so viele angehängte Zeilen werden beim Öffnen gelesen, sonst wird neu indiziert
+NACHTRAG_MAX = 10000
+# Zeilen, die beim Durchlaufen aller Kunden gemeinsam zerlegt werden
+DURCHLAUF_BLOCK = 1000
+
+def dateiende_pruefsumme(daten, groesse):
+    """Prüfsumme der letzten PRUEF_BYTES vor Byte groesse"""
+    return hashlib.blake2b(daten[max(0, groesse - PRUEF_BYTES):groesse], digest_size=32).digest()
+
+def schreibe_atomar(pfad, inhalt):
+    """Schreibt Bytes über eine temporäre Datei, Leser sehen nie eine halbe Datei"""
+    fd, temp_pfad = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(pfad)))
+    try:
+        # mkstemp legt die Datei mit 0600 an: Rechte wie bei einer normal angelegten Datei
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_pfad, 0o666 & ~umask)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(inhalt)
+        os.replace(temp_pfad, pfad)
+    except BaseException:
+        try:
+            os.remove(temp_pfad)
+        except OSError:
+            pass
+        raise
+
+def datensatz_ab(daten, start):
+    """Bytes des CSV-Datensatzes ab Byte start.
+
+    Ein Datensatz endet am Zeilenumbruch, außer dieser steht in
+    Anführungszeichen (ungerade Anzahl '"' bis dahin).
+    """
+    groesse = len(daten)
+    ende = daten.find(b"\n", start) + 1 or groesse
+    datensatz = daten[start:ende]
+    while datensatz.count(b'"') % 2 and ende < groesse:
+        weiter = daten.find(b"\n", ende) + 1 or groesse
+        datensatz += daten[ende:weiter]
+        ende = weiter
+    return datensatz
+
+def datensaetze(daten, start=0):
+    """Liefert (Anfang, Bytes) jedes CSV-Datensatzes ab Byte start"""
+    while start < len(daten):
+        datensatz = datensatz_ab(daten, start)
+        yield start, datensatz
+        start += len(datensatz)
+
+def pruefe_utf8(daten, block=1 << 20):
+    """Löst UnicodeDecodeError aus, wenn daten kein gültiges UTF-8 sind (blockweise, ohne alles zu kopieren)"""
+    dekodierer = codecs.getincrementaldecoder('utf-8')()
+    for start in range(0, len(daten), block):
+        dekodierer.decode(daten[start:start + block])
+    dekodierer.decode(b"", final=True)
+
+def zerlege_datensatz(datensatz):
+    """Werte eines CSV-Datensatzes (Bytes) als Liste, leere Zeile = []"""
+    return next(csv.reader([datensatz.decode('utf-8')]), [])
+
+class CSVKundenspeicher(Mapping):
+    """Kunden aus kunden.csv, eine Zeile wird erst beim Zugriff gelesen; neue Kunden werden an die Datei angehängt.
+
+    kunden.csv wird per mmap eingeblendet. Der Index (kunden.csv.index)
+    enthält je Kundennummer die Position ihrer Zeile: sortierte
+    Kundennummern für die binäre Suche, die Zeilenanfänge und die
+    Reihenfolge in der Datei. Auch er wird eingeblendet, beim Start wird
+    also nichts gelesen als Kopfzeile und Indexkopf.
+
+    Der Index gilt, solange Größe und Änderungszeit von kunden.csv
+    übereinstimmen. Wurden nur Zeilen angehängt (das Dateiende vor dem
+    Anhängen ist unverändert), werden diese beim Öffnen gelesen; ab
+    NACHTRAG_MAX angehängten Zeilen und bei jeder anderen Änderung wird
+    der Index neu aufgebaut.
+    """
+
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self.index_pfad = pfad + INDEX_ENDUNG
+        self.leere()
+        self.oeffne()
+
+    def oeffne(self):
+        """Blendet kunden.csv (erneut) ein und lädt den Index (oder baut ihn neu auf)"""
+        self.schliesse()
+        try:
+            self.lies_datei()
+        except (csv.Error, UnicodeDecodeError):
+            # Unlesbare Datei (z.B. nicht UTF-8): wie bisher ohne Kunden weiterarbeiten
+            self.schliesse()
+            self.leere()
+
+    def schliesse(self):
+        """Gibt die Einblendungen von kunden.csv und Index frei"""
+        self.gib_index_frei()
+        if isinstance(self.daten, mmap.mmap):
+            self.daten.close()
+        self.daten = b""
+
+    def gib_index_frei(self):
+        for ansicht in (self.zeilen, self.schluessel_start, self.reihenfolge, self.schluessel):
+            if isinstance(ansicht, memoryview):
+                ansicht.release()
+        self.zeilen = self.schluessel_start = self.reihenfolge = ()
+        self.schluessel = b""
+        if isinstance(self.index, mmap.mmap):
+            try:
+                self.index.close()
+            except BufferError:
+                # Ein laufender Durchlauf (durchlaufe) hält noch eine Ansicht; freigegeben wird nach dessen Ende
+                pass
+        self.index = None
+        self.anzahl = 0
+
+    def leere(self):
+        """Zustand ohne Kunden (fehlende, leere oder unlesbare Datei)"""
+        self.felder = list(KUNDEN_FELDER)
+        self.daten = b""
+        self.index = None
+        self.anzahl = 0
+        self.zeilen = self.schluessel_start = self.reihenfolge = ()
+        self.schluessel = b""
+        # Angehängte, noch nicht indizierte Kunden: Kundennummer -> Kunde
+        self.nachtrag = {}
+        self.nachtrag_neu = []
+
+    def lies_datei(self):
+        """Kopfzeile lesen, Index einblenden und angehängte Zeilen als Nachtrag lesen"""
+        self.leere()
+        try:
+            with open(self.pfad, 'rb') as f:
+                mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+                self.daten = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Fehlende oder leere Datei (eine leere Datei lässt sich nicht einblenden)
+            return
+
+        kopf = next(datensaetze(self.daten), None)
+        werte = zerlege_datensatz(kopf[1]) if kopf else []
+        if werte:
+            # Zusätzliche Spalten (z.B. USt-IdNr) der Datei beibehalten
+            self.felder = werte
+        if 'Kundennummer' not in self.felder:
+            return
+        spalte = self.felder.index('Kundennummer')
+        kopfende = len(kopf[1]) if kopf else 0
+
+        indiziert = self.lade_index(mtime_ns)
+        if indiziert is None:
+            self.baue_index(spalte, kopfende, mtime_ns)
+            return
+        for anfang, schluessel in self.kundennummern(spalte, indiziert):
+            self.nachtrag[schluessel.decode('utf-8')] = self.kunde_bei(anfang)
+            if len(self.nachtrag) > NACHTRAG_MAX:
+                self.baue_index(spalte, kopfende, mtime_ns)
+                return
+        self.nachtrag_neu = [nummer for nummer in self.nachtrag if self.position(nummer) is None]
+
+    def kundennummern(self, spalte, start):
+        """(Anfang, Kundennummer als Bytes) jeder Zeile ab Byte start"""
+        for anfang, datensatz in datensaetze(self.daten, start):
+            if spalte == 0 and not datensatz.startswith(b'"'):
+                # Häufigster Fall ohne CSV-Zerlegung: Kundennummer bis zum ersten Komma
+                trenner = datensatz.find(b",")
+                schluessel = datensatz[:trenner] if trenner >= 0 else datensatz.rstrip(b"\r\n")
+                if schluessel or trenner >= 0:
+                    yield anfang, schluessel
+                continue
+            werte = zerlege_datensatz(datensatz)
+            if len(werte) > spalte:
+                yield anfang, werte[spalte].encode('utf-8')
+
+    def lade_index(self, mtime_ns):
+        """Blendet einen passenden Index ein, gibt die indizierte Dateigröße zurück (None = neu aufbauen)"""
+        try:
+            with open(self.index_pfad, 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(index) < INDEX_KOPF.size:
+            index.close()
+            return None
+        kennung, index_mtime_ns, groesse, anzahl, schluessel_laenge, pruefsumme = INDEX_KOPF.unpack_from(index)
+        gueltig = kennung == INDEX_KENNUNG and len(index) == INDEX_KOPF.size + 16 * anzahl + 4 + schluessel_laenge
+        if gueltig and (index_mtime_ns, groesse) != (mtime_ns, len(self.daten)):
+            # Nur angehängt? Dann ist das bisherige Dateiende unverändert
+            gueltig = groesse < len(self.daten) and pruefsumme == dateiende_pruefsumme(self.daten, groesse)
+        if not gueltig:
+            index.close()
+            return None
+        self.setze_index(index, anzahl)
+        return groesse
+
+    def setze_index(self, index, anzahl):
+        """Zahlenfelder und Kundennummern des Index als Ansichten ohne Kopie"""
+        self.index = index
+        ansicht = memoryview(index)[INDEX_KOPF.size:]
+        self.anzahl = anzahl
+        self.zeilen = ansicht[:8 * anzahl].cast('Q')
+        self.schluessel_start = ansicht[8 * anzahl:12 * anzahl + 4].cast('I')
+        self.reihenfolge = ansicht[12 * anzahl + 4:16 * anzahl + 4].cast('I')
+        self.schluessel = ansicht[16 * anzahl + 4:]
+
+    def baue_index(self, spalte, kopfende, mtime_ns):
+        """Prüft die Kodierung, liest einmal alle Kundennummern und speichert den Index neben kunden.csv"""
+        # Ein eingeblendeter alter Index muss vor dem Ersetzen geschlossen sein (Windows)
+        self.gib_index_frei()
+        self.nachtrag, self.nachtrag_neu = {}, []
+        # Zeilen werden erst beim Zugriff dekodiert: eine Datei, die nicht UTF-8 ist, hier einmal erkennen
+        pruefe_utf8(self.daten)
+        # Doppelte Kundennummer: die letzte Zeile gilt, die Reihenfolge bestimmt die erste (wie bei einem Dict)
+        positionen = dict((schluessel, anfang) for anfang, schluessel in self.kundennummern(spalte, kopfende))
+        in_dateireihenfolge = list(positionen)
+        sortierung = sorted(range(len(in_dateireihenfolge)), key=in_dateireihenfolge.__getitem__)
+        sortiert = [in_dateireihenfolge[i] for i in sortierung]
+        del in_dateireihenfolge
+        zeilen = array('Q', map(positionen.__getitem__, sortiert))
+        schluessel_start = array('I', itertools.accumulate(map(len, sortiert), initial=0))
+        # Umkehrung der Sortierung: i-ter Kunde der Datei -> Stelle im sortierten Index
+        reihenfolge = array('I', bytes(4 * len(sortierung)))
+        for stelle, i in enumerate(sortierung):
+            reihenfolge[i] = stelle
+        del positionen, sortierung
+
+        kopf = INDEX_KOPF.pack(INDEX_KENNUNG, mtime_ns, len(self.daten), len(zeilen), schluessel_start[-1],
+                               dateiende_pruefsumme(self.daten, len(self.daten)))
+        index = b"".join((kopf, zeilen.tobytes(), schluessel_start.tobytes(), reihenfolge.tobytes(), *sortiert))
+        del sortiert
+        try:
+            schreibe_atomar(self.index_pfad, index)
+        except OSError:
+            # Schreibgeschütztes Verzeichnis: Index nur für diese Sitzung
+            pass
+        self.setze_index(index, len(zeilen))
+
+    def schluessel_bei(self, i):
+        """i-te Kundennummer (sortiert) als Bytes"""
+        return bytes(self.schluessel[self.schluessel_start[i]:self.schluessel_start[i + 1]])
+
+    def position(self, kundennummer):
+        """Anfang der Zeile im eingeblendeten kunden.csv (binäre Suche im Index) oder None"""
+        if not isinstance(kundennummer, str):
+            return None
+        gesucht = kundennummer.encode('utf-8')
+        links, rechts = 0, self.anzahl
+        while links < rechts:
+            mitte = (links + rechts) // 2
+            if self.schluessel_bei(mitte) < gesucht:
+                links = mitte + 1
+            else:
+                rechts = mitte
+        if links < self.anzahl and self.schluessel_bei(links) == gesucht:
+            return self.zeilen[links]
+        return None
+
+    def kunde_bei(self, anfang):
+        """Liest die Zeile ab Byte anfang als Kunden-Dict"""
+        return self.als_kunde(zerlege_datensatz(datensatz_ab(self.daten, anfang)))
+
+    def als_kunde(self, werte):
+        """Kunden-Dict aus den Werten einer Zeile (wie csv.DictReader)"""
+        kunde = dict(zip(self.felder, werte))
+        if len(werte) < len(self.felder):
+            kunde.update(dict.fromkeys(self.felder[len(werte):]))
+        elif len(werte) > len(self.felder):
+            kunde[None] = werte[len(self.felder):]
+        return kunde
+
+    def __getitem__(self, kundennummer):
+        if kundennummer in self.nachtrag:
+            return self.nachtrag[kundennummer]
+        anfang = self.position(kundennummer)
+        if anfang is None:
+            raise KeyError(kundennummer)
+        return self.kunde_bei(anfang)
+
+    def __contains__(self, kundennummer):
+        return kundennummer in self.nachtrag or self.position(kundennummer) is not None
+
+    def __iter__(self):
+        for i in self.reihenfolge:
+            yield self.schluessel_bei(i).decode('utf-8')
+        yield from self.nachtrag_neu
+
+    def __len__(self):
+        return self.anzahl + len(self.nachtrag_neu)
+
+    def items(self):
+        # Ein Durchlauf in Dateireihenfolge statt einer Suche pro Kunde
+        return ((kunde['Kundennummer'], kunde) for kunde in self.durchlaufe())
+
+    def values(self):
+        return self.durchlaufe()
+
+    def hinzufuegen(self, kunde_data):
+        """Hängt einen Kunden als neue Zeile an kunden.csv an"""
+        self.hinzufuegen_viele([kunde_data])
+
+    def hinzufuegen_viele(self, kunden):
+        """Hängt Kunden (auch aus einem Generator) mit einmaligem Öffnen an kunden.csv an, gibt die Anzahl zurück"""
+        neu, zeilenende = True, True
+        try:
+            # Letztes Byte binär lesen: im Textmodus kann es mitten in einem UTF-8-Zeichen liegen
+            with open(self.pfad, 'rb') as f:
+                if f.seek(0, os.SEEK_END):
+                    neu = False
+                    f.seek(-1, os.SEEK_END)
+                    zeilenende = f.read(1) in (b'\n', b'\r')
+        except FileNotFoundError:
+            pass
+        anzahl = 0
+        try:
+            with open(self.pfad, 'a', newline='', encoding='utf-8') as f:
+                if not zeilenende:
+                    # Fehlenden Zeilenumbruch am Dateiende ergänzen
+                    f.write('\n')
+                writer = csv.DictWriter(f, fieldnames=self.felder, extrasaction='ignore')
+                if neu:
+                    writer.writeheader()
+                for kunde_data in kunden:
+                    writer.writerow(kunde_data)
+                    anzahl += 1
+        finally:
+            # Die neuen Zeilen werden beim erneuten Einblenden als Nachtrag gelesen, auch nach einem Fehler
+            self.oeffne()
+        return anzahl
+
+    def durchlaufe(self):
+        """Alle Kunden nacheinander in Dateireihenfolge, ohne sie gemeinsam zu laden"""
+        for block in range(0, self.anzahl, DURCHLAUF_BLOCK):
+            stellen = self.reihenfolge[block:block + DURCHLAUF_BLOCK]
+            # Ein csv.reader je Block statt je Zeile
+            texte = [datensatz_ab(self.daten, self.zeilen[stelle]).decode('utf-8') for stelle in stellen]
+            for stelle, werte in zip(stellen, csv.reader(texte)):
+                if self.nachtrag:
+                    kundennummer = self.schluessel_bei(stelle).decode('utf-8')
+                    if kundennummer in self.nachtrag:
+                        yield self.nachtrag[kundennummer]
+                        continue
+                yield self.als_kunde(werte)
+        for kundennummer in self.nachtrag_neu:
+            yield self.nachtrag[kundennummer]
+
+class SQLiteKundenspeicher(Mapping):
+    """Kunden in einer SQLite-Datenbank mit indizierten Abfragen
+
+    Jeder Thread erhält eine eigene Verbindung (z.B. die Anfrage-Threads des
+    Rechnungsservers), sqlite3-Verbindungen gehören ihrem Thread.
+    """
+
+    def __init__(self, pfad, csv_pfad=None):
+        self.pfad = pfad
+        self.lokal = threading.local()
+        neu = not os.path.exists(pfad)
+        spalten = ", ".join(f'"{feld}" TEXT NOT NULL DEFAULT \'\'' for feld in KUNDEN_FELDER[1:])
+        with self.verbindung:
+            self.verbindung.execute(
+                f'CREATE TABLE IF NOT EXISTS kunden ("Kundennummer" TEXT PRIMARY KEY, {spalten}, "Zusatz" TEXT)'
+            )
+            for feld in KUNDEN_INDIZES:
+                self.verbindung.execute(f'CREATE INDEX IF NOT EXISTS "kunden_{feld}" ON kunden ("{feld}")')
+
+        # Einmaliger Import der bisherigen kunden.csv
+        if neu and csv_pfad and os.path.exists(csv_pfad):
+            self.importiere_csv(csv_pfad)
+
+    @property
+    def verbindung(self):
+        """Verbindung des aktuellen Threads (beim ersten Zugriff geöffnet)"""
+        verbindung = getattr(self.lokal, "verbindung", None)
+        if verbindung is None:
+            verbindung = self.lokal.verbindung = sqlite3.connect(self.pfad)
+            verbindung.execute("PRAGMA journal_mode=WAL")
+        return verbindung
+
+    def zeile_zu_kunde(self, zeile):
+        kunde = dict(zip(KUNDEN_FELDER, zeile[:len(KUNDEN_FELDER)]))
+        if zeile[-1]:
+            kunde.update(json.loads(zeile[-1]))
+        return kunde
+
+    def kunde_zu_zeile(self, kunde_data):
+        zusatz = {schluessel: wert for schluessel, wert in kunde_data.items() if schluessel not in KUNDEN_FELDER and wert}
+        return [kunde_data.get(feld) or '' for feld in KUNDEN_FELDER] + [json.dumps(zusatz, ensure_ascii=False) if zusatz else None]
+
+    def abfrage(self, bedingung="", parameter=()):
+        spalten = ", ".join(f'"{feld}"' for feld in KUNDEN_FELDER)
+        return self.verbindung.execute(f'SELECT {spalten}, "Zusatz" FROM kunden {bedingung}', parameter)
+
+    def __getitem__(self, kundennummer):
+        zeile = self.abfrage('WHERE "Kundennummer" = ?', (kundennummer,)).fetchone()
+        if zeile is None:
+            raise KeyError(kundennummer)
+        return self.zeile_zu_kunde(zeile)
+
+    def __contains__(self, kundennummer):
+        return self.verbindung.execute('SELECT 1 FROM kunden WHERE "Kundennummer" = ?', (kundennummer,)).fetchone() is not None
+
+    def __iter__(self):
+        return (zeile[0] for zeile in self.verbindung.execute('SELECT "Kundennummer" FROM kunden ORDER BY rowid'))
+
+    def __len__(self):
+        return self.verbindung.execute('SELECT COUNT(*) FROM kunden').fetchone()[0]
+
+    def items(self):
+        # Eine Abfrage statt einer Abfrage pro Kunde
+        return [(kunde['Kundennummer'], kunde) for kunde in self.values()]
+
+    def values(self):
+        return [self.zeile_zu_kunde(zeile) for zeile in self.abfrage('ORDER BY rowid')]
+
+    def suche(self, feld, wert):
+        """Kunden mit exakt passendem Wert in einer indizierten Spalte (Firmenname, PLZ, Ort)"""
+        if feld not in KUNDEN_INDIZES:
+            raise ValueError(f"Spalte {feld} ist nicht indiziert")
+        return [self.zeile_zu_kunde(zeile) for zeile in self.abfrage(f'WHERE "{feld}" = ? ORDER BY rowid', (wert,))]
+
+    def hinzufuegen(self, kunde_data):
+        """Fügt einen Kunden hinzu (eine INSERT-Anweisung)"""
+        platzhalter = ", ".join("?" * (len(KUNDEN_FELDER) + 1))
+        with self.verbindung:
+            self.verbindung.execute(f'INSERT INTO kunden VALUES ({platzhalter})', self.kunde_zu_zeile(kunde_data))
+
+    def hinzufuegen_viele(self, kunden):
+        """Fügt Kunden (auch aus einem Generator) in einer Transaktion hinzu, gibt die Anzahl zurück"""
+        platzhalter = ", ".join("?" * (len(KUNDEN_FELDER) + 1))
+        with self.verbindung:
+            vorher = self.verbindung.total_changes
+            self.verbindung.executemany(f'INSERT INTO kunden VALUES ({platzhalter})', (self.kunde_zu_zeile(kunde) for kunde in kunden))
+            return self.verbindung.total_changes - vorher
+
+    def durchlaufe(self):
+        """Alle Kunden nacheinander, ohne sie gemeinsam zu laden"""
+        return (self.zeile_zu_kunde(zeile) for zeile in self.abfrage('ORDER BY rowid'))
+
+    def importiere_csv(self, csv_pfad):
+        """Importiert alle Kunden einer CSV-Datei in einer Transaktion, gibt die Anzahl zurück"""
+        with open(csv_pfad, 'r', encoding='utf-8', newline='') as f:
+            zeilen = [self.kunde_zu_zeile(row) for row in csv.DictReader(f) if row.get('Kundennummer')]
+        platzhalter = ", ".join("?" * (len(KUNDEN_FELDER) + 1))
+        with self.verbindung:
+            vorher = self.verbindung.total_changes
+            self.verbindung.executemany(f'INSERT OR IGNORE INTO kunden VALUES ({platzhalter})', zeilen)
+            return self.verbindung.total_changes - vorher
+
+def oeffne_kundenspeicher(base_dir, art="csv"):
+    """Öffnet den Kundenspeicher im Datenverzeichnis ("csv" oder "sqlite")"""
+    csv_pfad = os.path.join(base_dir, "kunden.csv")
+    if art == "sqlite":
+        return SQLiteKundenspeicher(os.path.join(base_dir, "kunden.db"), csv_pfad)
+    if art != "csv":
+        raise ValueError(f"Unbekannter Kundenspeicher: {art} (erlaubt: csv, sqlite)")
+    return CSVKundenspeicher(csv_pfad)
+
+def exportiere_kunden_csv(kunden, pfad):
+    """Schreibt alle Kunden als CSV (atomar über eine temporäre Datei), gibt die Anzahl zurück"""
+    alle = list(kunden.values())
+    felder = list(KUNDEN_FELDER)
+    for kunde in alle:
+        felder.extend(schluessel for schluessel in kunde if schluessel not in felder)
+
+    verzeichnis = os.path.dirname(os.path.abspath(pfad))
+    fd, temp_pfad = tempfile.mkstemp(prefix=".kunden-", suffix=".csv.tmp", dir=verzeichnis)
+    try:
+        # mkstemp legt die Datei mit 0600 an: Rechte wie bei einer normal angelegten Datei
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_pfad, 0o666 & ~umask)
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=felder)
+            writer.writeheader()
+            writer.writerows(alle)
+        os.replace(temp_pfad, pfad)
+    except BaseException:
+        try:
+            os.remove(temp_pfad)
+        except OSError:
+            pass
+        raise
+    return len(alle)
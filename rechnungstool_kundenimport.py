@@ -0,0 +1,386 @@
+"""
+Kunden-Massenimport
+===================
+
+Nimmt viele neue Kunden auf einmal aus CSV, JSON oder vCard auf:
+
+    python rechnungstool_menu.py kunden-aufnehmen neue_kunden.csv
+    python rechnungstool_menu.py kunden-aufnehmen adressbuch.vcf --abgelehnt abgelehnt.jsonl
+
+- Eingabe: CSV (Komma, Semikolon oder Tabulator, Spalten wie kunden.csv,
+  übliche Varianten wie "E-Mail" oder "Strasse" werden erkannt), JSON
+  (Liste von Objekten oder ein Objekt pro Zeile) oder vCard (.vcf).
+- Jeder Datensatz wird geprüft: Firmenname, PLZ passend zum Land (DE 5,
+  AT/CH 4 Ziffern), Land als ISO-Code (Deutschland -> DE), E-Mail-Adresse.
+- Dubletten werden über einen Schlüssel aus normalisiertem Namen, Straße
+  mit Hausnummer und PLZ erkannt ("Müller GmbH, Hauptstraße 5" =
+  "mueller gmbh, Hauptstr. 5"), gegen den Bestand und innerhalb der Datei.
+- Geprüfte Kunden werden zwischengespeichert, bis die Eingabe vollständig
+  gelesen ist. Bricht sie ab (z.B. abgeschnittenes JSON), wird nichts
+  gespeichert und keine Kundennummer verbraucht.
+- Danach werden Kundennummern blockweise reserviert
+  (rechnungstool_kundennummern), gespeichert wird in einem Schreibvorgang
+  (kunden.csv einmal geöffnet bzw. eine SQLite-Transaktion). Die
+  Kundensuche erfährt erst nach erfolgreichem Schreiben von den neuen
+  Kunden.
+
+Die Eingabe wird gestreamt und nie vollständig geladen; Dubletten-Index
+und Zwischenspeicher liegen in temporären SQLite-Datenbanken auf der
+Platte. Auch eine Million Datensätze brauchen so nur wenig Arbeitsspeicher.
+Eine Spalte Kundennummer wird ignoriert, neue Kunden erhalten immer eine
+neue Nummer (zum Übernehmen vorhandener Nummern dient kunden-import).
+"""
+
+import io
+import re
+import csv
+import sys
+import json
+import sqlite3
+import hashlib
+from itertools import chain, islice
+from rechnungstool_kunden import KUNDEN_FELDER
+from rechnungstool_suche import normalisiere
+
+# So viele Kunden erhalten ihre Nummern gemeinsam
+BLOCKGROESSE = 1000
+
+# Abgelehnte Datensätze, die auf der Konsole angezeigt werden (alle stehen in --abgelehnt)
+ANGEZEIGTE_FEHLER = 10
+
+# Größtes JSON-Objekt, bevor die Eingabe als fehlerhaft gilt (Zeichen)
+MAX_JSON_OBJEKT = 1024 * 1024
+
+# Eingabeformat nach Dateiendung
+FORMATE = {".csv": "csv", ".txt": "csv", ".json": "json", ".jsonl": "json", ".ndjson": "json", ".vcf": "vcard", ".vcard": "vcard"}
+
+# Spaltennamen der Eingabe (klein geschrieben) -> Feld in kunden.csv
+FELDNAMEN = {
+    "firmenname": "Firmenname", "firma": "Firmenname", "name": "Firmenname", "unternehmen": "Firmenname",
+    "ansprechpartner": "Ansprechpartner", "kontakt": "Ansprechpartner",
+    "straße": "Straße", "strasse": "Straße", "str": "Straße",
+    "hausnummer": "Hausnummer", "hausnr": "Hausnummer", "nr": "Hausnummer",
+    "plz": "PLZ", "postleitzahl": "PLZ",
+    "ort": "Ort", "stadt": "Ort",
+    "land": "Land", "länderkennung": "Land",
+    "telefon": "Telefon", "tel": "Telefon", "telefonnummer": "Telefon",
+    "email": "Email", "e-mail": "Email", "mail": "Email",
+    "bemerkungen": "Bemerkungen", "bemerkung": "Bemerkungen", "notiz": "Bemerkungen",
+    "ust-idnr": "USt-IdNr", "ustidnr": "USt-IdNr", "ust-id": "USt-IdNr",
+    "kundennummer": "Kundennummer",
+}
+
+# Bereits zugeordnete Spaltennamen der Eingabe (jede Zeile hat dieselben Spalten)
+ZUORDNUNG = {}
+
+# Ausgeschriebene Ländernamen -> ISO 3166-1 alpha-2
+LAENDER = {
+    "deutschland": "DE", "germany": "DE", "österreich": "AT", "oesterreich": "AT", "austria": "AT",
+    "schweiz": "CH", "switzerland": "CH", "frankreich": "FR", "france": "FR", "niederlande": "NL",
+    "netherlands": "NL", "belgien": "BE", "belgium": "BE", "luxemburg": "LU", "luxembourg": "LU",
+    "italien": "IT", "italy": "IT", "spanien": "ES", "spain": "ES", "polen": "PL", "poland": "PL",
+    "dänemark": "DK", "denmark": "DK", "tschechien": "CZ", "czechia": "CZ",
+}
+
+# Postleitzahlen je Land; andere Länder: 2-10 Buchstaben, Ziffern, Leerzeichen oder Bindestriche
+PLZ_MUSTER = {"DE": re.compile(r"\d{5}"), "AT": re.compile(r"\d{4}"), "CH": re.compile(r"\d{4}"), "LU": re.compile(r"\d{4}")}
+PLZ_ALLGEMEIN = re.compile(r"[A-Z0-9][A-Z0-9 -]{1,9}")
+LAND_MUSTER = re.compile(r"[A-Z]{2}")
+EMAIL_MUSTER = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s.]+")
+
+# Straße mit Hausnummer am Ende ("Hauptstr. 5a", "Am Ring 12-14")
+HAUSNUMMER_MUSTER = re.compile(r"(.*?)[\s,]+(\d+\s?[a-zA-Z]?(?:\s?[-/]\s?\d+\s?[a-zA-Z]?)?)")
+
+def bestimme_format(quelle, eingabeformat=None):
+    """Eingabeformat aus der Angabe oder der Dateiendung ("csv", "json" oder "vcard")"""
+    if eingabeformat:
+        return eingabeformat
+    for endung, name in FORMATE.items():
+        if quelle.lower().endswith(endung):
+            return name
+    raise ValueError(f"Eingabeformat von {quelle} unbekannt, bitte --format angeben (csv, json, vcard)")
+
+def lies_csv(datei):
+    """(Datensatz-Nr., Dict) je Zeile; das Trennzeichen wird an der Kopfzeile erkannt"""
+    kopfzeile = datei.readline()
+    try:
+        trennzeichen = csv.Sniffer().sniff(kopfzeile, delimiters=",;\t").delimiter
+    except csv.Error:
+        trennzeichen = ","
+    for nummer, zeile in enumerate(csv.DictReader(chain([kopfzeile], datei), delimiter=trennzeichen), 1):
+        yield nummer, {schluessel: wert for schluessel, wert in zeile.items() if schluessel is not None}
+
+def lies_json(datei):
+    """(Datensatz-Nr., Objekt) aus einer JSON-Liste oder JSON Lines, ohne die Datei ganz zu laden"""
+    decoder = json.JSONDecoder()
+    leerraum = re.compile(r"[\s,\[\]]*")
+    puffer, position, nummer, ende = "", 0, 0, False
+    while True:
+        position = leerraum.match(puffer, position).end()
+        if position < len(puffer):
+            try:
+                objekt, position_neu = decoder.raw_decode(puffer, position)
+            except json.JSONDecodeError:
+                if ende or len(puffer) - position > MAX_JSON_OBJEKT:
+                    raise ValueError(f"Ungültiges JSON nach Datensatz {nummer}")
+            else:
+                # Ein Objekt am Pufferende kann unvollständig sein, wenn danach noch Text folgt
+                if ende or position_neu < len(puffer):
+                    nummer += 1
+                    position = position_neu
+                    yield nummer, objekt
+                    continue
+        elif ende:
+            return
+        teil = datei.read(64 * 1024)
+        ende = not teil
+        puffer, position = puffer[position:] + teil, 0
+
+def entfalte_vcard(datei):
+    """Logische vCard-Zeilen (gefaltete Fortsetzungszeilen zusammengefügt) mit Zeilennummer"""
+    aktuelle, start = None, 0
+    for nummer, zeile in enumerate(datei, 1):
+        zeile = zeile.rstrip("\r\n")
+        if zeile[:1] in (" ", "\t") and aktuelle is not None:
+            aktuelle += zeile[1:]
+            continue
+        if aktuelle is not None:
+            yield start, aktuelle
+        aktuelle, start = zeile, nummer
+    if aktuelle is not None:
+        yield start, aktuelle
+
+def vcard_werte(wert):
+    """Teilt einen strukturierten vCard-Wert an ; und hebt die Maskierung auf"""
+    teile = re.split(r"(?<!\\);", wert)
+    return [teil.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\").strip() for teil in teile]
+
+def lies_vcard(datei):
+    """(Zeilennummer von BEGIN:VCARD, Dict) je vCard"""
+    karte, start = None, 0
+    for nummer, zeile in entfalte_vcard(datei):
+        oben = zeile.upper()
+        if oben == "BEGIN:VCARD":
+            karte, start = {}, nummer
+        elif oben == "END:VCARD" and karte is not None:
+            yield start, vcard_zu_kunde(karte)
+            karte = None
+        elif karte is not None and ":" in zeile:
+            name, wert = zeile.split(":", 1)
+            # Gruppenpräfix (item1.EMAIL) und Parameter (EMAIL;TYPE=work) entfernen
+            name = name.split(";", 1)[0].rsplit(".", 1)[-1].upper()
+            karte.setdefault(name, wert)
+
+def vcard_zu_kunde(karte):
+    """Übersetzt die Eigenschaften einer vCard in die Felder von kunden.csv"""
+    kunde = {}
+    organisation = vcard_werte(karte.get("ORG", ""))[0]
+    name = vcard_werte(karte.get("FN", ""))[0]
+    if not name and karte.get("N"):
+        # N: Nachname;Vorname;weitere Vornamen;Präfix;Suffix
+        teile = vcard_werte(karte["N"]) + [""] * 5
+        name = " ".join(teil for teil in (teile[3], teile[1], teile[2], teile[0], teile[4]) if teil)
+    if organisation:
+        kunde["Firmenname"], kunde["Ansprechpartner"] = organisation, name
+    else:
+        kunde["Firmenname"] = name
+    if karte.get("ADR"):
+        # ADR: Postfach;Adresszusatz;Straße;Ort;Region;PLZ;Land
+        teile = vcard_werte(karte["ADR"]) + [""] * 7
+        kunde["Straße"], kunde["Ort"], kunde["PLZ"], kunde["Land"] = teile[2], teile[3], teile[5], teile[6]
+    for eigenschaft, feld in (("TEL", "Telefon"), ("EMAIL", "Email"), ("NOTE", "Bemerkungen")):
+        if karte.get(eigenschaft):
+            kunde[feld] = vcard_werte(karte[eigenschaft])[0]
+    return kunde
+
+def lies_kunden(datei, eingabeformat):
+    if eingabeformat == "csv":
+        return lies_csv(datei)
+    if eingabeformat == "json":
+        return lies_json(datei)
+    if eingabeformat == "vcard":
+        return lies_vcard(datei)
+    raise ValueError(f"Unbekanntes Eingabeformat: {eingabeformat} (erlaubt: csv, json, vcard)")
+
+def bereinige_kunde(daten):
+    """Gibt (Kunde, Fehler) zurück: Felder zugeordnet und vereinheitlicht, Fehler None oder Meldung"""
+    if not isinstance(daten, dict):
+        return None, "Kein Objekt"
+    kunde = {}
+    for schluessel, wert in daten.items():
+        feld = ZUORDNUNG.get(schluessel)
+        if feld is None:
+            feld = ZUORDNUNG[schluessel] = FELDNAMEN.get(str(schluessel).strip().lower(), str(schluessel).strip())
+        if feld == "Kundennummer" or wert is None:
+            continue
+        kunde[feld] = wert.strip() if isinstance(wert, str) else str(wert)
+
+    if not kunde.get("Firmenname"):
+        return kunde, "Firmenname fehlt"
+    if kunde.get("Straße") and not kunde.get("Hausnummer"):
+        treffer = HAUSNUMMER_MUSTER.fullmatch(kunde["Straße"])
+        if treffer:
+            kunde["Straße"], kunde["Hausnummer"] = treffer.group(1).rstrip(","), treffer.group(2)
+
+    land = kunde.get("Land") or "DE"
+    land = LAENDER.get(land.lower(), land.upper())
+    if not LAND_MUSTER.fullmatch(land):
+        return kunde, f"Ungültiges Land: {kunde['Land']} (ISO-Code wie DE, AT, CH)"
+    kunde["Land"] = land
+
+    plz = kunde.get("PLZ", "").upper()
+    if not plz:
+        return kunde, "PLZ fehlt"
+    muster = PLZ_MUSTER.get(land)
+    if not (muster.fullmatch(plz) if muster else PLZ_ALLGEMEIN.fullmatch(plz)):
+        return kunde, f"Ungültige PLZ für {land}: {plz}"
+    kunde["PLZ"] = plz
+
+    if kunde.get("Email") and not EMAIL_MUSTER.fullmatch(kunde["Email"]):
+        return kunde, f"Ungültige E-Mail-Adresse: {kunde['Email']}"
+
+    for feld in KUNDEN_FELDER[1:]:
+        kunde.setdefault(feld, "")
+    return kunde, None
+
+def dubletten_schluessel(kunde):
+    """Schlüssel aus normalisiertem Namen, Straße mit Hausnummer und PLZ (8 Byte)"""
+    name = normalisiere(kunde.get("Firmenname")).replace(" ", "")
+    strasse = normalisiere(f"{kunde.get('Straße', '')} {kunde.get('Hausnummer', '')}")
+    strasse = re.sub(r"strasse\b|str\b", "str", strasse).replace(" ", "")
+    plz = kunde.get("PLZ", "").replace(" ", "").upper()
+    return hashlib.blake2b(f"{name}|{strasse}|{plz}".encode("utf-8"), digest_size=8).digest()
+
+class DublettenIndex:
+    """Dubletten-Schlüssel in einer temporären SQLite-Datenbank (auf der Platte, nicht im Speicher)"""
+
+    def __init__(self, kunden=()):
+        # Leerer Dateiname: private temporäre Datenbank, die beim Schließen gelöscht wird
+        self.verbindung = sqlite3.connect("")
+        self.verbindung.execute("CREATE TABLE schluessel (wert BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.verbindung.executemany("INSERT OR IGNORE INTO schluessel VALUES (?)",
+                                    ((dubletten_schluessel(kunde),) for kunde in kunden))
+
+    def neu(self, kunde):
+        """Nimmt den Schlüssel des Kunden auf; False, wenn er schon vorhanden war"""
+        return self.verbindung.execute("INSERT OR IGNORE INTO schluessel VALUES (?)", (dubletten_schluessel(kunde),)).rowcount == 1
+
+    def schliessen(self):
+        self.verbindung.close()
+
+class Zwischenspeicher:
+    """Geprüfte Kunden in einer temporären SQLite-Datenbank, bis die Eingabe vollständig gelesen ist"""
+
+    def __init__(self):
+        self.verbindung = sqlite3.connect("")
+        self.verbindung.execute("CREATE TABLE kunden (daten TEXT NOT NULL)")
+
+    def vormerken(self, kunde):
+        self.verbindung.execute("INSERT INTO kunden VALUES (?)", (json.dumps(kunde, ensure_ascii=False),))
+
+    def durchlaufe(self):
+        """Vorgemerkte Kunden in Eingabereihenfolge"""
+        return (json.loads(zeile[0]) for zeile in self.verbindung.execute("SELECT daten FROM kunden ORDER BY rowid"))
+
+    def schliessen(self):
+        self.verbindung.close()
+
+def nummeriere(manager, kunden, neue=None):
+    """Vergibt Kundennummern blockweise (eine Reservierung je Block) und gibt die Kunden weiter.
+
+    neue (Liste) sammelt die nummerierten Kunden, z.B. für die Kundensuche.
+    """
+    kunden = iter(kunden)
+    while True:
+        block = list(islice(kunden, BLOCKGROESSE))
+        if not block:
+            return
+        for kunde, nummer in zip(block, manager.reserviere_kundennummern(len(block))):
+            kunde["Kundennummer"] = nummer
+            if neue is not None:
+                neue.append(kunde)
+            yield kunde
+
+def importiere_kunden(manager, datei, eingabeformat, abgelehnt=None, probelauf=False):
+    """Prüft, entdoppelt und speichert alle Kunden aus datei, gibt einen Bericht zurück.
+
+    abgelehnt wird für jeden abgelehnten Datensatz aufgerufen
+    (Datensatz-Nr., Grund, Daten). Mit probelauf=True wird nur geprüft,
+    ohne Nummern zu vergeben oder zu speichern.
+    """
+    bericht = {"gelesen": 0, "aufgenommen": 0, "ungueltig": 0, "dubletten": 0}
+    index = DublettenIndex(manager.kunden.durchlaufe())
+
+    def gepruefte_kunden():
+        for nummer, daten in lies_kunden(datei, eingabeformat):
+            bericht["gelesen"] += 1
+            kunde, fehler = bereinige_kunde(daten)
+            if fehler is None and not index.neu(kunde):
+                fehler = "Dublette"
+                bericht["dubletten"] += 1
+            elif fehler is not None:
+                bericht["ungueltig"] += 1
+            if fehler is not None:
+                if abgelehnt is not None:
+                    abgelehnt(nummer, fehler, kunde if kunde is not None else daten)
+                continue
+            yield kunde
+
+    vorgemerkt = Zwischenspeicher()
+    try:
+        # Erst die ganze Eingabe lesen: ein Lesefehler speichert nichts und verbraucht keine Nummern
+        for kunde in gepruefte_kunden():
+            if not probelauf:
+                vorgemerkt.vormerken(kunde)
+            bericht["aufgenommen"] += 1
+        if probelauf or not bericht["aufgenommen"]:
+            return bericht
+        # Die Kundensuche hält ohnehin alle Kunden im Speicher, die neuen also auch
+        neue = [] if manager.kunden_index is not None else None
+        bericht["aufgenommen"] = manager.kunden.hinzufuegen_viele(nummeriere(manager, vorgemerkt.durchlaufe(), neue))
+        for kunde in neue or ():
+            manager.kunden_index.hinzufuegen(kunde)
+    finally:
+        vorgemerkt.schliessen()
+        index.schliessen()
+    return bericht
+
+def fuehre_kundenimport_aus(manager, quelle, eingabeformat=None, abgelehnt_pfad=None, probelauf=False):
+    """CLI-Befehl 'kunden-aufnehmen', gibt den Exit-Code zurück (1 = Datensätze abgelehnt, 2 = Eingabe nicht lesbar)"""
+    try:
+        eingabeformat = bestimme_format(quelle, eingabeformat)
+        if quelle == "-":
+            datei = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="" if eingabeformat == "csv" else None)
+        else:
+            datei = open(quelle, "r", encoding="utf-8-sig", newline="" if eingabeformat == "csv" else None)
+    except (OSError, ValueError) as e:
+        print(f"❌ Eingabe konnte nicht gelesen werden: {e}")
+        return 2
+
+    angezeigt = [0]
+    abgelehnt_datei = open(abgelehnt_pfad, "w", encoding="utf-8") if abgelehnt_pfad else None
+
+    def abgelehnt(nummer, grund, daten):
+        if angezeigt[0] < ANGEZEIGTE_FEHLER:
+            print(f"⚠️ Datensatz {nummer}: {grund}")
+        angezeigt[0] += 1
+        if abgelehnt_datei is not None:
+            abgelehnt_datei.write(json.dumps({"datensatz": nummer, "grund": grund, "daten": daten}, ensure_ascii=False) + "\n")
+
+    print("🔄 Prüfe Kunden..." if probelauf else "🔄 Nehme Kunden auf...")
+    try:
+        with datei:
+            bericht = importiere_kunden(manager, datei, eingabeformat, abgelehnt, probelauf)
+    except (OSError, ValueError, csv.Error, UnicodeDecodeError) as e:
+        print(f"❌ Eingabe konnte nicht gelesen werden: {e}")
+        return 2
+    finally:
+        if abgelehnt_datei is not None:
+            abgelehnt_datei.close()
+
+    if angezeigt[0] > ANGEZEIGTE_FEHLER:
+        print(f"⚠️ ... und {angezeigt[0] - ANGEZEIGTE_FEHLER} weitere" + (f" (alle in {abgelehnt_pfad})" if abgelehnt_pfad else " (--abgelehnt DATEI listet alle)"))
+    verb = "würden aufgenommen" if probelauf else "aufgenommen"
+    print(f"✅ {bericht['aufgenommen']} von {bericht['gelesen']} Kunden {verb} "
+          f"({bericht['dubletten']} Dubletten, {bericht['ungueltig']} ungültig)")
+    return 0 if bericht["aufgenommen"] == bericht["gelesen"] else 1
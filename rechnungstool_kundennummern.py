@@ -0,0 +1,95 @@
+"""
+Kundennummern-Vergabe
+=====================
+
+Vergibt undurchsichtige Kundennummern (K + 8 Hexziffern, z.B. K3F9A01C2)
+ohne Kollisionen, auch wenn mehrere Prozesse gleichzeitig Kunden anlegen:
+
+- Ein Zähler in kundennummer.json wird unter einer Dateisperre
+  (kundennummer.json.lock) hochgezählt und atomar gespeichert, wie bei den
+  Rechnungsnummern (rechnungstool_nummern).
+- Der Zählerstand wird mit einer geheimen Permutation (Feistel-Netz über
+  32 Bit, Schlüssel ebenfalls in kundennummer.json) auf die Kundennummer
+  abgebildet. Verschiedene Zählerstände ergeben immer verschiedene Nummern,
+  aufeinanderfolgende Nummern sehen trotzdem zufällig aus und verraten
+  nicht die Anzahl der Kunden.
+- Jede Nummer kostet einige Ganzzahloperationen; für Importe werden
+  beliebig viele Nummern mit einer Sperre reserviert.
+
+Kundennummern aus der Zeit vor dem Zähler (zufällig aus einem Hash
+gebildet) liegen im selben Wertebereich. Trifft die Permutation eine davon,
+wird der Zählerstand übersprungen; dazu wird der Kundenspeicher übergeben.
+"""
+
+import json
+import hashlib
+from rechnungstool_nummern import nummern_sperre, speichere_nummernstand
+
+# Runden des Feistel-Netzes (je Runde eine 16-Bit-Hälfte)
+RUNDEN = 6
+
+# Anzahl möglicher Kundennummern (8 Hexziffern)
+WERTEBEREICH = 1 << 32
+
+def lade_kundennummernstand(pfad):
+    """Zählerstand und Schlüssel; eine fehlende Datei ergibt einen neuen Stand mit zufälligem Schlüssel.
+
+    Eine unlesbare Datei löst einen Fehler aus: mit neuem Schlüssel könnten
+    sich Nummern wiederholen.
+    """
+    try:
+        with open(pfad, "r", encoding="utf-8") as f:
+            stand = json.load(f)
+    except FileNotFoundError:
+        import secrets
+        return {"zaehler": 0, "schluessel": secrets.token_hex(16)}
+    if not isinstance(stand, dict) or not isinstance(stand.get("zaehler"), int) or not stand.get("schluessel"):
+        raise ValueError(f"Ungültiger Kundennummern-Stand in {pfad}")
+    return stand
+
+def rundenschluessel(schluessel):
+    """Leitet die Schlüssel der Feistel-Runden aus dem gespeicherten Schlüssel (Hex) ab"""
+    ableitung = hashlib.blake2b(bytes.fromhex(schluessel), digest_size=4 * RUNDEN, person=b"kundennummer").digest()
+    return tuple(int.from_bytes(ableitung[i:i + 4], "big") for i in range(0, len(ableitung), 4))
+
+def runde(haelfte, schluessel):
+    """Rundenfunktion: mischt eine 16-Bit-Hälfte mit dem Rundenschlüssel"""
+    x = ((haelfte ^ schluessel) * 0x45D9F3B) & 0xFFFFFFFF
+    x ^= x >> 16
+    x = (x * 0x2C1B3C6D) & 0xFFFFFFFF
+    return (x ^ (x >> 16)) & 0xFFFF
+
+def permutiere(wert, schluessel):
+    """Bildet 0 <= wert < 2**32 umkehrbar (also kollisionsfrei) auf 0 .. 2**32-1 ab"""
+    links, rechts = wert >> 16, wert & 0xFFFF
+    for rundenwert in schluessel:
+        links, rechts = rechts, links ^ runde(rechts, rundenwert)
+    return (links << 16) | rechts
+
+def reserviere_kundennummern(pfad, anzahl, belegt=None):
+    """Reserviert anzahl neue Kundennummern in einer Transaktion unter der Dateisperre.
+
+    belegt (z.B. der Kundenspeicher) enthält die vorhandenen Nummern; nur
+    Nummern aus der Zeit vor dem Zähler können darin getroffen werden und
+    werden übersprungen.
+    """
+    if anzahl <= 0:
+        return []
+
+    with nummern_sperre(pfad):
+        stand = lade_kundennummernstand(pfad)
+        schluessel = rundenschluessel(stand["schluessel"])
+        zaehler = stand["zaehler"]
+        kundennummern = []
+        while len(kundennummern) < anzahl:
+            if zaehler >= WERTEBEREICH:
+                raise RuntimeError("Alle Kundennummern sind vergeben")
+            kundennummer = f"K{permutiere(zaehler, schluessel):08X}"
+            zaehler += 1
+            if belegt is not None and kundennummer in belegt:
+                continue
+            kundennummern.append(kundennummer)
+        stand["zaehler"] = zaehler
+        speichere_nummernstand(pfad, stand)
+
+    return kundennummern
@@ -2,19 +2,28 @@ import csv
 import os
 import sys
 import json
-import hashlib
-import random
-import subprocess
-import glob
-import shutil
 import time
 from datetime import datetime
-from rechnungstool_backend import erstelle_rechnung
+from rechnungstool_backend import erstelle_rechnung, rechnungs_pfade
+from rechnungstool_cache import STANDARD_CACHE_MB, oeffne_render_cache
+from rechnungstool_kunden import oeffne_kundenspeicher
+from rechnungstool_suche import Kundensuche
+from rechnungstool_protokoll import richte_protokoll_ein
+from rechnungstool_kundennummern import reserviere_kundennummern
+from rechnungstool_nummern import (lade_nummernstand, naechste_nummer, normalisiere_stand, nummern_sperre,
+                                   reserviere_rechnungsnummern, speichere_nummernstand)
+from rechnungstool_summen import STANDARD_STEUERSATZ, berechne_summen, positions_betrag, pruefe_menge_preis, satz_text, steuer_schluessel
+
+# Kunden pro Seite in Suchergebnissen
+KUNDEN_PRO_SEITE = 10
 
 class RechnungsManager:
-    def __init__(self):
+    def __init__(self, base_dir=None):
         # Pfad zur Executable/zum Skript ermitteln (PyInstaller-kompatibel)
-        if getattr(sys, 'frozen', False):
+        if base_dir:
+            # Explizit angegebenes Datenverzeichnis (z.B. für Stapelläufe)
+            self.base_dir = os.path.abspath(base_dir)
+        elif getattr(sys, 'frozen', False):
             # Läuft als PyInstaller-Executable
             self.base_dir = os.path.dirname(sys.executable)
         else:
@@ -23,11 +32,17 @@ class RechnungsManager:
         
         self.unternehmen_file = os.path.join(self.base_dir, "unternehmen.csv")
         self.kunden_file = os.path.join(self.base_dir, "kunden.csv")
+        self.einstellungen_file = os.path.join(self.base_dir, "einstellungen.json")
         self.rechnungsnummer_file = os.path.join(self.base_dir, "rechnungsnummer.json")
+        self.kundennummer_file = os.path.join(self.base_dir, "kundennummer.json")
         self.rechnungen_dir = os.path.join(self.base_dir, "Rechnungen")
         
+        self.einstellungen = self.lade_einstellungen()
         self.unternehmen_daten = self.lade_unternehmen_daten()
         self.kunden = self.lade_kunden()
+        self.kunden_index = None
+        # Unveränderte Rechnungen nicht erneut rendern (einstellungen.json: "render_cache_mb", 0 = aus)
+        self.render_cache = oeffne_render_cache(self.rechnungen_dir, self.einstellungen.get("render_cache_mb", STANDARD_CACHE_MB))
         
         if not os.path.exists(self.rechnungen_dir):
             os.makedirs(self.rechnungen_dir)
@@ -40,100 +55,73 @@ class RechnungsManager:
         except:
             return {}
     
-    def lade_kunden(self):
-        kunden = {}
+    def lade_einstellungen(self):
+        """Optionale Einstellungen aus einstellungen.json (z.B. {"kunden_speicher": "sqlite"})"""
         try:
-            with open(self.kunden_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    kunden[row['Kundennummer']] = row
-        except:
-            pass
-        return kunden
+            with open(self.einstellungen_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
     
-    def generiere_kundennummer(self, kunde_data):
-        """Generiert eine undurchsichtige Kundennummer basierend auf Kundendaten und Zufallszahl"""
-        # Eindeutiger String aus Kundendaten
-        unique_string = f"{kunde_data['Firmenname']}{kunde_data['Straße']}{kunde_data['PLZ']}{kunde_data['Ort']}"
-        
-        # Aktueller Timestamp für zusätzliche Eindeutigkeit
-        timestamp = str(datetime.now().timestamp())
-        
-        # Zufallszahl für mehr Unvorhersagbarkeit
-        random_part = str(random.randint(1000, 9999))
-        
-        # Hash erstellen
-        hash_input = f"{unique_string}{timestamp}{random_part}"
-        hash_object = hashlib.sha256(hash_input.encode())
-        hash_hex = hash_object.hexdigest()
-        
-        # Nur die ersten 8 Zeichen verwenden und mit K präfixieren
-        neue_nummer = f"K{hash_hex[:8].upper()}"
-        
-        # Sicherstellen, dass die Nummer einzigartig ist
-        while neue_nummer in self.kunden:
-            random_part = str(random.randint(1000, 9999))
-            hash_input = f"{unique_string}{timestamp}{random_part}"
-            hash_object = hashlib.sha256(hash_input.encode())
-            hash_hex = hash_object.hexdigest()
-            neue_nummer = f"K{hash_hex[:8].upper()}"
-        
-        return neue_nummer
+    def lade_kunden(self):
+        """Öffnet den Kundenspeicher (kunden.csv oder kunden.db, siehe einstellungen.json)"""
+        return oeffne_kundenspeicher(self.base_dir, self.einstellungen.get("kunden_speicher", "csv"))
+    
+    def kundensuche(self):
+        """Suchindex über alle Kunden (beim ersten Aufruf einmal aufgebaut)"""
+        if self.kunden_index is None:
+            self.kunden_index = Kundensuche(self.kunden)
+        return self.kunden_index
+    
+    def generiere_kundennummer(self, kunde_data=None):
+        """Vergibt eine neue undurchsichtige Kundennummer (prozesssicher, siehe rechnungstool_kundennummern)"""
+        return self.reserviere_kundennummern(1)[0]
+    
+    def reserviere_kundennummern(self, anzahl):
+        """Reserviert anzahl neue Kundennummern auf einmal (z.B. für Importe)"""
+        return reserviere_kundennummern(self.kundennummer_file, anzahl, self.kunden)
 
     def speichere_kunde(self, kunde_data):
         # Undurchsichtige Kundennummer generieren
         neue_nummer = self.generiere_kundennummer(kunde_data)
         
         kunde_data['Kundennummer'] = neue_nummer
-        self.kunden[neue_nummer] = kunde_data
         
-        # CSV aktualisieren
-        fieldnames = ['Kundennummer', 'Firmenname', 'Ansprechpartner', 'Straße', 'Hausnummer', 'PLZ', 'Ort', 'Land', 'Telefon', 'Email', 'Bemerkungen']
-        with open(self.kunden_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for kunde in self.kunden.values():
-                writer.writerow(kunde)
+        # Nur den neuen Kunden anhängen (CSV-Zeile bzw. INSERT), nicht alle neu schreiben
+        self.kunden.hinzufuegen(kunde_data)
+        if self.kunden_index is not None:
+            self.kunden_index.hinzufuegen(kunde_data)
         
         return neue_nummer
     
     def lade_letzte_nummern(self):
-        """Lädt die gespeicherten Rechnungsnummern pro Tag"""
-        try:
-            with open(self.rechnungsnummer_file, "r") as f:
-                return json.load(f)
-        except:
-            return {}
+        """Lädt den Zählerstand der Rechnungsnummern ({"tage": ..., "jahre": ...})"""
+        return lade_nummernstand(self.rechnungsnummer_file)
 
     def speichere_letzte_nummern(self, nummern_dict):
-        """Speichert die Rechnungsnummern pro Tag"""
-        with open(self.rechnungsnummer_file, "w") as f:
-            json.dump(nummern_dict, f, indent=2)
+        """Speichert den Zählerstand der Rechnungsnummern (atomar)"""
+        with nummern_sperre(self.rechnungsnummer_file):
+            speichere_nummernstand(self.rechnungsnummer_file, normalisiere_stand(nummern_dict))
     
     def generiere_rechnungsnummer(self, datum):
         """Generiert eine datumsbasierte Rechnungsnummer im Format YYYY-MM-DD-##"""
-        # Datum in YYYY-MM-DD Format umwandeln
-        datum_obj = datetime.strptime(datum, "%d.%m.%Y")
-        datum_key = datum_obj.strftime("%Y-%m-%d")
-        
-        # Bisherige Nummern laden
-        nummern_dict = self.lade_letzte_nummern()
-        
-        # Tägliche Nummer ermitteln
-        if datum_key in nummern_dict:
-            naechste_nummer = nummern_dict[datum_key] + 1
-        else:
-            naechste_nummer = 1
-        
-        # Neue Nummer speichern
-        nummern_dict[datum_key] = naechste_nummer
-        self.speichere_letzte_nummern(nummern_dict)
+        return reserviere_rechnungsnummern(self.rechnungsnummer_file, [datum])[0]
+
+    def reserviere_rechnungsnummern(self, daten):
+        """Reserviert Rechnungsnummern für mehrere Rechnungsdaten auf einmal.
         
-        # Rechnungsnummer im Format YYYY-MM-DD-## zurückgeben
-        return f"{datum_key}-{naechste_nummer:02d}"
+        Alle Nummern werden in einer gesperrten Transaktion vergeben. Die
+        Nummern werden in der Reihenfolge der übergebenen Daten zurückgegeben.
+        """
+        return reserviere_rechnungsnummern(self.rechnungsnummer_file, daten)
 
 def system_reset_menu():
     """System-Reset mit Benutzerbestätigung"""
+    # Nur hier benötigt: nicht beim Programmstart laden
+    import glob
+    import shutil
+    import subprocess
+    
     print("\n🧹 SYSTEM-RESET")
     print("=" * 50)
     print("⚠️  ACHTUNG: Dies wird folgende Aktionen durchführen:")
@@ -222,25 +210,83 @@ def system_reset_menu():
         print("❌ Reset abgebrochen")
         input("📱 Drücken Sie Enter um fortzufahren...")
 
+def zeige_kunde_kurz(nummer, kunde):
+    """Gibt einen Kunden zweizeilig aus (Name, Typ, Ort)"""
+    if kunde.get('Ansprechpartner'):
+        print(f"🏢 {kunde['Firmenname']} (Ansprechpartner: {kunde['Ansprechpartner']})")
+    else:
+        print(f"👤 {kunde['Firmenname']} (Privatperson)")
+    print(f"     📍 {kunde.get('PLZ', '')} {kunde.get('Ort', '') or 'Unbekannt'} · {nummer}")
+
+def blaettere_kunden(manager, treffer, auswahl=True):
+    """Zeigt Suchtreffer seitenweise an.
+    
+    Mit auswahl=True wird ein Kunde per Nummer gewählt und als
+    (Kundennummer, Kunde) zurückgegeben. Gibt None für eine neue Suche
+    zurück und False, wenn der Benutzer abbricht.
+    """
+    seiten = max(1, (len(treffer) + KUNDEN_PRO_SEITE - 1) // KUNDEN_PRO_SEITE)
+    seite = 0
+    while True:
+        start = seite * KUNDEN_PRO_SEITE
+        sichtbar = treffer[start:start + KUNDEN_PRO_SEITE]
+        print("-" * 50)
+        for i, nummer in enumerate(sichtbar, start + 1):
+            print(f"{i:3d}. ", end="")
+            zeige_kunde_kurz(nummer, manager.kunden[nummer])
+        print("-" * 50)
+        print(f"Seite {seite + 1}/{seiten} · {len(treffer)} Treffer")
+        
+        optionen = []
+        if seite + 1 < seiten:
+            optionen.append("n = weiter")
+        if seite > 0:
+            optionen.append("z = zurück")
+        optionen.append("s = neue Suche")
+        optionen.append("x = abbrechen" if auswahl else "Enter = fertig")
+        eingabe = input(f"{'Nummer wählen, ' if auswahl else ''}{', '.join(optionen)}: ").strip().lower()
+        
+        if eingabe == "n" and seite + 1 < seiten:
+            seite += 1
+        elif eingabe == "z" and seite > 0:
+            seite -= 1
+        elif eingabe == "s":
+            return None
+        elif eingabe == "x" or (not auswahl and not eingabe):
+            return False
+        elif auswahl and eingabe.isdigit() and 1 <= int(eingabe) <= len(treffer):
+            nummer = treffer[int(eingabe) - 1]
+            return nummer, manager.kunden[nummer]
+        else:
+            print("❌ Ungültige Eingabe!")
+
+def suche_kunden(manager, auswahl=True):
+    """Kundensuche mit seitenweiser Trefferliste, gibt (Kundennummer, Kunde) oder None zurück"""
+    index = manager.kundensuche()
+    while True:
+        anfrage = input("🔍 Suche (Name, Ort, PLZ oder Kundennummer; leer = alle, x = abbrechen): ").strip()
+        if anfrage.lower() == "x":
+            return None
+        treffer = index.suche(anfrage)
+        if not treffer:
+            print(f"❌ Keine Kunden gefunden für: {anfrage}")
+            continue
+        ergebnis = blaettere_kunden(manager, treffer, auswahl)
+        if ergebnis is False:
+            return None
+        if ergebnis is not None:
+            return ergebnis
+
 def zeige_kunden(manager):
-    """Zeigt alle Kunden an"""
-    print("\n�📋 ALLE KUNDEN:")
+    """Sucht und zeigt Kunden seitenweise an"""
+    print("\n📋 KUNDEN:")
     print("-" * 60)
     if not manager.kunden:
         print("Noch keine Kunden vorhanden.")
         return
     
-    for kunde in manager.kunden.values():
-        # Unterscheidung zwischen Firma und Privatperson
-        typ_icon = "🏢" if kunde.get('Ansprechpartner') else "👤"
-        typ_text = "Firma" if kunde.get('Ansprechpartner') else "Privatperson"
-        
-        print(f"{kunde['Kundennummer']}: {typ_icon} {kunde['Firmenname']} ({kunde['Ort']}) - {typ_text}")
-        if kunde.get('Ansprechpartner'):
-            print(f"         Ansprechpartner: {kunde['Ansprechpartner']}")
-        print(f"         {kunde.get('Straße', '')} {kunde.get('Hausnummer', '')}, {kunde.get('PLZ', '')} {kunde.get('Ort', '')}")
-        print(f"         Email: {kunde.get('Email', '')}")
-        print()
+    print(f"{len(manager.kunden)} Kunden gespeichert.")
+    suche_kunden(manager, auswahl=False)
 
 def neuer_kunde(manager):
     print("\n➕ NEUER KUNDE:")
@@ -276,45 +322,18 @@ def rechnung_erstellen_dialog(manager):
     print("\n💼 RECHNUNG ERSTELLEN:")
     print("-" * 50)
     
-    # Kunde auswählen - Benutzerfreundliche numerische Auswahl
+    # Kunde über den Suchindex auswählen, Treffer seitenweise
     if not manager.kunden:
         print("❌ Noch keine Kunden vorhanden! Bitte erst einen Kunden anlegen.")
         return
     
-    print("Verfügbare Kunden:")
-    print("-" * 50)
-    kunden_liste = list(manager.kunden.items())
-    for i, (nr, kunde) in enumerate(kunden_liste, 1):
-        # Firmenname oder Privatperson erkennen
-        if kunde.get('Ansprechpartner'):
-            kunde_typ = "🏢"
-            zusatz = f" (Ansprechpartner: {kunde['Ansprechpartner']})"
-        else:
-            kunde_typ = "👤"
-            zusatz = " (Privatperson)"
-        print(f"{i:2d}. {kunde_typ} {kunde['Firmenname']}{zusatz}")
-        print(f"    📍 {kunde.get('Ort', 'Unbekannt')}")
-    
-    print("-" * 50)
-    
-    # Numerische Auswahl
-    while True:
-        try:
-            auswahl = input(f"Kunde auswählen (1-{len(kunden_liste)}): ").strip()
-            if not auswahl:
-                print("❌ Bitte eine Nummer eingeben!")
-                continue
-                
-            auswahl_nr = int(auswahl)
-            if 1 <= auswahl_nr <= len(kunden_liste):
-                kunde_nr, kunde_data = kunden_liste[auswahl_nr - 1]
-                print(f"✅ Kunde gewählt: {kunde_data['Firmenname']}")
-                break
-            else:
-                print(f"❌ Bitte eine Nummer zwischen 1 und {len(kunden_liste)} eingeben!")
-        except ValueError:
-            print("❌ Bitte eine gültige Nummer eingeben!")
-    
+    print(f"{len(manager.kunden)} Kunden verfügbar.")
+    gewaehlt = suche_kunden(manager)
+    if gewaehlt is None:
+        print("❌ Rechnung abgebrochen")
+        return
+    kunde_nr, kunde_data = gewaehlt
+    print(f"✅ Kunde gewählt: {kunde_data['Firmenname']}")
     
     # Datum
     datum = input(f"Rechnungsdatum [{datetime.today().strftime('%d.%m.%Y')}]: ") or datetime.today().strftime('%d.%m.%Y')
@@ -324,6 +343,9 @@ def rechnung_erstellen_dialog(manager):
     print("(Leer lassen für Standard: 'Vielen Dank für Ihr Vertrauen...')")
     freitext = input("Ihr Text: ") or None
     
+    # Kleinunternehmer prüfen
+    ist_kleinunternehmer = manager.unternehmen_daten.get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1']
+    
     # Positionen
     positionen = []
     print("\nRechnungspositionen eingeben (leere Bezeichnung beendet):")
@@ -335,20 +357,36 @@ def rechnung_erstellen_dialog(manager):
             break
         
         try:
-            menge = float(input("Menge: "))
-            einzelpreis = float(input("Einzelpreis: "))
-            
-            positionen.append({
-                'bezeichnung': bezeichnung,
-                'menge': menge,
-                'einzelpreis': einzelpreis
-            })
-            
-            gesamt = menge * einzelpreis
-            print(f"➡ Position hinzugefügt: {menge} x {einzelpreis:.2f}€ = {gesamt:.2f}€")
-            
+            # Wie in der Stapelverarbeitung: auch "12,50", kein NaN/Unendlich, nicht größer als die Decimal-Genauigkeit
+            menge, einzelpreis = pruefe_menge_preis(input("Menge: "), input("Einzelpreis: "))
         except ValueError:
             print("❌ Ungültige Eingabe für Menge oder Preis!")
+            continue
+        
+        position = {
+            'bezeichnung': bezeichnung,
+            'menge': menge,
+            'einzelpreis': einzelpreis
+        }
+        
+        # Steuersatz je Position (Kleinunternehmer weisen keine Steuer aus)
+        steuer_hinweis = ""
+        if not ist_kleinunternehmer:
+            steuer_eingabe = input(f"Steuersatz in % [{satz_text(STANDARD_STEUERSATZ)}] (0 = nullbesteuert, RC = Reverse Charge): ").strip()
+            if steuer_eingabe.upper() in ("RC", "AE"):
+                position['steuerkategorie'] = "AE"
+            elif steuer_eingabe:
+                position['steuersatz'] = steuer_eingabe
+            try:
+                kategorie, satz = steuer_schluessel(position)
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
+            steuer_hinweis = " (Reverse Charge)" if kategorie == "AE" else f" ({satz_text(satz)}% MwSt.)"
+        
+        positionen.append(position)
+        gesamt = positions_betrag(menge, einzelpreis)
+        print(f"➡ Position hinzugefügt: {menge} x {einzelpreis:.2f}€ = {gesamt:.2f}€{steuer_hinweis}")
     
     if not positionen:
         print("❌ Keine Positionen eingegeben!")
@@ -370,21 +408,20 @@ def rechnung_erstellen_dialog(manager):
     )
     
     if erfolg:
-        betrag = sum(pos["menge"] * pos["einzelpreis"] for pos in positionen)
-        
-        # Kleinunternehmer prüfen
-        ist_kleinunternehmer = manager.unternehmen_daten.get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1']
+        # Gleiche Berechnung wie im PDF und in der XRechnung
+        summen = berechne_summen(positionen, ist_kleinunternehmer)
+        gesamt_betrag = summen.brutto
         
         if ist_kleinunternehmer:
-            gesamt_betrag = betrag
             steuer_hinweis = "(keine MwSt - Kleinunternehmerregelung § 19 UStG)"
         else:
-            gesamt_betrag = betrag * 1.19
-            steuer_hinweis = "(inkl. 19% MwSt.)"
+            steuersaetze = [f"{satz_text(g['satz'])}%" for g in summen.steuergruppen if g['kategorie'] == "S"]
+            steuer_hinweis = f"(inkl. {', '.join(steuersaetze)} MwSt.)" if steuersaetze else "(ohne MwSt.)"
         
         print(f"\n✅ Rechnung {rechnungsnummer} erfolgreich erstellt!")
-        print(f"📄 PDF-Rechnung: Rechnungen/Rechnung_{rechnungsnummer.replace(':', '-')}.pdf")
-        print(f"📋 XRechnung-XML: Rechnungen/XRechnung_{rechnungsnummer.replace(':', '-')}.xml")
+        pdf_path, xml_path = rechnungs_pfade(rechnungsnummer, manager.rechnungen_dir, datum)
+        print(f"📄 PDF-Rechnung: {os.path.relpath(pdf_path, manager.base_dir)}")
+        print(f"📋 XRechnung-XML: {os.path.relpath(xml_path, manager.base_dir)}")
         print(f"💰 Gesamtbetrag: {gesamt_betrag:.2f}€ {steuer_hinweis}")
         print(f"🔢 Format: YYYY-MM-DD-## (Jahr-Monat-Tag-Tagesnummer)")
     else:
@@ -397,30 +434,30 @@ def zeige_rechnungsnummern_demo(manager):
     print("Format: YYYY-MM-DD-## (Jahr-Monat-Tag-Tagesnummer)")
     
     # Aktuelle Rechnungsnummern-Daten laden
-    nummern_dict = manager.lade_letzte_nummern()
+    stand = manager.lade_letzte_nummern()
+    nummern_dict = stand["tage"]
     heute = datetime.today().strftime("%Y-%m-%d")
     
     print("\n📊 AKTUELLER STATUS:")
     print("-" * 30)
     
-    if nummern_dict:
+    if nummern_dict or stand["jahre"]:
         # Letzte verwendete Rechnungsnummer finden
-        letzte_datum = max(nummern_dict.keys())
-        letzte_nummer_im_datum = nummern_dict[letzte_datum]
-        letzte_vollnummer = f"{letzte_datum}-{letzte_nummer_im_datum:02d}"
-        print(f"📋 Letzte Rechnungsnummer: {letzte_vollnummer}")
+        if nummern_dict:
+            letzte_datum = max(nummern_dict.keys())
+            letzte_nummer_im_datum = nummern_dict[letzte_datum]
+            letzte_vollnummer = f"{letzte_datum}-{letzte_nummer_im_datum:02d}"
+            print(f"📋 Letzte Rechnungsnummer: {letzte_vollnummer}")
         
         # Nächste Rechnungsnummer für heute
-        if heute in nummern_dict:
-            naechste_nummer_heute = nummern_dict[heute] + 1
-        else:
-            naechste_nummer_heute = 1
-        naechste_vollnummer = f"{heute}-{naechste_nummer_heute:02d}"
+        naechste_vollnummer = f"{heute}-{naechste_nummer(stand, heute):02d}"
         print(f"🔢 Nächste Nummer (heute): {naechste_vollnummer}")
         
-        # Anzahl Rechnungen heute
+        # Anzahl Rechnungen heute und im Jahr
         rechnungen_heute = nummern_dict.get(heute, 0)
         print(f"📈 Rechnungen heute: {rechnungen_heute}")
+        rechnungen_jahr = stand["jahre"].get(heute[:4], {}).get("rechnungen", 0)
+        print(f"📅 Rechnungen {heute[:4]}: {rechnungen_jahr}")
         
     else:
         print("📋 Noch keine Rechnungen erstellt")
@@ -433,10 +470,7 @@ def zeige_rechnungsnummern_demo(manager):
     for datum in beispiel_dates:
         datum_obj = datetime.strptime(datum, "%d.%m.%Y")
         datum_key = datum_obj.strftime("%Y-%m-%d")
-        if datum_key in nummern_dict:
-            naechste = nummern_dict[datum_key] + 1
-        else:
-            naechste = 1
+        naechste = naechste_nummer(stand, datum_key)
         print(f"  Datum {datum} → nächste Nummer: {datum_key}-{naechste:02d}")
     
     print("\n✅ VORTEILE:")
@@ -446,6 +480,8 @@ def zeige_rechnungsnummern_demo(manager):
     print("• Rechtlich einwandfrei (eindeutig und fortlaufend)")
 
 def hauptmenue():
+    # Im Menü erscheinen alle Meldungen wie gewohnt und in Reihenfolge auf stdout
+    richte_protokoll_ein("INFO", sys.stdout, warteschlange=False)
     manager = RechnungsManager()
     
     while True:
@@ -488,5 +524,167 @@ def hauptmenue():
         else:
             print("❌ Ungültige Auswahl! Bitte 1-7 wählen.")
 
+def main(argv=None):
+    """Einstiegspunkt: ohne Argumente interaktives Menü, sonst Unterbefehle"""
+    import argparse
+    
+    if argv is None:
+        argv = sys.argv[1:]
+    
+    if not argv:
+        hauptmenue()
+        return 0
+    
+    parser = argparse.ArgumentParser(prog="RechnungsTool", description="Rechnungen als PDF & XRechnung erstellen")
+    parser.add_argument("--verzeichnis", help="Datenverzeichnis mit unternehmen.csv, kunden.csv und Rechnungen/")
+    parser.add_argument("-v", "--ausfuehrlich", action="store_true", help="Auch Hinweise aus der Rechnungserstellung ausgeben (Standard: nur Warnungen und Fehler)")
+    befehle = parser.add_subparsers(dest="befehl", required=True)
+    
+    batch_parser = befehle.add_parser("batch", help="Viele Rechnungen aus einer JSON-Auftragsdatei erstellen")
+    batch_parser.add_argument("auftraege", help="JSON-Datei mit einer Liste von Rechnungsaufträgen")
+    batch_parser.add_argument("--prozesse", type=int, default=None, help="Anzahl paralleler Prozesse (Standard: alle CPU-Kerne)")
+    batch_parser.add_argument("--bericht", help="Ergebnisbericht zusätzlich als JSON-Datei speichern")
+    batch_parser.add_argument("--cii-xml", action="store_true", help="CII-XML (ZUGFeRD-Syntax) zusätzlich als Debug-Ausgabe speichern")
+    batch_parser.add_argument("--zugferd", action="store_true", help="CII-XML in das PDF einbetten (hybride ZUGFeRD-Rechnung)")
+    batch_parser.add_argument("--pipeline", action="store_true", help="Rendern und Schreiben überlappen (z.B. für Rechnungen/ auf einem Netzlaufwerk)")
+    batch_parser.add_argument("--schreiber", type=int, default=None, help="Parallele Schreibvorgänge mit --pipeline (Standard: 4)")
+    batch_parser.add_argument("--puffer", type=int, default=None, help="Höchstens gepufferte fertige Rechnungen mit --pipeline (Standard: 16)")
+    batch_parser.add_argument("--metriken", metavar="DATEI", help="Dauer je Verarbeitungsstufe messen und speichern (*.prom = Prometheus, sonst JSON, - = stderr)")
+    
+    run_parser = befehle.add_parser("run", help="Rechnungen ohne Rückfragen aus JSON Lines oder CSV erstellen (Ergebnis als JSON-Zeilen)")
+    run_parser.add_argument("quelle", nargs="?", default="-", help="Eingabedatei (Standard: - = stdin)")
+    run_parser.add_argument("--format", dest="eingabeformat", choices=["jsonl", "csv"], help="Eingabeformat (Standard: nach Dateiendung, stdin = jsonl)")
+    run_parser.add_argument("--prozesse", type=int, default=None, help="Anzahl paralleler Prozesse (Standard: alle CPU-Kerne)")
+    run_parser.add_argument("--block", type=int, default=100, help="Aufträge pro Verarbeitungsblock (Standard: 100)")
+    run_parser.add_argument("--cii-xml", action="store_true", help="CII-XML (ZUGFeRD-Syntax) zusätzlich als Debug-Ausgabe speichern")
+    run_parser.add_argument("--zugferd", action="store_true", help="CII-XML in das PDF einbetten (hybride ZUGFeRD-Rechnung)")
+    run_parser.add_argument("--pipeline", action="store_true", help="Rendern und Schreiben überlappen (z.B. für Rechnungen/ auf einem Netzlaufwerk)")
+    run_parser.add_argument("--schreiber", type=int, default=None, help="Parallele Schreibvorgänge mit --pipeline (Standard: 4)")
+    run_parser.add_argument("--puffer", type=int, default=None, help="Höchstens gepufferte fertige Rechnungen mit --pipeline (Standard: 16)")
+    run_parser.add_argument("--metriken", metavar="DATEI", help="Dauer je Verarbeitungsstufe messen und speichern (*.prom = Prometheus, sonst JSON, - = stderr)")
+    
+    server_parser = befehle.add_parser("server", help="Rechnungsserver mit lokaler HTTP-Schnittstelle starten")
+    server_parser.add_argument("--port", type=int, default=8765, help="Port auf 127.0.0.1 (Standard: 8765)")
+    server_parser.add_argument("--socket", help="Unix-Domain-Socket statt TCP-Port verwenden")
+    server_parser.add_argument("--worker", type=int, default=None, help="Anzahl Render-Prozesse (Standard: alle CPU-Kerne)")
+    server_parser.add_argument("--warteschlange", type=int, default=None, help="Zusätzlich wartende Aufträge, danach HTTP 503 (Standard: 4 je Worker)")
+    server_parser.add_argument("--zugferd", action="store_true", help="CII-XML standardmäßig in das PDF einbetten")
+    
+    journal_parser = befehle.add_parser("journal", help="Ausgestellte Rechnungen aus dem Rechnungsjournal abfragen")
+    journal_parser.add_argument("--kunde", help="Nur Rechnungen dieser Kundennummer")
+    journal_parser.add_argument("--von", help="Rechnungsdatum ab (TT.MM.JJJJ)")
+    journal_parser.add_argument("--bis", help="Rechnungsdatum bis einschließlich (TT.MM.JJJJ)")
+    journal_parser.add_argument("--min", dest="min_betrag", help="Bruttobetrag mindestens (Euro)")
+    journal_parser.add_argument("--max", dest="max_betrag", help="Bruttobetrag höchstens (Euro)")
+    journal_parser.add_argument("--limit", type=int, default=None, help="Höchstens so viele Rechnungen anzeigen")
+    journal_parser.add_argument("--json", action="store_true", help="Ein JSON-Objekt pro Rechnung statt Tabelle")
+    
+    neuaufbau_parser = befehle.add_parser("journal-neu-aufbauen", help="Fehlende Rechnungen aus den XRechnung-Dateien ins Journal übernehmen")
+    neuaufbau_parser.add_argument("--prozesse", type=int, default=None, help="Anzahl paralleler Prozesse (Standard: alle CPU-Kerne)")
+    
+    export_journal_parser = befehle.add_parser("journal-export", help="Journal mit Positionen spaltenorientiert exportieren (nur neue Rechnungen)")
+    export_journal_parser.add_argument("--ziel", help="Exportverzeichnis (Standard: Journal-Export/ im Datenverzeichnis)")
+    export_journal_parser.add_argument("--format", dest="exportformat", choices=["parquet", "arrow", "csv"], help="Dateiformat (Standard: parquet mit pyarrow, sonst csv)")
+    export_journal_parser.add_argument("--neu", action="store_true", help="Vorhandenen Export verwerfen und alles neu exportieren")
+    export_journal_parser.add_argument("--prozesse", type=int, default=None, help="Anzahl paralleler Prozesse (Standard: alle CPU-Kerne)")
+    
+    umsatz_parser = befehle.add_parser("journal-umsatz", help="Umsätze aus dem Journal-Export summieren")
+    umsatz_parser.add_argument("--nach", choices=["jahr", "monat", "kunde", "artikel"], default="monat", help="Gruppierung (Standard: monat)")
+    umsatz_parser.add_argument("--quelle", help="Exportverzeichnis (Standard: Journal-Export/ im Datenverzeichnis)")
+    umsatz_parser.add_argument("--json", action="store_true", help="Ein JSON-Objekt pro Gruppe statt Tabelle")
+    
+    ablage_parser = befehle.add_parser("rechnungen-migrieren", help="Rechnungen/ auf ein anderes Verzeichnislayout umstellen")
+    ablage_parser.add_argument("--layout", required=True, help='Layout nach Rechnungsdatum, z.B. "{jahr}/{monat}" oder "flach"')
+    
+    export_parser = befehle.add_parser("kunden-export", help="Alle Kunden als CSV exportieren")
+    export_parser.add_argument("ziel", nargs="?", default="kunden_export.csv", help="Ziel-CSV-Datei (Standard: kunden_export.csv)")
+    
+    import_parser = befehle.add_parser("kunden-import", help="Kunden aus einer CSV-Datei in die SQLite-Datenbank übernehmen")
+    import_parser.add_argument("quelle", nargs="?", help="Quell-CSV-Datei (Standard: kunden.csv im Datenverzeichnis)")
+    
+    aufnehmen_parser = befehle.add_parser("kunden-aufnehmen", help="Viele neue Kunden aus CSV, JSON oder vCard aufnehmen (geprüft, ohne Dubletten)")
+    aufnehmen_parser.add_argument("quelle", help="Eingabedatei (- = stdin, dann mit --format)")
+    aufnehmen_parser.add_argument("--format", dest="eingabeformat", choices=["csv", "json", "vcard"], help="Eingabeformat (Standard: nach Dateiendung)")
+    aufnehmen_parser.add_argument("--abgelehnt", help="Abgelehnte Datensätze mit Grund als JSON Lines speichern")
+    aufnehmen_parser.add_argument("--probelauf", action="store_true", help="Nur prüfen, nichts speichern")
+    
+    args = parser.parse_args(argv)
+    richte_protokoll_ein("INFO" if args.ausfuehrlich else "WARNING")
+    manager = RechnungsManager(args.verzeichnis)
+    
+    if args.befehl == "batch":
+        from rechnungstool_batch import fuehre_batch_aus
+        return fuehre_batch_aus(manager, args.auftraege, args.prozesse, args.bericht, args.cii_xml, args.zugferd,
+                                args.pipeline, args.schreiber, args.puffer, args.metriken)
+    
+    if args.befehl == "run":
+        from rechnungstool_batch import fuehre_run_aus
+        return fuehre_run_aus(manager, args.quelle, args.eingabeformat, args.prozesse, args.block, args.cii_xml, args.zugferd,
+                              pipeline=args.pipeline, schreiber=args.schreiber, puffer=args.puffer, metriken=args.metriken)
+    
+    if args.befehl == "server":
+        from rechnungstool_server import starte_server
+        return starte_server(manager, args.port, args.socket, args.worker, args.warteschlange, args.zugferd)
+    
+    if args.befehl == "journal":
+        from rechnungstool_journal import fuehre_journal_aus
+        return fuehre_journal_aus(manager, args.kunde, args.von, args.bis, args.min_betrag, args.max_betrag, args.limit, args.json)
+    
+    if args.befehl == "journal-neu-aufbauen":
+        from rechnungstool_journal import baue_journal_neu
+        print("🔄 Lese XRechnung-Dateien ein...")
+        neu, gelesen, fehler = baue_journal_neu(manager.rechnungen_dir, manager.kunden, args.prozesse)
+        for pfad, meldung in fehler:
+            print(f"⚠️ {os.path.relpath(pfad, manager.rechnungen_dir)}: {meldung}")
+        print(f"✅ {neu} Rechnungen ins Journal übernommen ({gelesen} Dateien gelesen, {len(fehler)} übersprungen)")
+        return 0
+    
+    if args.befehl == "journal-export":
+        from rechnungstool_export import fuehre_export_aus
+        return fuehre_export_aus(manager, args.ziel, args.exportformat, args.neu, args.prozesse)
+    
+    if args.befehl == "journal-umsatz":
+        from rechnungstool_export import fuehre_umsatz_aus
+        return fuehre_umsatz_aus(manager, args.nach, args.quelle, args.json)
+    
+    if args.befehl == "rechnungen-migrieren":
+        from rechnungstool_ablage import migriere_ablage
+        print("🔄 Verschiebe Rechnungen...")
+        try:
+            verschoben, konflikte = migriere_ablage(manager.rechnungen_dir, args.layout)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        for pfad, meldung in konflikte:
+            print(f"⚠️ {os.path.relpath(pfad, manager.rechnungen_dir)}: {meldung}")
+        print(f"✅ {verschoben} Dateien verschoben ({len(konflikte)} nicht verschoben)")
+        return 1 if konflikte else 0
+    
+    if args.befehl == "kunden-aufnehmen":
+        from rechnungstool_kundenimport import fuehre_kundenimport_aus
+        return fuehre_kundenimport_aus(manager, args.quelle, args.eingabeformat, args.abgelehnt, args.probelauf)
+    
+    if args.befehl == "kunden-export":
+        from rechnungstool_kunden import exportiere_kunden_csv
+        anzahl = exportiere_kunden_csv(manager.kunden, args.ziel)
+        print(f"✅ {anzahl} Kunden exportiert: {args.ziel}")
+    
+    elif args.befehl == "kunden-import":
+        if not hasattr(manager.kunden, "importiere_csv"):
+            print("❌ Import nur mit SQLite-Kundenspeicher möglich (einstellungen.json: {\"kunden_speicher\": \"sqlite\"})")
+            return 1
+        quelle = args.quelle or manager.kunden_file
+        try:
+            anzahl = manager.kunden.importiere_csv(quelle)
+        except OSError as e:
+            print(f"❌ Import fehlgeschlagen: {e}")
+            return 1
+        print(f"✅ {anzahl} neue Kunden aus {quelle} übernommen ({len(manager.kunden)} gesamt)")
+    
+    return 0
+
 if __name__ == "__main__":
-    hauptmenue()
\ No newline at end of file
+    # Für Prozess-Pools in der PyInstaller-Executable erforderlich
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
\ No newline at end of file
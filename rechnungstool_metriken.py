@@ -0,0 +1,241 @@
+"""
+Metriken der Rechnungserstellung
+================================
+
+Misst, wie lange jede Stufe einer Rechnung dauert (Summen, CII-XML,
+Briefbogen, Logo, Positionen, c.save() mit Kompression und Schreiben,
+XRechnung, Journal, ...), und zählt Ereignisse (Rechnungen, Cache-Treffer,
+Positionen). Je Stufe wird ein Histogramm geführt.
+
+    @gemessen("pdf")
+    def erstelle_pdf(...): ...
+
+    with messe("pdf_speichern"):
+        c.save()
+    zaehle("positionen", len(positionen))
+
+Abgeschaltet (Standard) ist messe() ein vorab angelegter leerer
+Kontextmanager und zaehle() kehrt sofort zurück; die Rechnungserstellung
+wird dadurch nicht messbar langsamer. Eingeschaltet wird mit aktiviere(),
+z.B. über --metriken bei batch und run oder dauerhaft im Rechnungsserver
+(GET /metriken).
+
+Worker-Prozesse sammeln je Rechnung mit sammle() und geben die Messwerte
+im Ergebnis zurück; der Hauptprozess führt sie mit fuehre_zusammen()
+zusammen. sammle() gilt nur für den eigenen Thread (ContextVar): Andere
+Threads, z.B. weitere Anfragen im Rechnungsserver, messen währenddessen
+weiter ins gemeinsame Register. Ausgabe als JSON-Zusammenfassung (als_dict) oder im
+Prometheus-Textformat (als_prometheus).
+"""
+
+import time
+import functools
+import threading
+import contextlib
+import contextvars
+
+# Obergrenzen der Histogramm-Klassen in Sekunden (wie bei Prometheus, letzte Klasse = unendlich)
+KLASSEN_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Präfix der Prometheus-Metriken
+PRAEFIX = "rechnungstool"
+
+# Prozessweiter Zustand: eingeschaltet und gemeinsames Register
+ZUSTAND = {"aktiv": False}
+REGISTER = {"zaehler": {}, "stufen": {}}
+SPERRE = threading.Lock()
+
+# Eigenes Register von sammle() im aktuellen Thread bzw. Kontext (None = gemeinsames Register)
+EIGENES_REGISTER = contextvars.ContextVar("metriken_register", default=None)
+
+# Abgeschaltet liefert messe() immer dasselbe Objekt, es wird nichts angelegt
+LEER = contextlib.nullcontext()
+
+def aktiviere(aktiv=True):
+    ZUSTAND["aktiv"] = bool(aktiv)
+
+def ist_aktiv():
+    return ZUSTAND["aktiv"]
+
+def misst():
+    """Eingeschaltet oder innerhalb von sammle()"""
+    return ZUSTAND["aktiv"] or EIGENES_REGISTER.get() is not None
+
+def aktuelles_register():
+    register = EIGENES_REGISTER.get()
+    return REGISTER if register is None else register
+
+def neue_stufe():
+    # [Anzahl, Summe s, Maximum s, Anzahl je Klasse (nicht kumuliert)]
+    return [0, 0.0, 0.0, [0] * (len(KLASSEN_S) + 1)]
+
+def erfasse(stufe, dauer_s):
+    """Trägt eine gemessene Dauer in das Histogramm der Stufe ein"""
+    klasse = next((i for i, grenze in enumerate(KLASSEN_S) if dauer_s <= grenze), len(KLASSEN_S))
+    register = aktuelles_register()
+    with SPERRE:
+        werte = register["stufen"].get(stufe)
+        if werte is None:
+            werte = register["stufen"][stufe] = neue_stufe()
+        werte[0] += 1
+        werte[1] += dauer_s
+        werte[2] = max(werte[2], dauer_s)
+        werte[3][klasse] += 1
+
+class Messung:
+    """Kontextmanager: misst die Dauer des Blocks und erfasst sie unter stufe"""
+
+    __slots__ = ("stufe", "start")
+
+    def __init__(self, stufe):
+        self.stufe = stufe
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *fehler):
+        erfasse(self.stufe, time.perf_counter() - self.start)
+        return False
+
+def messe(stufe):
+    """Misst den with-Block als Stufe stufe (abgeschaltet ohne Aufwand)"""
+    if not misst():
+        return LEER
+    return Messung(stufe)
+
+def gemessen(stufe):
+    """Dekorator: misst jeden Aufruf der Funktion als Stufe stufe"""
+    def dekorator(funktion):
+        @functools.wraps(funktion)
+        def gemessene_funktion(*args, **kwargs):
+            if not misst():
+                return funktion(*args, **kwargs)
+            with Messung(stufe):
+                return funktion(*args, **kwargs)
+        return gemessene_funktion
+    return dekorator
+
+def zaehle(name, wert=1):
+    """Erhöht den Zähler name um wert"""
+    if not misst():
+        return
+    register = aktuelles_register()
+    with SPERRE:
+        register["zaehler"][name] = register["zaehler"].get(name, 0) + wert
+
+def momentaufnahme(register=None):
+    """Kopie des (aktuellen) Registers (für die Übergabe zwischen Prozessen)"""
+    if register is None:
+        register = aktuelles_register()
+    with SPERRE:
+        return {
+            "zaehler": dict(register["zaehler"]),
+            "stufen": {stufe: [werte[0], werte[1], werte[2], list(werte[3])] for stufe, werte in register["stufen"].items()},
+        }
+
+def setze_zurueck():
+    with SPERRE:
+        REGISTER["zaehler"].clear()
+        REGISTER["stufen"].clear()
+
+def fuehre_zusammen(daten):
+    """Addiert eine Momentaufnahme (z.B. aus einem Worker-Prozess) zum Register"""
+    if not daten:
+        return
+    register = aktuelles_register()
+    with SPERRE:
+        for name, wert in daten["zaehler"].items():
+            register["zaehler"][name] = register["zaehler"].get(name, 0) + wert
+        for stufe, (anzahl, summe, maximum, klassen) in daten["stufen"].items():
+            werte = register["stufen"].get(stufe)
+            if werte is None:
+                werte = register["stufen"][stufe] = neue_stufe()
+            werte[0] += anzahl
+            werte[1] += summe
+            werte[2] = max(werte[2], maximum)
+            werte[3] = [a + b for a, b in zip(werte[3], klassen)]
+
+@contextlib.contextmanager
+def sammle(aktiv=True):
+    """Misst den Block in einem eigenen Register und liefert dessen Momentaufnahme.
+
+    Für Worker: das Ergebnis geht mit dem Rechnungsergebnis an den
+    Hauptprozess zurück. Läuft der Block im Hauptprozess selbst (ohne
+    Prozess-Pool), wird dadurch nichts doppelt gezählt. Das eigene Register
+    gilt nur im aktuellen Thread bzw. Kontext, gleichzeitige Messungen
+    anderer Threads bleiben im gemeinsamen Register. Mit aktiv=False
+    bleibt das Dict leer.
+    """
+    gesammelt = {}
+    if not aktiv:
+        yield gesammelt
+        return
+    register = {"zaehler": {}, "stufen": {}}
+    token = EIGENES_REGISTER.set(register)
+    try:
+        yield gesammelt
+    finally:
+        EIGENES_REGISTER.reset(token)
+        gesammelt.update(momentaufnahme(register))
+
+def quantil_ms(werte, anteil):
+    """Näherung eines Quantils aus den Histogramm-Klassen (Obergrenze der Klasse, in ms)"""
+    anzahl, _, maximum, klassen = werte
+    ziel = anteil * anzahl
+    bisher = 0
+    for i, klasse in enumerate(klassen):
+        bisher += klasse
+        if bisher >= ziel:
+            return round(min(KLASSEN_S[i] if i < len(KLASSEN_S) else maximum, maximum) * 1e3, 3)
+    return round(maximum * 1e3, 3)
+
+def als_dict():
+    """JSON-Zusammenfassung: Zähler und je Stufe Anzahl, Summe, Mittel, p50/p95 und Maximum"""
+    daten = momentaufnahme()
+    stufen = {}
+    # Teuerste Stufen zuerst
+    for stufe, werte in sorted(daten["stufen"].items(), key=lambda eintrag: -eintrag[1][1]):
+        anzahl, summe, maximum, _ = werte
+        stufen[stufe] = {
+            "anzahl": anzahl,
+            "summe_s": round(summe, 6),
+            "mittel_ms": round(summe / anzahl * 1e3, 3) if anzahl else 0.0,
+            "p50_ms": quantil_ms(werte, 0.5),
+            "p95_ms": quantil_ms(werte, 0.95),
+            "max_ms": round(maximum * 1e3, 3),
+        }
+    return {"zaehler": dict(sorted(daten["zaehler"].items())), "stufen": stufen}
+
+def als_prometheus():
+    """Register im Prometheus-Textformat (Version 0.0.4)"""
+    daten = momentaufnahme()
+    zeilen = []
+    for name, wert in sorted(daten["zaehler"].items()):
+        zeilen.append(f"# TYPE {PRAEFIX}_{name}_total counter")
+        zeilen.append(f"{PRAEFIX}_{name}_total {wert}")
+    if daten["stufen"]:
+        metrik = f"{PRAEFIX}_stufe_sekunden"
+        zeilen.append(f"# HELP {metrik} Dauer der Verarbeitungsstufen einer Rechnung")
+        zeilen.append(f"# TYPE {metrik} histogram")
+        for stufe, (anzahl, summe, _, klassen) in sorted(daten["stufen"].items()):
+            kumuliert = 0
+            for grenze, klasse in zip(KLASSEN_S + ("+Inf",), klassen):
+                kumuliert += klasse
+                zeilen.append(f'{metrik}_bucket{{stufe="{stufe}",le="{grenze}"}} {kumuliert}')
+            zeilen.append(f'{metrik}_sum{{stufe="{stufe}"}} {summe:.6f}')
+            zeilen.append(f'{metrik}_count{{stufe="{stufe}"}} {anzahl}')
+    return "\n".join(zeilen) + "\n"
+
+def schreibe_metriken(ziel):
+    """Schreibt die Metriken nach ziel: *.prom im Prometheus-Textformat, sonst JSON; '-' = JSON auf stderr"""
+    import sys
+    import json
+    if ziel == "-":
+        print(json.dumps(als_dict(), ensure_ascii=False, indent=2), file=sys.stderr)
+        return
+    with open(ziel, "w", encoding="utf-8") as f:
+        if ziel.endswith(".prom"):
+            f.write(als_prometheus())
+        else:
+            json.dump(als_dict(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,171 @@
+"""
+Rechnungsnummern-Vergabe
+========================
+
+Vergibt datumsbasierte Rechnungsnummern (YYYY-MM-DD-##) prozesssicher:
+
+- Jede Vergabe läuft unter einer Betriebssystem-Dateisperre
+  (rechnungsnummer.json.lock), zwei Prozesse erhalten nie dieselbe Nummer.
+- Der neue Zählerstand wird in eine temporäre Datei geschrieben und per
+  os.replace atomar übernommen; ein Absturz hinterlässt nie eine halbe Datei.
+- Für Stapelläufe werden beliebig viele Nummern in einer Transaktion
+  reserviert (ein Lesen, ein Schreiben, eine Sperre).
+
+Damit die Zählerdatei nicht mit jedem Tag wächst, werden Tage, die länger
+als AKTIVE_TAGE zurückliegen, zu einer Jahreszusammenfassung verdichtet:
+
+    {
+        "tage":  {"2025-11-05": 3},
+        "jahre": {"2024": {"rechnungen": 812, "max_pro_tag": 9}}
+    }
+
+rechnungen zählt alle im Jahr vergebenen Nummern, max_pro_tag die höchste
+Tagesnummer der verdichteten Tage. Wird später doch eine Rechnung auf einen
+verdichteten Tag datiert, beginnt die Tagesnummer oberhalb von max_pro_tag
+und ist damit weiterhin eindeutig. Das alte Format ({"YYYY-MM-DD": n, ...})
+wird beim Lesen übernommen.
+"""
+
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Tage innerhalb dieses Zeitraums bleiben einzeln in der Zählerdatei
+AKTIVE_TAGE = 90
+
+def leerer_stand():
+    return {"tage": {}, "jahre": {}}
+
+def normalisiere_stand(daten):
+    """Übernimmt den Zählerstand aus dem aktuellen oder dem alten Dateiformat"""
+    if not isinstance(daten, dict):
+        return leerer_stand()
+    if "tage" in daten or "jahre" in daten:
+        return {"tage": dict(daten.get("tage", {})), "jahre": dict(daten.get("jahre", {}))}
+
+    # Altes Format: ein Eintrag pro Tag auf oberster Ebene
+    stand = leerer_stand()
+    for tag, anzahl in daten.items():
+        stand["tage"][tag] = int(anzahl)
+        jahr = stand["jahre"].setdefault(tag[:4], {"rechnungen": 0, "max_pro_tag": 0})
+        jahr["rechnungen"] += int(anzahl)
+    return stand
+
+def lade_nummernstand(pfad, streng=False):
+    """Liest den Zählerstand (ohne Sperre, z.B. für Anzeigen).
+
+    Mit streng=True führt nur eine fehlende Datei zu einem leeren Stand; eine
+    unlesbare Datei löst einen Fehler aus, statt die Nummerierung
+    stillschweigend neu zu beginnen.
+    """
+    try:
+        with open(pfad, "r", encoding="utf-8") as f:
+            return normalisiere_stand(json.load(f))
+    except FileNotFoundError:
+        return leerer_stand()
+    except (OSError, ValueError):
+        if streng:
+            raise
+        return leerer_stand()
+
+def speichere_nummernstand(pfad, stand):
+    """Schreibt den Zählerstand atomar (temporäre Datei + os.replace)"""
+    verzeichnis = os.path.dirname(os.path.abspath(pfad))
+    # Präfix je Zählerdatei (.rechnungsnummer-, .kundennummer-): Reste lassen sich zuordnen
+    praefix = "." + os.path.splitext(os.path.basename(pfad))[0] + "-"
+    fd, temp_pfad = tempfile.mkstemp(prefix=praefix, suffix=".tmp", dir=verzeichnis)
+    try:
+        # mkstemp legt die Datei mit 0600 an: Rechte der bisherigen Datei übernehmen
+        try:
+            modus = os.stat(pfad).st_mode & 0o777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            modus = 0o666 & ~umask
+        os.chmod(temp_pfad, modus)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(stand, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_pfad, pfad)
+    except BaseException:
+        try:
+            os.remove(temp_pfad)
+        except OSError:
+            pass
+        raise
+
+@contextmanager
+def nummern_sperre(pfad):
+    """Exklusive Sperre über alle Prozesse für die Zählerdatei pfad"""
+    with open(pfad + ".lock", "a+b") as sperrdatei:
+        if fcntl:
+            fcntl.flock(sperrdatei.fileno(), fcntl.LOCK_EX)
+        else:
+            sperrdatei.seek(0)
+            msvcrt.locking(sperrdatei.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(sperrdatei.fileno(), fcntl.LOCK_UN)
+            else:
+                sperrdatei.seek(0)
+                msvcrt.locking(sperrdatei.fileno(), msvcrt.LK_UNLCK, 1)
+
+def verdichtungsgrenze(heute=None):
+    """Tage vor diesem Datum (YYYY-MM-DD) werden verdichtet"""
+    return ((heute or datetime.today()) - timedelta(days=AKTIVE_TAGE)).strftime("%Y-%m-%d")
+
+def naechste_nummer(stand, datum_key, grenze=None):
+    """Nächste freie Tagesnummer für datum_key (YYYY-MM-DD), ohne sie zu vergeben"""
+    if datum_key in stand["tage"]:
+        return stand["tage"][datum_key] + 1
+    # Ein Tag vor der Grenze kann bereits verdichtet sein: oberhalb aller Tagesnummern beginnen
+    if datum_key < (grenze or verdichtungsgrenze()):
+        jahr = stand["jahre"].get(datum_key[:4])
+        if jahr:
+            return jahr["max_pro_tag"] + 1
+    return 1
+
+def verdichte_stand(stand, grenze=None):
+    """Fasst Tage vor der Grenze je Jahr zusammen (nur max_pro_tag bleibt erhalten)"""
+    grenze = grenze or verdichtungsgrenze()
+    for tag in [tag for tag in stand["tage"] if tag < grenze]:
+        anzahl = stand["tage"].pop(tag)
+        jahr = stand["jahre"].setdefault(tag[:4], {"rechnungen": 0, "max_pro_tag": 0})
+        jahr["max_pro_tag"] = max(jahr["max_pro_tag"], anzahl)
+    return stand
+
+def reserviere_rechnungsnummern(pfad, daten):
+    """Reserviert für jedes Rechnungsdatum (TT.MM.JJJJ) eine Rechnungsnummer.
+
+    Alle Nummern werden in einer Transaktion unter der Dateisperre vergeben;
+    mehrere Rechnungen desselben Tages erhalten einen zusammenhängenden
+    Block. Die Nummern werden in der Reihenfolge von daten zurückgegeben.
+    """
+    datum_keys = [datetime.strptime(datum, "%d.%m.%Y").strftime("%Y-%m-%d") for datum in daten]
+    if not datum_keys:
+        return []
+
+    with nummern_sperre(pfad):
+        stand = lade_nummernstand(pfad, streng=True)
+        grenze = verdichtungsgrenze()
+        rechnungsnummern = []
+        for datum_key in datum_keys:
+            nummer = naechste_nummer(stand, datum_key, grenze)
+            stand["tage"][datum_key] = nummer
+            jahr = stand["jahre"].setdefault(datum_key[:4], {"rechnungen": 0, "max_pro_tag": 0})
+            jahr["rechnungen"] += 1
+            rechnungsnummern.append(f"{datum_key}-{nummer:02d}")
+        speichere_nummernstand(pfad, verdichte_stand(stand, grenze))
+
+    return rechnungsnummern
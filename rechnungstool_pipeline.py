@@ -0,0 +1,212 @@
+"""
+Rechnungs-Pipeline
+==================
+
+Überlappt Rendern und Schreiben in Stapelläufen. Ohne Pipeline schreibt
+jeder Worker seine Dateien selbst und wartet dabei auf das Dateisystem; auf
+einem Netzlaufwerk steht das Rendern so die meiste Zeit still.
+
+    Aufträge ──► Prozess-Pool (rendert in den Speicher)
+                     │
+                     ▼  Queue (höchstens puffer fertige Rechnungen)
+                 Schreiber-Threads ──► Rechnungen/
+
+- Gerendert wird CPU-gebunden im Prozess-Pool, höchstens 2 x prozesse
+  Rechnungen gleichzeitig.
+- Fertige Rechnungen landen in einer begrenzten asyncio.Queue, aus der
+  mehrere Schreiber parallel in Threads schreiben.
+- Ist die Queue voll, warten die Render-Aufträge, bis wieder Platz ist
+  (Backpressure). Im Speicher liegen damit nie mehr als
+  2 x prozesse + puffer Rechnungen.
+
+Jede Datei wird unter einem temporären Namen geschrieben und per
+os.replace übernommen; ein Abbruch hinterlässt keine halben Dateien.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from rechnungstool_backend import rechnungs_pfade, rendere_rechnungsdokumente
+from rechnungstool_ablage import ablage_sperre
+from rechnungstool_journal import journalzeile, trage_ein
+from rechnungstool_summen import berechne_summen
+from rechnungstool_metriken import messe, sammle, zaehle
+from rechnungstool_protokoll import richte_protokoll_ein
+
+# Standardwerte: parallele Schreibvorgänge und gepufferte fertige Rechnungen
+STANDARD_SCHREIBER = 4
+STANDARD_PUFFER = 16
+
+def rendere_job(job):
+    """Rendert einen Job aus baue_job im Worker-Prozess.
+
+    Gibt (ergebnis, dokumente, journalzeile, cache_schluessel) zurück;
+    dokumente ist ein Dict {art: (pfad, bytes)}, leer bei einem Treffer im
+    Render-Cache, oder None, wenn das Rendern fehlgeschlagen ist. Die
+    Messwerte des Workers stehen (falls eingeschaltet) in ergebnis["metriken"].
+    """
+    if job.get("protokoll"):
+        richte_protokoll_ein(job["protokoll"])
+    with sammle(job.get("metriken")) as metriken, messe("rendern"):
+        ergebnis, dokumente, zeile, schluessel = rendere_job_ohne_messung(job)
+    if metriken:
+        ergebnis["metriken"] = metriken
+    return ergebnis, dokumente, zeile, schluessel
+
+def rendere_job_ohne_messung(job):
+    """rendere_job ohne eigenes Metrik-Register"""
+    ergebnis = {
+        "index": job["index"],
+        "kundennummer": job["kunde_data"].get("Kundennummer", ""),
+        "rechnungsnummer": job["rechnungsnummer"],
+        "erfolg": False,
+        "fehler": None,
+        "dauer_s": 0.0,
+        "pdf": None,
+        "xml": None,
+    }
+    start = time.perf_counter()
+    umleitung = contextlib.redirect_stdout(sys.stderr) if job.get("meldungen_stderr") else contextlib.nullcontext()
+    cache = job.get("cache")
+    schluessel = zeile = None
+    try:
+        if cache is not None:
+            pdf_path, xml_path = rechnungs_pfade(job["rechnungsnummer"], job["rechnungen_dir"], job["datum"])
+            ziele = {"pdf": pdf_path, "xml": xml_path}
+            if job["cii_xml_path"]:
+                ziele["cii"] = job["cii_xml_path"]
+            schluessel = cache.schluessel(job["rechnungsnummer"], job["kunde_data"], job["unternehmen_data"], job["datum"],
+                                          job["positionen"], job["freitext"], job["zugferd"], bool(job["cii_xml_path"]))
+            with ablage_sperre(job["rechnungen_dir"]), messe("cache_pruefen"):
+                lege_verzeichnisse_an(ziele.values())
+                treffer = cache.hole(schluessel, ziele)
+            if treffer:
+                zaehle("cache_treffer")
+                ist_kleinunternehmer = job["unternehmen_data"].get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1']
+                zeile = journalzeile(job["rechnungsnummer"], job["kunde_data"], job["datum"],
+                                     berechne_summen(job["positionen"], ist_kleinunternehmer), pdf_path, xml_path, job["rechnungen_dir"])
+                ergebnis["pdf"], ergebnis["xml"] = pdf_path, xml_path
+                ergebnis["dauer_s"] = round(time.perf_counter() - start, 6)
+                return ergebnis, {}, zeile, None
+        with umleitung:
+            dokumente, zeile = rendere_rechnungsdokumente(
+                rechnungsnummer=job["rechnungsnummer"],
+                kunde_data=job["kunde_data"],
+                unternehmen_data=job["unternehmen_data"],
+                datum=job["datum"],
+                positionen=job["positionen"],
+                rechnungen_dir=job["rechnungen_dir"],
+                freitext=job["freitext"],
+                cii_xml_path=job["cii_xml_path"],
+                zugferd=job["zugferd"]
+            )
+    except Exception as e:
+        ergebnis["fehler"] = f"{type(e).__name__}: {e}"
+        dokumente = None
+    else:
+        ergebnis["pdf"] = dokumente["pdf"][0]
+        ergebnis["xml"] = dokumente["xml"][0]
+    ergebnis["dauer_s"] = round(time.perf_counter() - start, 6)
+    return ergebnis, dokumente, zeile, schluessel
+
+def schreibe_datei(pfad, daten):
+    """Schreibt daten atomar nach pfad (temporäre Datei im selben Verzeichnis + os.replace)"""
+    temp_pfad = f"{pfad}.{os.getpid()}.tmp"
+    try:
+        with open(temp_pfad, "wb") as f:
+            f.write(daten)
+        os.replace(temp_pfad, pfad)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_pfad)
+        raise
+
+def lege_verzeichnisse_an(pfade):
+    """Legt die Verzeichnisse der Zieldateien an (nur unter der geteilten ablage_sperre aufrufen)"""
+    for verzeichnis in {os.path.dirname(os.path.abspath(pfad)) for pfad in pfade}:
+        os.makedirs(verzeichnis, exist_ok=True)
+
+def lege_rechnung_ab(job, dokumente, zeile, schluessel):
+    """Schreibt die Dokumente einer Rechnung, legt sie im Render-Cache ab und trägt sie ins Journal ein.
+
+    Alles unter der geteilten Sperre des Rechnungsverzeichnisses, damit eine
+    Umstellung des Layouts (rechnungstool_ablage) die Rechnung nur vollständig
+    verschiebt und keine gerade angelegten Verzeichnisse als leer entfernt.
+    """
+    with ablage_sperre(job["rechnungen_dir"]):
+        lege_verzeichnisse_an(pfad for pfad, _ in dokumente.values())
+        with messe("schreiben"):
+            for pfad, daten in dokumente.values():
+                schreibe_datei(pfad, daten)
+        if schluessel is not None:
+            with messe("cache_ablegen"):
+                job["cache"].lege_ab(schluessel, {art: pfad for art, (pfad, _) in dokumente.items()})
+        # Erst nach dem Schreiben ins Journal: dort stehen nur vorhandene Rechnungen
+        with messe("journal"):
+            trage_ein(job["rechnungen_dir"], [zeile])
+    if job.get("auftrag"):
+        job["cache"].merke_nummer(job["auftrag"], job["rechnungsnummer"])
+
+async def verarbeite_jobs_async(jobs, executor, schreiber=STANDARD_SCHREIBER, puffer=STANDARD_PUFFER, render_plaetze=2):
+    """Rendert und schreibt alle Jobs, gibt die Ergebnisse in Job-Reihenfolge zurück"""
+    loop = asyncio.get_running_loop()
+    fertig = asyncio.Queue(maxsize=max(1, puffer))
+    plaetze = asyncio.Semaphore(max(1, render_plaetze))
+    ergebnisse = [None] * len(jobs)
+
+    async def rendere(position, job):
+        try:
+            ergebnis, dokumente, zeile, schluessel = await loop.run_in_executor(executor, rendere_job, job)
+            # Wartet, solange die Queue voll ist: so bremsen langsame Schreiber das Rendern
+            await fertig.put((position, ergebnis, dokumente, zeile, job, schluessel))
+        finally:
+            plaetze.release()
+
+    async def schreibe(schreib_pool):
+        while True:
+            eintrag = await fertig.get()
+            if eintrag is None:
+                return
+            position, ergebnis, dokumente, zeile, job, schluessel = eintrag
+            if dokumente is not None:
+                start = time.perf_counter()
+                try:
+                    await loop.run_in_executor(schreib_pool, lege_rechnung_ab, job, dokumente, zeile, schluessel)
+                    ergebnis["erfolg"] = True
+                except Exception as e:
+                    ergebnis["fehler"] = f"{type(e).__name__}: {e}"
+                    ergebnis["pdf"] = ergebnis["xml"] = None
+                ergebnis["dauer_s"] = round(ergebnis["dauer_s"] + time.perf_counter() - start, 6)
+            ergebnisse[position] = ergebnis
+
+    with ThreadPoolExecutor(max_workers=max(1, schreiber), thread_name_prefix="schreiber") as schreib_pool:
+        schreib_aufgaben = [asyncio.create_task(schreibe(schreib_pool)) for _ in range(max(1, schreiber))]
+        render_aufgaben = []
+        for position, job in enumerate(jobs):
+            await plaetze.acquire()
+            render_aufgaben.append(asyncio.create_task(rendere(position, job)))
+        await asyncio.gather(*render_aufgaben)
+        for _ in schreib_aufgaben:
+            await fertig.put(None)
+        await asyncio.gather(*schreib_aufgaben)
+
+    return ergebnisse
+
+def verarbeite_jobs(jobs, prozesse=None, schreiber=STANDARD_SCHREIBER, puffer=STANDARD_PUFFER, executor=None):
+    """Rendert und schreibt Jobs (aus baue_job) über die Pipeline.
+
+    Ein übergebener executor wird weiterverwendet, sonst wird ein
+    Prozess-Pool mit prozesse Workern gestartet. Das Ergebnisformat
+    entspricht erstelle_einzelrechnung.
+    """
+    if not jobs:
+        return []
+    if prozesse is None:
+        prozesse = os.cpu_count() or 1
+    with contextlib.ExitStack() as stapel:
+        if executor is None:
+            executor = stapel.enter_context(ProcessPoolExecutor(max_workers=max(1, prozesse)))
+        return asyncio.run(verarbeite_jobs_async(jobs, executor, schreiber, puffer, render_plaetze=2 * max(1, prozesse)))
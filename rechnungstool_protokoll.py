@@ -0,0 +1,89 @@
+"""
+Protokoll der Rechnungserstellung
+=================================
+
+Meldungen aus der Rechnungserstellung (kein Logo gefunden, Logo fehlerhaft,
+Journal nicht aktualisiert, ...) gehen über den Logger "rechnungstool"
+statt per print() direkt auf die Konsole:
+
+    from rechnungstool_protokoll import log
+    log.info("ℹ️ Kein Logo gefunden.")
+
+Wohin und ab welcher Stufe, legt richte_protokoll_ein() fest:
+
+- Interaktives Menü: Stufe INFO, direkt auf stdout, also wie bisher.
+- batch, run, server und die übrigen Befehle: Stufe WARNING, nur Warnungen
+  und Fehler gehen nach stderr; mit --ausfuehrlich auch INFO. Die
+  Meldungen laufen über eine Queue, geschrieben wird in einem eigenen
+  Thread: Ein langsames Terminal bremst das Rendern nicht, und Zeilen
+  paralleler Rechnungen laufen nicht ineinander.
+- Ohne Einrichtung (z.B. in Benchmarks) zeigt Python nur Warnungen und
+  Fehler an (logging.lastResort).
+
+Worker-Prozesse übernehmen die Stufe über den Job (baue_job) und richten
+beim ersten Job ihre eigene Queue ein.
+"""
+
+import os
+import sys
+import atexit
+import logging
+
+LOGGER_NAME = "rechnungstool"
+log = logging.getLogger(LOGGER_NAME)
+
+# Prozessweiter Zustand: eingerichtet in Prozess pid mit stufe, ggf. Schreib-Thread
+ZUSTAND = {"pid": None, "stufe": None, "listener": None, "beenden_registriert": False}
+
+def aktuelle_stufe():
+    """Eingerichtete Stufe (z.B. "WARNING") oder None, wenn nicht eingerichtet"""
+    return ZUSTAND["stufe"]
+
+def richte_protokoll_ein(stufe="WARNING", ziel=None, warteschlange=True):
+    """Richtet den Logger "rechnungstool" ein (mehrfacher Aufruf mit gleicher Stufe kostet nichts).
+
+    stufe ist ein Name wie "INFO" oder "WARNING", ziel ein Stream
+    (Standard: stderr). Mit warteschlange=False wird direkt geschrieben,
+    für das interaktive Menü, wo Meldungen und Eingaben in Reihenfolge
+    bleiben müssen.
+    """
+    if ZUSTAND["pid"] == os.getpid() and ZUSTAND["stufe"] == stufe:
+        return
+    beende_protokoll()
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+
+    ausgabe = logging.StreamHandler(ziel or sys.stderr)
+    ausgabe.setFormatter(logging.Formatter("%(message)s"))
+    if warteschlange:
+        import queue
+        from logging.handlers import QueueHandler, QueueListener
+        meldungen = queue.SimpleQueue()
+        ZUSTAND["listener"] = QueueListener(meldungen, ausgabe)
+        ZUSTAND["listener"].start()
+        log.addHandler(QueueHandler(meldungen))
+        registriere_beenden()
+    else:
+        log.addHandler(ausgabe)
+    log.setLevel(stufe)
+    log.propagate = False
+    ZUSTAND["pid"], ZUSTAND["stufe"] = os.getpid(), stufe
+
+def registriere_beenden():
+    """Sorgt dafür, dass die Queue beim Prozessende noch geschrieben wird"""
+    if ZUSTAND["beenden_registriert"] == os.getpid():
+        return
+    ZUSTAND["beenden_registriert"] = os.getpid()
+    atexit.register(beende_protokoll)
+    # Geforkte Worker-Prozesse enden ohne atexit, aber mit den Finalizern von multiprocessing
+    multiprocessing = sys.modules.get("multiprocessing")
+    if multiprocessing is not None and multiprocessing.parent_process() is not None:
+        from multiprocessing.util import Finalize
+        Finalize(None, beende_protokoll, exitpriority=10)
+
+def beende_protokoll():
+    """Schreibt ausstehende Meldungen und beendet den Schreib-Thread dieses Prozesses"""
+    listener, ZUSTAND["listener"] = ZUSTAND["listener"], None
+    # Nach einem fork gehört der Schreib-Thread dem Elternprozess
+    if listener is not None and ZUSTAND["pid"] == os.getpid():
+        listener.stop()
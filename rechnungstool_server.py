@@ -0,0 +1,266 @@
+"""
+Rechnungsserver
+===============
+
+Hält RechnungsManager, Unternehmensdaten, Kunden sowie reportlab, Logo und
+Briefbogen-Vorlage dauerhaft geladen und nimmt Rechnungsaufträge über HTTP
+an - auf localhost oder über einen Unix-Domain-Socket. Statt eines
+Prozessstarts pro Rechnung kostet ein Auftrag nur noch das Rendern.
+
+    python rechnungstool_menu.py server --port 8765
+    python rechnungstool_menu.py server --socket /tmp/rechnungstool.sock
+
+Endpunkte (JSON):
+
+    GET  /status                 Zustand, Anzahl Kunden und Worker
+    POST /rechnungen             Auftrag wie in der Stapelverarbeitung; mit
+                                 "rueckgabe": "inhalt" kommen PDF und XML
+                                 base64-kodiert zurück, sonst die Pfade
+    GET  /dateien/<Dateiname>    Erzeugte Datei aus Rechnungen/ (PDF/XML)
+    GET  /metriken               Dauer je Verarbeitungsstufe und Zähler im
+                                 Prometheus-Textformat (rechnungstool_metriken)
+    POST /neu-laden              Unternehmens- und Kundendaten neu einlesen
+
+Gerendert wird in einem Prozess-Pool mit fester Worker-Anzahl; es werden
+höchstens worker + warteschlange Aufträge gleichzeitig angenommen, weitere
+erhalten HTTP 503.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import signal
+import threading
+import contextlib
+import socketserver
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+
+from rechnungstool_batch import baue_job, erstelle_einzelrechnung, pruefe_auftrag, uebernimm_metriken
+from rechnungstool_metriken import aktiviere, als_prometheus, messe, zaehle
+from rechnungstool_protokoll import aktuelle_stufe, log, richte_protokoll_ein
+from rechnungstool_ablage import finde_rechnungsdatei
+
+# Größter angenommener Request-Body (Bytes)
+MAX_ANFRAGE_BYTES = 10 * 1024 * 1024
+
+# Dateitypen, die unter /dateien/ ausgeliefert werden
+DATEITYPEN = {".pdf": "application/pdf", ".xml": "application/xml"}
+
+def waerme_worker_vor(unternehmen_data, protokoll=None):
+    """Initialisiert einen Worker: Protokoll einrichten, reportlab, Logo und Briefbogen-Vorlage laden.
+
+    Dazu wird eine Beispielrechnung im Speicher gerendert und verworfen.
+    """
+    import rechnungstool_backend
+    if protokoll:
+        richte_protokoll_ein(protokoll)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            rechnungstool_backend.erstelle_pdf(
+                "0000-00-00-00", {"Firmenname": "Vorwärmen"}, unternehmen_data, datetime.today().strftime("%d.%m.%Y"),
+                [{"bezeichnung": "Vorwärmen", "menge": 1, "einzelpreis": 0.0}], None, None, io.BytesIO(),
+                unternehmen_data.get('Kleinunternehmer', 'nein').lower() in ['ja', 'yes', 'true', '1'],
+            )
+    except Exception as e:
+        log.warning(f"⚠️ Vorwärmen fehlgeschlagen: {e}")
+
+class Rechnungsdienst:
+    """Nimmt Aufträge an, vergibt Nummern und rendert im Prozess-Pool"""
+
+    def __init__(self, manager, worker=None, warteschlange=None, zugferd=False):
+        self.manager = manager
+        self.worker = max(1, worker or os.cpu_count() or 1)
+        self.zugferd = zugferd
+        self.plaetze = threading.BoundedSemaphore(self.worker + (self.worker * 4 if warteschlange is None else warteschlange))
+        self.sperre = threading.Lock()
+        self.executor = self.starte_pool()
+        self.gestartet = time.time()
+        self.erstellt = 0
+
+    def starte_pool(self):
+        return ProcessPoolExecutor(max_workers=self.worker, initializer=waerme_worker_vor,
+                                   initargs=(self.manager.unternehmen_daten, aktuelle_stufe()))
+
+    def neu_laden(self):
+        """Liest Unternehmens- und Kundendaten neu ein und startet die Worker neu"""
+        with self.sperre:
+            from rechnungstool_menu import RechnungsManager
+            self.manager = RechnungsManager(self.manager.base_dir)
+            alter_pool, self.executor = self.executor, self.starte_pool()
+        alter_pool.shutdown(wait=True)
+
+    def status(self):
+        with self.sperre:
+            anzahl_kunden = len(self.manager.kunden)
+        return {
+            "status": "ok",
+            "kunden": anzahl_kunden,
+            "worker": self.worker,
+            "rechnungen_erstellt": self.erstellt,
+            "laufzeit_s": round(time.time() - self.gestartet, 1),
+        }
+
+    def erstelle(self, auftrag):
+        """Erstellt eine Rechnung und gibt (HTTP-Status, Antwort-Dict) zurück"""
+        # Prüfen und Manager übernehmen in einem Schritt, neu_laden tauscht ihn aus
+        with self.sperre:
+            manager = self.manager
+            fehler = pruefe_auftrag(auftrag, manager.kunden)
+        if fehler:
+            return 400, {"erfolg": False, "fehler": fehler}
+        rueckgabe = auftrag.get("rueckgabe", "pfade")
+        if rueckgabe not in ("pfade", "inhalt"):
+            return 400, {"erfolg": False, "fehler": f"Unbekannte rueckgabe: {rueckgabe} (erlaubt: pfade, inhalt)"}
+
+        if not self.plaetze.acquire(blocking=False):
+            zaehle("anfragen_abgelehnt")
+            return 503, {"erfolg": False, "fehler": "Server ausgelastet, bitte später erneut versuchen"}
+        try:
+            datum = auftrag.get("datum") or datetime.today().strftime("%d.%m.%Y")
+            rechnungsnummer = manager.reserviere_rechnungsnummern([datum])[0]
+            job = baue_job(manager, 0, auftrag, datum, rechnungsnummer,
+                           zugferd=bool(auftrag.get("zugferd", self.zugferd)), meldungen_stderr=True,
+                           inhalt=rueckgabe == "inhalt")
+            with messe("anfrage"):
+                # Unter der Sperre einreichen: neu_laden beendet den alten Pool
+                with self.sperre:
+                    zukunft = self.executor.submit(erstelle_einzelrechnung, job)
+                ergebnis = zukunft.result()
+        finally:
+            self.plaetze.release()
+        uebernimm_metriken(ergebnis)
+
+        ergebnis.pop("index", None)
+        if not ergebnis["erfolg"]:
+            return 500, ergebnis
+        with self.sperre:
+            self.erstellt += 1
+        return 200, ergebnis
+
+    def datei(self, name):
+        """Pfad einer erzeugten Datei in Rechnungen/ (auch in Unterverzeichnissen des Layouts) oder None"""
+        if os.path.basename(name) != name or os.path.splitext(name)[1].lower() not in DATEITYPEN:
+            return None
+        return finde_rechnungsdatei(self.manager.rechnungen_dir, name)
+
+    def beenden(self):
+        self.executor.shutdown(wait=True)
+
+class RechnungsHandler(BaseHTTPRequestHandler):
+    """HTTP-Schnittstelle des Rechnungsservers (JSON rein, JSON raus)"""
+
+    server_version = "RechnungsTool"
+
+    def address_string(self):
+        # Unix-Sockets haben keine Client-Adresse
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+    def sende_json(self, status, daten):
+        inhalt = json.dumps(daten, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(inhalt)))
+        self.end_headers()
+        self.wfile.write(inhalt)
+
+    def do_GET(self):
+        dienst = self.server.dienst
+        if self.path == "/status":
+            self.sende_json(200, dienst.status())
+        elif self.path == "/metriken":
+            inhalt = als_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(inhalt)))
+            self.end_headers()
+            self.wfile.write(inhalt)
+        elif self.path.startswith("/dateien/"):
+            pfad = dienst.datei(self.path[len("/dateien/"):])
+            if pfad is None:
+                self.sende_json(404, {"fehler": "Datei nicht gefunden"})
+                return
+            with open(pfad, "rb") as f:
+                inhalt = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", DATEITYPEN[os.path.splitext(pfad)[1].lower()])
+            self.send_header("Content-Length", str(len(inhalt)))
+            self.end_headers()
+            self.wfile.write(inhalt)
+        else:
+            self.sende_json(404, {"fehler": f"Unbekannter Pfad: {self.path}"})
+
+    def do_POST(self):
+        dienst = self.server.dienst
+        if self.path == "/neu-laden":
+            dienst.neu_laden()
+            self.sende_json(200, dienst.status())
+            return
+        if self.path != "/rechnungen":
+            self.sende_json(404, {"fehler": f"Unbekannter Pfad: {self.path}"})
+            return
+
+        try:
+            laenge = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            laenge = -1
+        if not 0 < laenge <= MAX_ANFRAGE_BYTES:
+            self.sende_json(400 if laenge <= 0 else 413, {"erfolg": False, "fehler": "Ungültige Länge des Auftrags"})
+            return
+        try:
+            auftrag = json.loads(self.rfile.read(laenge))
+        except ValueError as e:
+            self.sende_json(400, {"erfolg": False, "fehler": f"Ungültiges JSON: {e}"})
+            return
+        if not isinstance(auftrag, dict):
+            self.sende_json(400, {"erfolg": False, "fehler": "Auftrag ist kein JSON-Objekt"})
+            return
+        self.sende_json(*dienst.erstelle(auftrag))
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """HTTP über einen Unix-Domain-Socket (z.B. curl --unix-socket)"""
+        daemon_threads = True
+else:
+    # Windows: keine Unix-Domain-Sockets, nur localhost-HTTP
+    UnixHTTPServer = None
+
+def starte_server(manager, port=8765, socket_pfad=None, worker=None, warteschlange=None, zugferd=False):
+    """CLI-Befehl 'server': bedient Aufträge bis SIGINT/SIGTERM, gibt den Exit-Code zurück"""
+    if socket_pfad and UnixHTTPServer is None:
+        print("❌ Unix-Sockets werden auf diesem System nicht unterstützt, bitte --port verwenden", file=sys.stderr)
+        return 2
+    # Der Server misst immer mit (GET /metriken); die Worker übernehmen das über baue_job
+    aktiviere()
+    dienst = Rechnungsdienst(manager, worker, warteschlange, zugferd)
+    if socket_pfad:
+        if os.path.exists(socket_pfad):
+            os.remove(socket_pfad)
+        server = UnixHTTPServer(socket_pfad, RechnungsHandler)
+        adresse = f"unix:{socket_pfad}"
+    else:
+        # Nur lokal erreichbar: keine Authentifizierung vorgesehen
+        server = ThreadingHTTPServer(("127.0.0.1", port), RechnungsHandler)
+        adresse = f"http://127.0.0.1:{server.server_address[1]}"
+    server.dienst = dienst
+
+    # SIGTERM (z.B. von systemd/launchd) beendet den Server wie Strg+C
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"🚀 Rechnungsserver läuft auf {adresse} ({dienst.worker} Worker)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dienst.beenden()
+        if socket_pfad and os.path.exists(socket_pfad):
+            os.remove(socket_pfad)
+        print("👋 Rechnungsserver beendet", file=sys.stderr)
+    return 0
@@ -0,0 +1,196 @@
+"""
+Kundensuche
+===========
+
+In-Memory-Suchindex über Firmenname, Ort, PLZ und Kundennummer, damit die
+Kundenauswahl auch bei tausenden Kunden in Millisekunden antwortet.
+
+Der Index wird einmal aufgebaut und bei neuen Kunden ergänzt:
+
+- Wörter: sortierte Liste aller normalisierten Wörter für Präfixsuche per
+  Binärsuche ("mü" findet "Müller", "München", "80331" über "803").
+- Trigramme: Postings-Listen je Dreierfolge über die Wörter für unscharfe
+  Treffer bei Tippfehlern ("Mueler" findet "Müller"); erst bei der ersten
+  unscharfen Suche aufgebaut.
+
+Treffer werden nach Punkten sortiert: exakte Kundennummer vor ganzen Wörtern
+vor Präfixen vor unscharfen Treffern. Jedes Suchwort muss passen; unscharf
+wird ein Suchwort nur gesucht, wenn kein Wort im Index damit beginnt.
+"""
+
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+# Durchsuchte Felder eines Kunden
+SUCH_FELDER = ('Kundennummer', 'Firmenname', 'Ort', 'PLZ')
+
+# Punkte je Art des Treffers
+PUNKTE_KUNDENNUMMER = 100
+PUNKTE_WORT = 4
+PUNKTE_PRAEFIX = 3
+PUNKTE_UNSCHARF = 2
+
+# Mindestanteil gemeinsamer Trigramme für einen unscharfen Treffer
+MINDEST_AEHNLICHKEIT = 0.5
+
+UMLAUTE = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss', 'é': 'e', 'è': 'e', 'á': 'a', 'à': 'a'})
+TRENNER = re.compile(r'[^0-9a-z]+')
+
+def normalisiere(text):
+    """Kleinbuchstaben, Umlaute ausgeschrieben, Satzzeichen als Trenner"""
+    text = str(text or '').lower()
+    if not text.isascii():
+        text = text.translate(UMLAUTE)
+    return TRENNER.sub(' ', text).strip()
+
+def woerter(text):
+    return normalisiere(text).split()
+
+def trigramme(wort):
+    """Trigramme eines Worts, an den Rändern mit Leerzeichen aufgefüllt"""
+    gepolstert = f"  {wort} "
+    return {gepolstert[i:i + 3] for i in range(len(gepolstert) - 2)}
+
+class Kundensuche:
+    """Suchindex über einen Kundenbestand (Mapping Kundennummer -> Kunde)"""
+
+    def __init__(self, kunden=None):
+        self.nummern = []            # Dokument-ID -> Kundennummer
+        self.sortiername = []        # Dokument-ID -> normalisierter Firmenname
+        self.wort_postings = {}      # Wort -> Dokument-IDs
+        self.wortliste = []          # sortierte Wörter für die Präfixsuche
+        self.woerter_je_id = []      # Wort-ID -> Wort
+        self.trigramm_anzahl = array('H')  # Wort-ID -> Anzahl Trigramme
+        self.trigramm_postings = None  # Trigramm -> Wort-IDs (erst bei der ersten unscharfen Suche)
+        self.id_je_nummer = {}
+        if kunden is not None:
+            for kunde in kunden.values():
+                self.hinzufuegen(kunde, sortieren=False)
+            self.wortliste.sort()
+
+    def __len__(self):
+        return len(self.id_je_nummer)
+
+    def hinzufuegen(self, kunde, sortieren=True):
+        """Nimmt einen Kunden in den Index auf (bestehende Kundennummer wird ersetzt)"""
+        nummer = kunde['Kundennummer']
+        if nummer in self.id_je_nummer:
+            self.entfernen(nummer)
+        doc = len(self.nummern)
+        self.nummern.append(nummer)
+        self.sortiername.append(normalisiere(kunde.get('Firmenname')))
+        self.id_je_nummer[nummer] = doc
+
+        for wort in set(woerter(" ".join(kunde.get(feld) or '' for feld in SUCH_FELDER))):
+            postings = self.wort_postings.get(wort)
+            if postings is None:
+                postings = self.wort_postings[wort] = array('I')
+                self.neues_wort(wort, sortieren)
+            postings.append(doc)
+
+    def neues_wort(self, wort, sortieren):
+        self.woerter_je_id.append(wort)
+        if self.trigramm_postings is not None:
+            self.trigramme_eintragen(len(self.woerter_je_id) - 1)
+        if sortieren:
+            insort(self.wortliste, wort)
+        else:
+            self.wortliste.append(wort)
+
+    def trigramme_eintragen(self, wort_id):
+        # Trigramme je Wort statt je Kunde: häufige Wörter (Orte, "GmbH") nur einmal
+        eigene_trigramme = trigramme(self.woerter_je_id[wort_id])
+        self.trigramm_anzahl.append(min(len(eigene_trigramme), 0xFFFF))
+        for trigramm in eigene_trigramme:
+            postings = self.trigramm_postings.get(trigramm)
+            if postings is None:
+                postings = self.trigramm_postings[trigramm] = array('I')
+            postings.append(wort_id)
+
+    def trigramm_index(self):
+        """Trigramm-Postings, beim ersten Bedarf aus allen Wörtern aufgebaut"""
+        if self.trigramm_postings is None:
+            self.trigramm_postings = {}
+            for wort_id in range(len(self.woerter_je_id)):
+                self.trigramme_eintragen(wort_id)
+        return self.trigramm_postings
+
+    def entfernen(self, nummer):
+        """Blendet einen Kunden aus (die Dokument-ID wird nicht wiederverwendet)"""
+        doc = self.id_je_nummer.pop(nummer, None)
+        if doc is not None:
+            self.nummern[doc] = None
+
+    def praefix_treffer(self, wort):
+        """Dokument-IDs mit Punkten für alle Wörter, die mit wort beginnen"""
+        treffer = {}
+        start = bisect_left(self.wortliste, wort)
+        for index in range(start, len(self.wortliste)):
+            kandidat = self.wortliste[index]
+            if not kandidat.startswith(wort):
+                break
+            punkte = PUNKTE_WORT if kandidat == wort else PUNKTE_PRAEFIX
+            for doc in self.wort_postings[kandidat]:
+                if treffer.get(doc, 0) < punkte:
+                    treffer[doc] = punkte
+        return treffer
+
+    def unscharfe_treffer(self, wort):
+        """Dokument-IDs mit Punkten nach Ähnlichkeit der Trigramme (Dice-Koeffizient)"""
+        gesucht = trigramme(wort)
+        index = self.trigramm_index()
+        zaehler = Counter()
+        for trigramm in gesucht:
+            postings = index.get(trigramm)
+            if postings:
+                zaehler.update(postings)
+
+        treffer = {}
+        for wort_id, anzahl in zaehler.items():
+            aehnlichkeit = 2 * anzahl / (len(gesucht) + self.trigramm_anzahl[wort_id])
+            if aehnlichkeit < MINDEST_AEHNLICHKEIT:
+                continue
+            punkte = PUNKTE_UNSCHARF * aehnlichkeit
+            for doc in self.wort_postings[self.woerter_je_id[wort_id]]:
+                if treffer.get(doc, 0) < punkte:
+                    treffer[doc] = punkte
+        return treffer
+
+    def suche(self, anfrage, limit=None):
+        """Kundennummern passend zur Anfrage, beste Treffer zuerst"""
+        suchwoerter = woerter(anfrage)
+        if not suchwoerter:
+            return self.alle(limit)
+
+        punkte = None
+        for wort in suchwoerter:
+            treffer = self.praefix_treffer(wort)
+            if not treffer and len(wort) >= 3:
+                # Unscharf nur suchen, wenn kein Wort so beginnt (vermutlich Tippfehler)
+                treffer = self.unscharfe_treffer(wort)
+            if punkte is None:
+                punkte = treffer
+            else:
+                # Jedes Suchwort muss passen
+                punkte = {doc: wert + treffer[doc] for doc, wert in punkte.items() if doc in treffer}
+            if not punkte:
+                return []
+
+        exakt = self.id_je_nummer.get(anfrage.strip(), self.id_je_nummer.get(anfrage.strip().upper()))
+        if exakt is not None:
+            punkte[exakt] = punkte.get(exakt, 0) + PUNKTE_KUNDENNUMMER
+
+        rangfolge = sorted(
+            (doc for doc in punkte if self.nummern[doc] is not None),
+            key=lambda doc: (-punkte[doc], self.sortiername[doc]),
+        )
+        if limit is not None:
+            rangfolge = rangfolge[:limit]
+        return [self.nummern[doc] for doc in rangfolge]
+
+    def alle(self, limit=None):
+        """Alle Kundennummern in der Reihenfolge des Bestands"""
+        nummern = [nummer for nummer in self.nummern if nummer is not None]
+        return nummern if limit is None else nummern[:limit]
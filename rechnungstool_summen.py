@@ -0,0 +1,283 @@
+"""
+Rechnungssummen
+===============
+
+Berechnet alle Beträge einer Rechnung genau einmal mit Dezimalarithmetik
+und Rundung nach EN 16931:
+
+- Nettobetrag je Position (BT-131) = Menge x Einzelpreis, auf Cent gerundet
+- Summe der Positionen (BT-106) = Summe der gerundeten Positionsbeträge
+- Steuerbetrag je Steuerkategorie (BT-117) = Basis x Satz, auf Cent gerundet
+- Gesamtbetrag (BT-112) = Summe Netto + Summe der Steuerbeträge
+
+Jede Position kann eine eigene Steuerkategorie (steuerkategorie, Codes nach
+EN 16931/UNTDID 5305) und einen Steuersatz (steuersatz in Prozent) tragen.
+Ohne Angabe gilt der Regelsteuersatz. Die Positionen werden in einem
+Durchlauf zu Steuergruppen (TaxSubtotal) je Kategorie und Satz summiert.
+
+Gerundet wird kaufmännisch (ROUND_HALF_UP). PDF, CII-XML und XRechnung
+lesen ihre Beträge ausschließlich aus dem Ergebnis von berechne_summen, damit
+sie nicht um einen Cent voneinander abweichen können.
+"""
+
+from array import array
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CENT = Decimal("0.01")
+
+# Regelsteuersatz und Angaben für die Kleinunternehmerregelung
+STANDARD_STEUERSATZ = Decimal("19")
+KLEINUNTERNEHMER_GRUND = "Kleinunternehmerregelung nach §19 UStG"
+
+# Steuerkategorien: S = Regelsatz/ermäßigter Satz, alle anderen immer 0 %.
+# Der Text ist der Befreiungsgrund (BT-120), None = keiner erforderlich.
+STEUERKATEGORIEN = {
+    "S": None,
+    "Z": None,
+    "E": "Steuerbefreite Leistung",
+    "AE": "Steuerschuldnerschaft des Leistungsempfängers (Reverse Charge)",
+    "K": "Steuerfreie innergemeinschaftliche Lieferung",
+    "G": "Steuerfreie Ausfuhrlieferung",
+}
+
+# Schnellpfad: Mengen und Preise als ganze Zahlen in 1/10000
+SCHNELL_SKALA = 10000
+SCHNELL_MAXIMUM = 1e9
+
+def zu_decimal(wert):
+    """Wandelt Menge oder Preis verlustfrei in Decimal um (auch "1,5")"""
+    if isinstance(wert, Decimal):
+        return wert
+    if isinstance(wert, int):
+        return Decimal(wert)
+    if isinstance(wert, float):
+        # repr liefert die kürzeste Dezimaldarstellung (95.1 statt 95.0999...)
+        return Decimal(repr(wert))
+    return Decimal(str(wert).strip().replace(",", "."))
+
+def runde_cent(wert):
+    """Rundet einen Decimal-Betrag kaufmännisch auf Cent"""
+    return wert.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def cent_zu_decimal(cent):
+    """Ganzzahlige Cent als Decimal-Betrag mit zwei Nachkommastellen"""
+    return Decimal(cent).scaleb(-2)
+
+def positions_betrag(menge, einzelpreis):
+    """Nettobetrag einer Position (Menge x Einzelpreis, auf Cent gerundet)"""
+    return runde_cent(zu_decimal(menge) * zu_decimal(einzelpreis))
+
+def pruefe_menge_preis(menge, einzelpreis):
+    """Menge und Einzelpreis als Decimal, ValueError bei ungültigen Werten.
+
+    Abgelehnt werden nicht lesbare Eingaben, NaN, Unendlich und Werte, deren
+    Positionsbetrag die Decimal-Genauigkeit übersteigt (z.B. 1e30):
+    runde_cent würde dafür InvalidOperation auslösen.
+    """
+    try:
+        zahlen = (zu_decimal(menge), zu_decimal(einzelpreis))
+        if all(zahl.is_finite() for zahl in zahlen):
+            positions_betrag(*zahlen)
+            return zahlen
+    except (ArithmeticError, TypeError, ValueError):
+        pass
+    raise ValueError(f"Ungültige Menge oder Einzelpreis: {menge} x {einzelpreis}")
+
+def linien_cent_dezimal(positionen):
+    """Positionsbeträge in Cent über Decimal (Referenzpfad für beliebige Eingaben)"""
+    return array("q", (
+        int(runde_cent(zu_decimal(pos["menge"]) * zu_decimal(pos["einzelpreis"])).scaleb(2))
+        for pos in positionen
+    ))
+
+def steuer_schluessel(pos):
+    """Steuerkategorie und Steuersatz einer Position als (kategorie, satz).
+
+    Ohne steuerkategorie gilt S, bei steuersatz 0 die Kategorie Z. Wirft
+    ValueError bei unbekannter Kategorie oder unpassendem Steuersatz.
+    """
+    kategorie = pos.get("steuerkategorie")
+    satz = pos.get("steuersatz")
+    try:
+        satz = None if satz in (None, "") else zu_decimal(satz)
+    except InvalidOperation:
+        raise ValueError(f"Ungültiger Steuersatz: {pos.get('steuersatz')}")
+
+    if not kategorie:
+        kategorie = "Z" if satz == 0 else "S"
+    kategorie = str(kategorie).strip().upper()
+    if kategorie not in STEUERKATEGORIEN:
+        raise ValueError(f"Unbekannte Steuerkategorie: {kategorie} (erlaubt: {', '.join(STEUERKATEGORIEN)})")
+
+    if kategorie == "S":
+        if satz is None:
+            satz = STANDARD_STEUERSATZ
+        if not 0 < satz < 100:
+            raise ValueError(f"Ungültiger Steuersatz für Kategorie S: {satz}")
+    elif satz:
+        raise ValueError(f"Steuerkategorie {kategorie} erlaubt nur 0 %, nicht {satz} %")
+    else:
+        satz = Decimal("0")
+
+    return kategorie, satz
+
+def gruppiere_steuern(positionen, linien_cent):
+    """Ordnet jede Position einer Steuergruppe zu (ein Durchlauf, O(n)).
+
+    Gibt (gruppen, basis_cent, linien_gruppe) zurück: die Schlüssel
+    (kategorie, satz) in Reihenfolge ihres ersten Auftretens, die
+    Nettosumme je Gruppe und je Position den Index ihrer Gruppe. Gleiche
+    Rohangaben werden nur einmal ausgewertet.
+    """
+    gruppen = []
+    basis_cent = []
+    index_je_schluessel = {}
+    index_je_rohwert = {}
+    linien_gruppe = array("H")
+
+    for pos, cent in zip(positionen, linien_cent):
+        rohwert = (pos.get("steuerkategorie"), pos.get("steuersatz"))
+        index = index_je_rohwert.get(rohwert)
+        if index is None:
+            schluessel = steuer_schluessel(pos)
+            index = index_je_schluessel.get(schluessel)
+            if index is None:
+                index = index_je_schluessel[schluessel] = len(gruppen)
+                gruppen.append(schluessel)
+                basis_cent.append(0)
+            index_je_rohwert[rohwert] = index
+        basis_cent[index] += cent
+        linien_gruppe.append(index)
+
+    return gruppen, basis_cent, linien_gruppe
+
+def skaliere(werte):
+    """Skaliert Zahlen auf ganze 1/10000 oder gibt None zurück, wenn das nicht exakt geht"""
+    skaliert = []
+    for wert in werte:
+        if type(wert) is int:
+            skaliert.append(wert * SCHNELL_SKALA)
+        elif type(wert) is float and -SCHNELL_MAXIMUM < wert < SCHNELL_MAXIMUM:
+            ganz = round(wert * SCHNELL_SKALA)
+            # Exakt wie zu_decimal (repr): nur wenn ganz/10000 wieder genau dieser float ist. Zwei
+            # Werte mit höchstens vier Nachkommastellen liegen unterhalb von 1e9 viel weiter
+            # auseinander als ein float-Abstand, mehr Nachkommastellen fallen also immer heraus.
+            if ganz / SCHNELL_SKALA != wert:
+                return None
+            skaliert.append(ganz)
+        elif type(wert) is Decimal and wert.is_finite() and wert.as_tuple().exponent >= -4 and abs(wert) < SCHNELL_MAXIMUM:
+            # Z.B. aus Stapel- und CSV-Aufträgen: höchstens vier Nachkommastellen sind exakt
+            skaliert.append(int(wert.scaleb(4)))
+        else:
+            return None
+    return skaliert
+
+def linien_cent_schnell(positionen):
+    """Positionsbeträge in Cent mit reiner Ganzzahlarithmetik.
+
+    Für Rechnungen mit tausenden Positionen: Mengen und Preise werden
+    spaltenweise auf ganze 1/10000 skaliert, das Produkt (1/10^8) wird
+    ganzzahlig auf Cent gerundet. Gibt None zurück, wenn eine Eingabe nicht
+    exakt darstellbar ist (Strings, mehr als vier Nachkommastellen);
+    dann rechnet linien_cent_dezimal.
+    """
+    mengen = skaliere([pos["menge"] for pos in positionen])
+    if mengen is None:
+        return None
+    preise = skaliere([pos["einzelpreis"] for pos in positionen])
+    if preise is None:
+        return None
+
+    halb = SCHNELL_SKALA * SCHNELL_SKALA // 200
+    teiler = halb * 2
+    # ROUND_HALF_UP rundet vom Nullpunkt weg, daher Vorzeichen getrennt behandeln
+    return array("q", (
+        (p + halb) // teiler if p >= 0 else -((halb - p) // teiler)
+        for p in map(int.__mul__, mengen, preise)
+    ))
+
+class Rechnungssummen:
+    """Beträge einer Rechnung in ganzen Cent (kompakt, einmal berechnet).
+
+    steuergruppen ist ein Tupel von Dicts mit den Schlüsseln kategorie,
+    satz (Decimal, Prozent), basis_cent, steuer_cent und befreiungsgrund;
+    linien_gruppe enthält je Position den Index ihrer Steuergruppe.
+    Die Properties liefern die Beträge als Decimal mit zwei Nachkommastellen.
+    """
+
+    __slots__ = ("linien_cent", "linien_gruppe", "netto_cent", "steuergruppen", "steuer_cent", "brutto_cent", "ist_kleinunternehmer")
+
+    def __init__(self, linien_cent, linien_gruppe, steuergruppen, ist_kleinunternehmer):
+        self.linien_cent = linien_cent
+        self.linien_gruppe = linien_gruppe
+        self.netto_cent = sum(linien_cent)
+        self.steuergruppen = steuergruppen
+        self.steuer_cent = sum(gruppe["steuer_cent"] for gruppe in steuergruppen)
+        self.brutto_cent = self.netto_cent + self.steuer_cent
+        self.ist_kleinunternehmer = ist_kleinunternehmer
+
+    @property
+    def netto(self):
+        return cent_zu_decimal(self.netto_cent)
+
+    @property
+    def steuer(self):
+        return cent_zu_decimal(self.steuer_cent)
+
+    @property
+    def brutto(self):
+        return cent_zu_decimal(self.brutto_cent)
+
+    def linie(self, index):
+        """Nettobetrag der Position mit dem (0-basierten) Index"""
+        return cent_zu_decimal(self.linien_cent[index])
+
+    def gruppe(self, index):
+        """Steuergruppe der Position mit dem (0-basierten) Index"""
+        return self.steuergruppen[self.linien_gruppe[index]]
+
+    def __repr__(self):
+        return f"Rechnungssummen(netto={self.netto}, steuer={self.steuer}, brutto={self.brutto})"
+
+def berechne_summen(positionen, ist_kleinunternehmer=False):
+    """Berechnet alle Beträge einer Rechnung und gibt Rechnungssummen zurück"""
+    linien_cent = linien_cent_schnell(positionen)
+    if linien_cent is None:
+        linien_cent = linien_cent_dezimal(positionen)
+
+    if ist_kleinunternehmer:
+        # Kleinunternehmer weisen keine Umsatzsteuer aus, Angaben je Position entfallen
+        gruppe = {"kategorie": "E", "satz": Decimal("0"), "basis_cent": sum(linien_cent),
+                  "steuer_cent": 0, "befreiungsgrund": KLEINUNTERNEHMER_GRUND}
+        return Rechnungssummen(linien_cent, array("H", bytes(2 * len(linien_cent))), (gruppe,), True)
+
+    schluessel, basis_cent, linien_gruppe = gruppiere_steuern(positionen, linien_cent)
+    steuergruppen = []
+    for (kategorie, satz), basis in zip(schluessel, basis_cent):
+        # Steuer je Steuergruppe einmal auf die Summe der gerundeten Positionen
+        steuer = runde_cent(cent_zu_decimal(basis) * satz / 100)
+        steuergruppen.append({"kategorie": kategorie, "satz": satz, "basis_cent": basis,
+                              "steuer_cent": int(steuer.scaleb(2)), "befreiungsgrund": STEUERKATEGORIEN[kategorie]})
+
+    return Rechnungssummen(linien_cent, linien_gruppe, tuple(steuergruppen), False)
+
+def als_summen(summen, positionen, ist_kleinunternehmer=False):
+    """Gibt vorhandene Rechnungssummen zurück oder berechnet sie aus den Positionen.
+
+    Ältere Aufrufer übergeben statt Rechnungssummen noch den Nettobetrag als
+    Zahl; der wird ignoriert, maßgeblich sind die Positionen.
+    """
+    if isinstance(summen, Rechnungssummen):
+        return summen
+    return berechne_summen(positionen, ist_kleinunternehmer)
+
+def preis_text(einzelpreis):
+    """Einzelpreis exakt mit mindestens zwei Nachkommastellen (0.335 bleibt 0.335)"""
+    preis = zu_decimal(einzelpreis)
+    if preis.as_tuple().exponent > -2:
+        preis = preis.quantize(CENT)
+    return format(preis, "f")
+
+def satz_text(satz):
+    """Steuersatz ohne überflüssige Nachkommastellen (19, 7, 5.5)"""
+    return format(satz.normalize(), "f")